@@ -12,5 +12,10 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'expense_tracker.settings')
+# Serve the read paths with the async views (expenses/async_views.py).
+os.environ.setdefault('EXPENSE_ASYNC_VIEWS', 'true')
+# Every ASGI request runs in a new thread, so persistent per-thread
+# connections would never be reused; set DATABASE_POOL to reuse connections.
+os.environ.setdefault('DATABASE_CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
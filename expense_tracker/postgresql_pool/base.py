@@ -0,0 +1,96 @@
+"""
+PostgreSQL backend that borrows connections from a psycopg_pool pool.
+
+Selected by ``expense_tracker.database`` when ``DATABASE_POOL`` is set.
+Each alias gets one ``ConnectionPool`` per process, shared by all threads,
+so ASGI requests (a new thread each) and threaded WSGI workers reuse open
+connections instead of connecting per request. ``OPTIONS['pool']`` holds
+the ``ConnectionPool`` arguments (min_size, max_size, timeout, ...).
+Closing the Django connection returns it to the pool it came from, which
+rolls back anything left open and discards broken connections; if that pool
+has been closed meanwhile (``close_pools``), the connection is closed.
+"""
+import os
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.postgresql import base
+from django.db.backends.postgresql.psycopg_any import IsolationLevel, is_psycopg3
+from django.utils.asyncio import async_unsafe
+
+try:
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    ConnectionPool = None
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def close_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def _forget_pools():
+    # A forked child must not use (or close) the parent's sockets.
+    _pools.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_pools)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        if ConnectionPool is None or not is_psycopg3:
+            raise ImproperlyConfigured(
+                'DATABASE_POOL requires psycopg 3 and psycopg_pool (pip install "psycopg[binary,pool]")')
+        super().__init__(*args, **kwargs)
+        # The pool self.connection was borrowed from; _pools may have moved on.
+        self._pool = None
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_pool(self, conn_params):
+        with _pools_lock:
+            pool = _pools.get(self.alias)
+            if pool is None:
+                options = dict(self.settings_dict['OPTIONS'].get('pool') or {})
+                check = getattr(ConnectionPool, 'check_connection', None)  # psycopg_pool >= 3.2
+                if check is not None:
+                    options.setdefault('check', check)
+                pool = ConnectionPool(kwargs=conn_params, name=self.alias, open=True, **options)
+                _pools[self.alias] = pool
+            return pool
+
+    @async_unsafe
+    def get_new_connection(self, conn_params):
+        isolation_level = self.settings_dict['OPTIONS'].get('isolation_level')
+        try:
+            self.isolation_level = IsolationLevel(
+                IsolationLevel.READ_COMMITTED if isolation_level is None else isolation_level)
+        except ValueError:
+            raise ImproperlyConfigured(
+                'Invalid transaction isolation level %s specified.' % isolation_level)
+        pool = self.get_pool(conn_params)
+        connection = pool.getconn()
+        self._pool = pool
+        if isolation_level is not None:
+            connection.isolation_level = self.isolation_level
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            pool, self._pool = self._pool, None
+            with self.wrap_database_errors:
+                if pool is None or pool.closed:
+                    self.connection.close()
+                else:
+                    pool.putconn(self.connection)
@@ -21,5 +21,6 @@ from django.conf.urls.static import static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('', include('expenses.urls')),
+    # Async read views under ASGI (see expense_tracker/asgi.py)
+    path('', include('expenses.async_urls' if settings.EXPENSE_ASYNC_VIEWS else 'expenses.urls')),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
@@ -1,14 +1,135 @@
-from django.contrib import admin
-from .models import Category, Expense
+from django.conf import settings
+from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.db.models import Max, Min, QuerySet
+from . import search
+from .models import Budget, BudgetAlert, Category, Expense
+from .pagination import EstimatedCountPaginator
+from .stats import next_period, period_start
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """
+    ``dates()`` for the admin's date hierarchy without SELECT DISTINCT over
+    every row: it takes the range with MIN/MAX and probes each year, month
+    or day in it with EXISTS, all of which are index lookups.
+    """
+
+    def dates(self, field_name, kind, order='ASC'):
+        if kind not in ('year', 'month', 'day'):
+            return super().dates(field_name, kind, order)
+        bounds = self.aggregate(first=Min(field_name), last=Max(field_name))
+        if bounds['first'] is None:
+            return []
+        periods = []
+        start = period_start(bounds['first'], kind)
+        while start <= bounds['last']:
+            end = next_period(start, kind)
+            if self.filter(**{'%s__gte' % field_name: start, '%s__lt' % field_name: end}).exists():
+                periods.append(start)
+            start = end
+        return periods if order == 'ASC' else periods[::-1]
+
+
+class UserFilter(admin.SimpleListFilter):
+    """Filter by a typed username rather than a link for every user."""
+    title = 'user'
+    parameter_name = 'user'
+    template = 'admin/expenses/input_filter.html'
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'query_parts': [
+                (key, value) for key, value in changelist.params.items()
+                if key not in (self.parameter_name, 'p')
+            ],
+            'display': 'All',
+        }
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(user__username=self.value().strip())
+        return queryset
+
+
+class ExpenseChangeList(ChangeList):
+    def get_ordering(self, request, queryset):
+        # sortable_by only hides the headers; drop ?o= for the other columns
+        # too, leaving the default order if nothing else is asked for.
+        if self.sortable_by is not None and ORDER_VAR in self.params:
+            allowed = []
+            for part in self.params[ORDER_VAR].split('.'):
+                try:
+                    field_name = self.list_display[int(part.lstrip('-'))]
+                except (IndexError, ValueError):
+                    continue
+                if field_name in self.sortable_by:
+                    allowed.append(part)
+            if allowed:
+                self.params[ORDER_VAR] = '.'.join(allowed)
+            else:
+                del self.params[ORDER_VAR]
+        return super().get_ordering(request, queryset)
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'description', 'created_at')
     search_fields = ('name', 'description')
 
+@admin.register(Budget)
+class BudgetAdmin(admin.ModelAdmin):
+    list_display = ('user', 'category', 'amount', 'updated_at')
+    list_select_related = ('user', 'category')
+    autocomplete_fields = ('user', 'category')
+
+@admin.register(BudgetAlert)
+class BudgetAlertAdmin(admin.ModelAdmin):
+    list_display = ('budget', 'month', 'threshold', 'spent', 'created_at', 'sent_at')
+    list_select_related = ('budget__user', 'budget__category')
+    raw_id_fields = ('budget',)
+
 @admin.register(Expense)
 class ExpenseAdmin(admin.ModelAdmin):
     list_display = ('user', 'category', 'amount', 'description', 'date')
-    list_filter = ('category', 'date', 'user')
+    list_filter = ('category', 'date', UserFilter)
     search_fields = ('description', 'category__name')
     date_hierarchy = 'date'
+    list_select_related = ('user', 'category')
+    autocomplete_fields = ('user', 'category')
+    # The total comes from EstimatedCountPaginator; skip the second, unfiltered count.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(self.model, query=queryset.query.chain(), using=queryset._db)
+
+    def get_changelist(self, request, **kwargs):
+        return ExpenseChangeList
+
+    def get_sortable_by(self, request):
+        # Across all users only the date order has an index behind it; one
+        # user's expenses are few enough to sort by anything.
+        if request.GET.get(UserFilter.parameter_name):
+            return self.list_display
+        return ('date',)
+
+    def get_search_results(self, request, queryset, search_term):
+        # The indexed search in search.py rather than ILIKE '%term%' on each field.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        if len(search_term) < settings.EXPENSE_ADMIN_MIN_SEARCH_LENGTH:
+            self.message_user(request, 'Search for at least %d characters.' % (
+                settings.EXPENSE_ADMIN_MIN_SEARCH_LENGTH), messages.WARNING)
+            return queryset.none(), False
+        return search.search(queryset, search_term), False
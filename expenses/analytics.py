@@ -0,0 +1,173 @@
+"""
+Dense time series of a user's spending for charts.
+
+``time_series`` runs one grouped query (totals per day or month, and
+optionally per category) and then folds the rows into zero-filled NumPy
+arrays by bucket index, so the response holds parallel arrays that
+Chart.js can use as they are. What the query groups by depends on the
+bucket:
+
+- day and week: the plain ``date`` column, one row per day; days are folded
+  into weeks in NumPy rather than truncated in SQL.
+- month, quarter and year over whole months: ``ExpenseRollup``, which is
+  already one row per month, instead of the expenses themselves.
+- month, quarter and year over other ranges: the expense dates truncated to
+  months in SQL (``Trunc``); months are folded into quarters and years in
+  NumPy.
+
+The rollups still count archived expenses (``archive``), so the expense
+queries read ``Expense`` and ``ExpenseArchive`` together, with UNION ALL,
+and every bucket size gives the same totals.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, DateField, F, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import Expense, ExpenseArchive, ExpenseRollup
+
+BUCKETS = ('day', 'week', 'month', 'quarter', 'year')
+GROUPS = ('category', 'none')
+ROLLUP_BUCKETS = ('month', 'quarter', 'year')
+
+
+class TooManyBuckets(ValueError):
+    pass
+
+
+def bucket_start(day, bucket):
+    if bucket == 'day':
+        return day
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    if bucket == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day.replace(month=1, day=1)
+
+
+def bucket_index(days, first, bucket):
+    """Index of the bucket of each ``datetime64[D]`` in ``days``, counted from ``first``."""
+    if bucket in ('day', 'week'):
+        index = (days - np.datetime64(first, 'D')).astype(np.int64)
+        return index // 7 if bucket == 'week' else index
+    if bucket in ('month', 'quarter'):
+        index = (days.astype('datetime64[M]') - np.datetime64(first, 'M')).astype(np.int64)
+        return index // 3 if bucket == 'quarter' else index
+    return (days.astype('datetime64[Y]') - np.datetime64(first, 'Y')).astype(np.int64)
+
+
+def bucket_labels(first, size, bucket):
+    """ISO dates of the first day of ``size`` buckets starting at ``first``."""
+    steps = np.arange(size)
+    if bucket in ('day', 'week'):
+        starts = np.datetime64(first, 'D') + steps * (7 if bucket == 'week' else 1)
+    elif bucket in ('month', 'quarter'):
+        starts = np.datetime64(first, 'M') + steps * (3 if bucket == 'quarter' else 1)
+    else:
+        starts = np.datetime64(first, 'Y') + steps
+    return np.datetime_as_string(starts.astype('datetime64[D]')).tolist()
+
+
+def uses_rollups(start, end, bucket):
+    return (bucket in ROLLUP_BUCKETS
+            and (start is None or start.day == 1)
+            and (end is None or (end + timedelta(days=1)).day == 1))
+
+
+def grouped_rows(user, start, end, bucket, group_by):
+    """
+    ``(period, total, count[, category_id, category_name])`` rows from a
+    single grouped query. Periods are days for day and week buckets and
+    months otherwise; a period can come twice, from live and archived
+    expenses, and ``time_series`` adds them up as it folds them into the
+    buckets.
+    """
+    if uses_rollups(start, end, bucket):
+        return group(ExpenseRollup.objects.filter(user=user), 'month', start, end, bucket, group_by,
+                     {'sum_total': Sum('total'), 'sum_count': Sum('count')})
+    aggregates = {'sum_total': Sum('amount'), 'sum_count': Count('id')}
+    return group(Expense.objects.filter(user=user), 'date', start, end, bucket, group_by, aggregates).union(
+        group(ExpenseArchive.objects.filter(user=user), 'date', start, end, bucket, group_by, aggregates),
+        all=True)
+
+
+def group(queryset, field, start, end, bucket, group_by, aggregates):
+    if start is not None:
+        queryset = queryset.filter(**{field + '__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{field + '__lte': end})
+    if field == 'date' and bucket not in ('day', 'week'):
+        queryset = queryset.annotate(period=Trunc('date', 'month', output_field=DateField()))
+    else:
+        queryset = queryset.annotate(period=F(field))
+    keys = ['period'] + (['category_id', 'category__name'] if group_by == 'category' else [])
+    return queryset.values(*keys).annotate(**aggregates).order_by().values_list(
+        'period', 'sum_total', 'sum_count', *keys[1:])
+
+
+def cache_name(start=None, end=None, bucket='month', group_by='category'):
+    return 'analytics:%s:%s:%s:%s' % (bucket, group_by, start, end)
+
+
+def time_series(user, start=None, end=None, bucket='month', group_by='category'):
+    """
+    Return ``{'labels': [...], 'series': [{'name', 'totals', 'counts'}, ...]}``
+    with one zero-filled value per bucket from ``start`` to ``end`` (default:
+    the first expense to today).
+    """
+    rows = list(grouped_rows(user, start, end, bucket, group_by))
+    result = {
+        'bucket': bucket,
+        'group_by': group_by,
+        'start': start,
+        'end': end,
+        'labels': [],
+        'series': [],
+        'total': 0.0,
+    }
+    if not rows and start is None:
+        return result
+
+    periods = np.array([row[0] for row in rows], dtype='datetime64[D]')
+    first = bucket_start(start or periods.min().item(), bucket)
+    last = end or max([timezone.localdate()] + ([periods.max().item()] if rows else []))
+    size = max(1, int(bucket_index(np.array([last], dtype='datetime64[D]'), first, bucket)[0]) + 1)
+    maximum = getattr(settings, 'EXPENSE_ANALYTICS_MAX_BUCKETS', 10000)
+    if size > maximum:
+        raise TooManyBuckets('The range covers %d buckets; at most %d are allowed.' % (size, maximum))
+
+    # Amounts in cents, so that the sums stay exact.
+    cents = np.array([int(row[1] * 100) for row in rows], dtype=np.int64)
+    counts = np.array([row[2] for row in rows], dtype=np.int64)
+    index = bucket_index(periods, first, bucket)
+    if group_by == 'category':
+        names = {row[3]: row[4] for row in rows}
+        category_ids, group = np.unique(
+            np.array([row[3] for row in rows], dtype=np.int64), return_inverse=True)
+        category_ids = category_ids.tolist()
+    else:
+        category_ids, group = [None], np.zeros(len(rows), dtype=np.int64)
+
+    cent_totals = np.zeros((len(category_ids), size), dtype=np.int64)
+    count_totals = np.zeros((len(category_ids), size), dtype=np.int64)
+    np.add.at(cent_totals, (group, index), cents)
+    np.add.at(count_totals, (group, index), counts)
+
+    for row, category_id in enumerate(category_ids):
+        series = {
+            'name': 'Total' if category_id is None else names[category_id],
+            'totals': (cent_totals[row] / 100).tolist(),
+            'counts': count_totals[row].tolist(),
+        }
+        if category_id is not None:
+            series = {'category_id': category_id, **series}
+        result['series'].append(series)
+    result['series'].sort(key=lambda series: series['name'])
+    result['labels'] = bucket_labels(first, size, bucket)
+    result['total'] = int(cent_totals.sum()) / 100
+    return result
@@ -0,0 +1,89 @@
+"""
+Moving expenses older than a cutoff from ``Expense`` to ``ExpenseArchive``.
+
+Rows move with INSERT ... SELECT and DELETE, in batches of one transaction
+each, without the model signals: their ``ExpenseRollup`` rows stay as they
+are, so the dashboard totals, ``total_expenses``, ``expenses_by_category``
+and the analytics (which read this table for what the rollups cannot
+answer) still count archived expenses. Everything that lists or searches
+expenses (the expense list and API, search, exports) sees only the live
+ones.
+
+On a partitioned expense table (``partitions.py``) the partitions that end
+by the cutoff are detached, copied and dropped instead, which leaves no
+dead rows behind in the live table.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import partitions, rollups
+from .models import Expense, ExpenseArchive
+from .pagination import ASCENDING
+
+COLUMNS = ('id', 'user_id', 'category_id', 'amount', 'description', 'date',
+           'idempotency_key', 'created_at', 'updated_at')
+
+
+def copy_sql(connection, source, where=''):
+    """INSERT ... SELECT of the ``COLUMNS`` of ``source`` into the archive, plus ``archived_at``."""
+    qn = connection.ops.quote_name
+    columns = ', '.join(qn(column) for column in COLUMNS)
+    return 'INSERT INTO %s (%s, archived_at) SELECT %s, %%s FROM %s %s' % (
+        qn(ExpenseArchive._meta.db_table), columns, columns, qn(source), where)
+
+
+def archived_at(connection):
+    return connection.ops.adapt_datetimefield_value(timezone.now())
+
+
+def move_batch(connection, before, batch_size):
+    """Archive up to ``batch_size`` of the oldest expenses dated before ``before``; return how many."""
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias):
+        ids = list(Expense.objects.using(connection.alias).select_for_update().filter(
+            date__lt=before).order_by(*ASCENDING).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return 0
+        where = 'WHERE id IN (%s)' % ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(copy_sql(connection, Expense._meta.db_table, where), [archived_at(connection), *ids])
+            cursor.execute('DELETE FROM %s %s RETURNING user_id' % (qn(Expense._meta.db_table), where), ids)
+            rollups.changed(user_id for user_id, in cursor.fetchall())
+    return len(ids)
+
+
+def move_partition(connection, partition):
+    """Detach ``partition`` and archive its rows; return how many."""
+    qn = connection.ops.quote_name
+    with transaction.atomic(using=connection.alias):
+        with connection.cursor() as cursor:
+            cursor.execute('ALTER TABLE %s DETACH PARTITION %s' % (qn(partitions.TABLE), qn(partition.name)))
+            cursor.execute(copy_sql(connection, partition.name), [archived_at(connection)])
+            moved = cursor.rowcount
+            cursor.execute('SELECT DISTINCT user_id FROM %s' % qn(partition.name))
+            rollups.changed(user_id for user_id, in cursor.fetchall())
+            cursor.execute('DROP TABLE %s' % qn(partition.name))
+    return moved
+
+
+def archive(connection, before, batch_size=None, progress=None):
+    """
+    Move every expense dated before ``before`` to the archive and return how
+    many moved. ``progress``, if given, is called with the running total.
+    """
+    batch_size = batch_size or settings.EXPENSE_ARCHIVE_BATCH_SIZE
+    moved = 0
+    if partitions.is_partitioned(connection):
+        for partition in partitions.partitions(connection):
+            if not partition.is_default and partition.end <= before:
+                moved += move_partition(connection, partition)
+                if progress:
+                    progress(moved)
+    while True:
+        count = move_batch(connection, before, batch_size)
+        moved += count
+        if progress and count:
+            progress(moved)
+        if count < batch_size:
+            return moved
@@ -0,0 +1,30 @@
+"""
+URLs for ASGI deployments: the read paths served by ``async_views``, in
+front of the sync ``urls`` that handle everything else.
+"""
+from django.urls import path
+from . import async_views
+from .urls import router, urlpatterns as sync_urlpatterns
+
+api_views = {pattern.name: pattern.callback for pattern in router.urls}
+
+urlpatterns = [
+    path('dashboard/', async_views.dashboard, name='dashboard'),
+    path('dashboard/charts/<slug:name>/', async_views.dashboard_chart, name='dashboard_chart'),
+    path('expenses/', async_views.expense_list, name='expense_list'),
+    
+    # Read-only API; other methods go to ExpenseViewSet
+    path('api/expenses/',
+         async_views.read_only(async_views.api_expense_list, api_views['expense-list']),
+         name='expense-list'),
+    path('api/expenses/total_expenses/',
+         async_views.read_only(async_views.api_total_expenses, api_views['expense-total-expenses']),
+         name='expense-total-expenses'),
+    path('api/expenses/expenses_by_category/',
+         async_views.read_only(async_views.api_expenses_by_category,
+                               api_views['expense-expenses-by-category']),
+         name='expense-expenses-by-category'),
+    path('api/expenses/<int:pk>/',
+         async_views.read_only(async_views.api_expense_detail, api_views['expense-detail']),
+         name='expense-detail'),
+] + sync_urlpatterns
@@ -0,0 +1,232 @@
+"""
+Async versions of the dashboard, expense list and read-only API endpoints.
+
+``expenses/async_urls.py`` routes to these when ``EXPENSE_ASYNC_VIEWS`` is
+set, which ``expense_tracker/asgi.py`` does by default; WSGI deployments
+keep using the sync views in ``views.py``. The queries, caching and
+responses are the same as the sync views', so both can serve one database
+and one cache side by side.
+
+The async ORM still runs each query in a worker thread, but the event loop
+is free while a request waits on the database. A request's queries do not
+overlap: ``sync_to_async`` runs them all on one shared thread, which holds
+the database connection, so they take as long in total as in the sync
+views. Writes and every method other than GET are passed on to the sync DRF
+views.
+"""
+import functools
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.views import redirect_to_login
+from django.http import Http404, JsonResponse
+from django.shortcuts import render
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import budgets, caching, categories, charts, search, views
+from .conditional import conditional, conditional_page, not_modified
+from .models import Expense
+from .pagination import (
+    Cursor, ExpenseCursorPagination, SearchPagination, apaginate, apaginate_numbered, get_page_number,
+    get_page_size,
+)
+from .routing import replica_reads
+from .serializers import ExpenseSerializer, FlatExpenseSerializer
+from .stats import aget_dashboard_stats, aget_headline_stats
+
+arender = sync_to_async(render)
+
+
+@sync_to_async
+def get_session_user(request):
+    # Evaluating request.user loads the session, which is a sync query.
+    user = request.user
+    return user if user.is_authenticated else None
+
+
+@sync_to_async
+def get_api_user(request):
+    """Authenticate the way ``ExpenseViewSet`` does (session, then HTTP Basic)."""
+    authenticators = [auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    try:
+        user = Request(request, authenticators=authenticators).user
+    except AuthenticationFailed:
+        return None
+    return user if user.is_authenticated else None
+
+
+def login_required(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if await get_session_user(request) is None:
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def json_response(data, status=200):
+    # DRF's encoder, so that dates and decimals render as the sync API's do.
+    return JsonResponse(data, status=status, safe=False, encoder=JSONEncoder)
+
+
+def api_login_required(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await get_api_user(request)
+        if user is None:
+            return json_response({'detail': NotAuthenticated.default_detail}, status=403)
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def read_only(async_view, sync_view):
+    """Serve GET with ``async_view`` and every other method with ``sync_view``."""
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET':
+            return await async_view(request, *args, **kwargs)
+        return await sync_view(request, *args, **kwargs)
+    # The DRF views check CSRF themselves for session-authenticated writes.
+    view.csrf_exempt = True
+    return view
+
+
+def parse_cursor(request):
+    cursor = request.GET.get('cursor')
+    return Cursor.decode(cursor) if cursor else None
+
+
+# Template Views
+async def dashboard_context(user):
+    stats = await aget_headline_stats(user)
+    recent_expenses = await sync_to_async(list)(views.recent_expenses_query(user))
+    registry = await categories.aget()
+    budget_usage = await budgets.ausage(user)
+    return views.build_dashboard_context(stats, recent_expenses, len(registry), budget_usage)
+
+
+@login_required
+@replica_reads
+@conditional_page
+async def dashboard(request):
+    context = await caching.aget_or_compute(
+        request.user, 'dashboard', lambda: dashboard_context(request.user))
+    chart_version = await sync_to_async(caching.entry_tag)(request.user, 'charts')
+    return await arender(request, 'dashboard.html', dict(context, chart_version=chart_version or ''))
+
+
+@login_required
+@replica_reads
+async def dashboard_chart(request, name):
+    if name not in charts.CHARTS:
+        raise Http404('Unknown chart')
+    tag = await sync_to_async(caching.entry_tag)(request.user, 'chart:' + name)
+    response = not_modified(request, tag)
+    if response is None:
+        response = json_response(charts.CHARTS[name](await get_stats(request.user)))
+    return views.chart_response(response, tag)
+
+
+@login_required
+@replica_reads
+@conditional_page
+async def expense_list(request):
+    text = request.GET.get('q', '').strip()
+    if text:
+        # search() looks up the matching categories with a sync query.
+        page = await apaginate_numbered(
+            await sync_to_async(views.search_expenses)(request.user, text),
+            get_page_number(request.GET.get('page')),
+            get_page_size(request.GET.get('page_size')),
+        )
+        return await arender(request, 'expenses/expense_list.html', views.search_list_context(request, text, page))
+
+    try:
+        cursor = parse_cursor(request)
+    except ValueError:
+        raise Http404('Invalid cursor')
+    page = await apaginate(
+        Expense.objects.filter(user=request.user).select_related('category'),
+        cursor,
+        get_page_size(request.GET.get('page_size')),
+    )
+    return await arender(request, 'expenses/expense_list.html', views.expense_list_context(request, page))
+
+
+# API Views
+def serializer_class(request):
+    if request.GET.get('flat') in ('1', 'true'):
+        return FlatExpenseSerializer
+    return ExpenseSerializer
+
+
+def expense_queryset(request):
+    return Expense.objects.filter(user=request.user).select_related('user', 'category')
+
+
+@api_login_required
+@replica_reads
+@conditional
+async def api_expense_list(request):
+    text = request.GET.get('q', '').strip()
+    if text:
+        page = await apaginate_numbered(
+            search.ranked(await sync_to_async(search.search)(expense_queryset(request), text)),
+            get_page_number(request.GET.get('page')),
+            get_page_size(request.GET.get('page_size')),
+        )
+        pagination = SearchPagination()
+        pagination.request = request
+        pagination.page = page
+        return json_response(pagination.get_paginated_response(
+            serializer_class(request)(page.items, many=True).data).data)
+
+    try:
+        cursor = parse_cursor(request)
+    except ValueError:
+        return json_response({'detail': 'Invalid cursor'}, status=404)
+    page = await apaginate(
+        expense_queryset(request), cursor, get_page_size(request.GET.get('page_size')))
+
+    pagination = ExpenseCursorPagination()
+    pagination.request = request
+    return json_response({
+        'next': pagination.get_link(page.next_cursor),
+        'previous': pagination.get_link(page.previous_cursor),
+        'results': serializer_class(request)(page.items, many=True).data,
+    })
+
+
+@api_login_required
+@replica_reads
+@conditional
+async def api_expense_detail(request, pk):
+    try:
+        expense = await expense_queryset(request).aget(pk=pk)
+    except Expense.DoesNotExist:
+        return json_response({'detail': NotFound.default_detail}, status=404)
+    return json_response(serializer_class(request)(expense).data)
+
+
+async def get_stats(user):
+    return await caching.aget_or_compute(user, 'stats', lambda: aget_dashboard_stats(user))
+
+
+@api_login_required
+@replica_reads
+@conditional
+async def api_total_expenses(request):
+    stats = await get_stats(request.user)
+    return json_response({'total': stats.total})
+
+
+@api_login_required
+@replica_reads
+@conditional
+async def api_expenses_by_category(request):
+    stats = await get_stats(request.user)
+    return json_response(stats.by_category())
@@ -0,0 +1,131 @@
+"""
+Benchmarks run by ``manage.py benchmark``.
+
+Each module in ``MODULES`` registers one or more functions with
+``@benchmark``. A benchmark is called as ``func(stdout, options)`` and
+returns a dict of ``{case: {metric: value}}``. Metric names say which way
+is better: ``*_ms``, ``*_kb`` and ``queries`` should go down,
+``*_per_second`` and ``speedup`` should go up. Benchmarks run against a
+throwaway test database, never the configured one.
+"""
+import importlib
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+MODULES = [
+    'expenses.benchmarks.admin',
+    'expenses.benchmarks.analytics',
+    'expenses.benchmarks.budgets',
+    'expenses.benchmarks.bulk',
+    'expenses.benchmarks.categories',
+    'expenses.benchmarks.connections',
+    'expenses.benchmarks.dashboard',
+    'expenses.benchmarks.forecast',
+    'expenses.benchmarks.importer',
+    'expenses.benchmarks.instrumentation',
+    'expenses.benchmarks.pagination',
+    'expenses.benchmarks.partitioning',
+    'expenses.benchmarks.polling',
+    'expenses.benchmarks.search',
+    'expenses.benchmarks.statements',
+    'expenses.benchmarks.views',
+]
+
+REGISTRY = {}
+
+# Timing differences smaller than this are treated as noise.
+MIN_DELTA_MS = 1.0
+
+
+def benchmark(name):
+    def register(func):
+        REGISTRY[name] = func
+        return func
+    return register
+
+
+def load():
+    for module in MODULES:
+        importlib.import_module(module)
+    return REGISTRY
+
+
+def uncached():
+    """Settings under which every request computes its figures rather than reading them from the cache."""
+    return override_settings(CACHES=dict(settings.CACHES, benchmark={
+        'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}), EXPENSE_CACHE_ALIAS='benchmark')
+
+
+def timed(func, repeat=5):
+    """Call ``func`` ``repeat`` times and return each duration in milliseconds."""
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(durations):
+    return {
+        'p50_ms': round(percentile(durations, 50), 3),
+        'p95_ms': round(percentile(durations, 95), 3),
+        'p99_ms': round(percentile(durations, 99), 3),
+        'max_ms': round(max(durations), 3),
+    }
+
+
+def measure(func, repeat=20):
+    """
+    Latency percentiles of ``func`` plus, from separate calls so they do not
+    skew the timings, its query count, database time and allocation peak.
+    """
+    func()  # warm up caches and connections
+    result = summarize(timed(func, repeat))
+
+    with CaptureQueriesContext(connection) as queries:
+        func()
+    result['queries'] = len(queries.captured_queries)
+    result['db_ms'] = round(sum(float(q['time']) for q in queries.captured_queries) * 1000, 3)
+
+    tracemalloc.start()
+    try:
+        func()
+        result['alloc_peak_kb'] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+    return result
+
+
+def is_regression(metric, baseline, current, threshold):
+    if metric.endswith(('_per_second', 'speedup')):
+        return current < baseline * (1 - threshold)
+    if metric.endswith('_ms'):
+        return current > baseline * (1 + threshold) and current - baseline > MIN_DELTA_MS
+    if metric.endswith('_kb') or metric == 'queries':
+        return current > baseline * (1 + threshold)
+    return False
+
+
+def compare(baseline, current, threshold):
+    """Return a message for each metric in ``current`` that regressed past ``threshold``."""
+    regressions = []
+    for name, cases in current.items():
+        for case, metrics in cases.items():
+            previous = baseline.get(name, {}).get(case, {})
+            for metric, value in metrics.items():
+                if metric in previous and is_regression(metric, previous[metric], value, threshold):
+                    regressions.append('%s.%s.%s: %s -> %s' % (
+                        name, case, metric, previous[metric], value))
+    return regressions
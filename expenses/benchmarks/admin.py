@@ -0,0 +1,66 @@
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory
+
+from expenses import datagen, search
+from expenses.admin import ExpenseAdmin
+from expenses.models import Expense
+
+from . import benchmark, measure
+
+
+class PlainExpenseAdmin(admin.ModelAdmin):
+    """The changelist as configured before: exact counts, a link per user, any column sortable."""
+    list_display = ('user', 'category', 'amount', 'description', 'date')
+    list_filter = ('category', 'date', 'user')
+    search_fields = ('description', 'category__name')
+    date_hierarchy = 'date'
+    list_select_related = ('user', 'category')
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return search.search(queryset, search_term), False
+
+
+@benchmark('admin')
+def run(stdout, options):
+    """Loading the expense changelist, filtered and sorted, against the unscaled configuration."""
+    profile = datagen.PROFILES[options['profile']]
+    rows = datagen.generate(profile)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')  # what the row estimates come from
+    stdout.write('Seeded %d expenses for %d users (%s profile)' % (rows, profile.users, options['profile']))
+    user = User.objects.get(username=datagen.TEST_USERNAME)
+    user.is_staff = user.is_superuser = True
+    user.save()
+    latest = Expense.objects.latest('date').date
+    factory = RequestFactory()
+    admins = {
+        'plain': PlainExpenseAdmin(Expense, admin.AdminSite(name='plain')),
+        'scaled': ExpenseAdmin(Expense, admin.site),
+    }
+    queries = {
+        'all': ({}, {}),
+        'one_user': ({'user__id__exact': user.pk}, {'user': user.username}),
+        'year': ({'date__year': latest.year},) * 2,
+        'month': ({'date__year': latest.year, 'date__month': latest.month},) * 2,
+        'search': ({'q': 'dinner'},) * 2,
+        # list_display column 3 is the amount.
+        'sort_amount': ({'o': '3'},) * 2,
+    }
+
+    def changelist(model_admin, params):
+        request = factory.get('/admin/expenses/expense/', params)
+        request.user = user
+        return model_admin.changelist_view(request).render()
+
+    results = {}
+    for case, params in queries.items():
+        for (name, model_admin), query in zip(admins.items(), params):
+            key = '%s_%s' % (name, case)
+            results[key] = measure(lambda: changelist(model_admin, query), options['repeat'])
+            stdout.write('%s: p50 %.2f ms, p99 %.2f ms, %d queries' % (
+                key, results[key]['p50_ms'], results[key]['p99_ms'], results[key]['queries']))
+    return results
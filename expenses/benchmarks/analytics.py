@@ -0,0 +1,35 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from expenses import analytics, datagen
+
+from . import benchmark, measure
+
+# One user with ten years of daily expenses.
+PROFILE = datagen.Profile(users=1, days=10 * 365, per_day=3.0, categories=8)
+
+
+@benchmark('analytics')
+# One process, so its cache is as good as shared and the API case is cached.
+@override_settings(EXPENSE_CACHE_SHARED=True)
+def run(stdout, options):
+    """Time series endpoint per bucket size over ten years of daily data."""
+    rows = datagen.generate(PROFILE)
+    user = User.objects.get(username=datagen.TEST_USERNAME)
+    stdout.write('Seeded %d expenses over %d days' % (rows, PROFILE.days))
+    client = APIClient()
+    client.force_login(user)
+
+    results = {}
+    for bucket in analytics.BUCKETS:
+        cases = {
+            '%s_query' % bucket: lambda: analytics.time_series(user, bucket=bucket),
+            '%s_api_cached' % bucket: lambda: client.get(
+                '/api/expenses/analytics/', {'bucket': bucket}),
+        }
+        for case, func in cases.items():
+            results[case] = measure(func, options['repeat'])
+            stdout.write('%s: p50 %.2f ms, p99 %.2f ms, %d queries' % (
+                case, results[case]['p50_ms'], results[case]['p99_ms'], results[case]['queries']))
+    return results
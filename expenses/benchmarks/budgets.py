@@ -0,0 +1,54 @@
+from django.contrib.auth.models import User
+from django.db.models import Sum
+from django.utils import timezone
+
+from expenses import budgets, datagen
+from expenses.models import Budget, Category, Expense
+from expenses.stats import add_months, month_start
+
+from . import benchmark, measure
+
+# Expenses per day of the current month, so the month grows with the day.
+PER_DAY = {'default': 100, 'small': 1000, 'medium': 5000, 'large': 20000}
+
+
+def naive_check(user, category, month):
+    """Re-sum the month's expenses in the category and compare with the budget."""
+    spent = Expense.objects.filter(
+        user=user, category=category, date__gte=month, date__lt=add_months(month, 1),
+    ).aggregate(total=Sum('amount'))['total']
+    budget = Budget.objects.filter(user=user, category=category).values_list('amount', flat=True).first()
+    return budget is not None and spent >= budget
+
+
+@benchmark('budgets')
+def run(stdout, options):
+    """
+    Evaluating a budget after a write: re-summing the month's expenses
+    against the incremental check on the rollup row, and a whole create and
+    delete with the check included.
+    """
+    today = timezone.localdate()
+    profile = datagen.Profile(users=1, days=today.day, per_day=PER_DAY[options['profile']], categories=4)
+    rows = datagen.generate(profile)
+    user = User.objects.get(username=datagen.TEST_USERNAME)
+    category = Category.objects.order_by('pk').first()
+    month = month_start(today)
+    in_category = Expense.objects.filter(user=user, category=category, date__gte=month).count()
+    stdout.write('Seeded %d expenses this month, %d in the budget category' % (rows, in_category))
+    Budget.objects.create(user=user, category=category, amount=10 ** 9)
+
+    def write():
+        Expense.objects.create(user=user, category=category, amount=1, description='x', date=today).delete()
+
+    cases = {
+        'naive_check': lambda: naive_check(user, category, month),
+        'incremental_check': lambda: budgets.check(user.pk, category.pk, month, 1),
+        'create_delete': write,
+    }
+    results = {}
+    for case, func in cases.items():
+        results[case] = measure(func, options['repeat'])
+        stdout.write('%s: p50 %.2f ms, p99 %.2f ms, %d queries' % (
+            case, results[case]['p50_ms'], results[case]['p99_ms'], results[case]['queries']))
+    return results
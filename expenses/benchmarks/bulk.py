@@ -0,0 +1,54 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from rest_framework.test import APIClient
+
+from expenses.models import Category
+
+from . import benchmark
+
+ROWS = 2000
+
+
+def payload(category, count, offset=0):
+    return [
+        {'category_id': category.pk, 'amount': '12.34', 'description': 'row %d' % i,
+         'date': '2024-01-%02d' % (i % 28 + 1)}
+        for i in range(offset, offset + count)
+    ]
+
+
+def rows_per_second(func, rows):
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    return {'rows': rows, 'seconds': round(elapsed, 3), 'rows_per_second': round(rows / elapsed, 1)}
+
+
+@benchmark('bulk')
+def run(stdout, options):
+    """Throughput of POST /api/expenses/ per row versus /api/expenses/bulk/."""
+    client = APIClient()
+    client.force_authenticate(User.objects.create_user('bench-bulk'))
+    category = Category.objects.create(name='Benchmark')
+
+    def single():
+        for row in payload(category, ROWS):
+            client.post('/api/expenses/', row, format='json')
+
+    def bulk_json():
+        client.post('/api/expenses/bulk/', payload(category, ROWS, ROWS), format='json')
+
+    def bulk_ndjson():
+        body = '\n'.join(json.dumps(row) for row in payload(category, ROWS, 2 * ROWS))
+        client.post('/api/expenses/bulk/', body, content_type='application/x-ndjson')
+
+    results = {
+        'single_row': rows_per_second(single, ROWS),
+        'bulk_json': rows_per_second(bulk_json, ROWS),
+        'bulk_ndjson': rows_per_second(bulk_ndjson, ROWS),
+    }
+    for case, result in results.items():
+        stdout.write('%s: %.0f rows/s' % (case, result['rows_per_second']))
+    return results
@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from expenses import caching, categories, datagen
+from expenses.models import Category, Expense
+
+from . import benchmark, measure
+
+
+@benchmark('categories')
+def run(stdout, options):
+    """
+    Pages and endpoints that look categories up, with the process-local
+    registry and with it reloaded on every lookup, i.e. a category query per
+    use as before the registry.
+    """
+    profile = datagen.PROFILES[options['profile']]
+    rows = datagen.generate(profile)
+    stdout.write('Seeded %d expenses for %d users (%s profile)' % (rows, profile.users, options['profile']))
+
+    user = User.objects.get(username=datagen.TEST_USERNAME)
+    client = APIClient()
+    client.force_login(user)
+    category = Category.objects.order_by('pk').first()
+    expense = Expense.objects.filter(user=user).order_by('pk').first()
+    form = {'category': category.pk, 'amount': '12.34', 'description': 'Benchmark', 'date': '2024-01-01'}
+
+    def dashboard():
+        # Recompute the context each time rather than serve it from the cache.
+        caching.invalidate_users([user.pk])
+        return client.get(reverse('dashboard'))
+
+    pages = {
+        'create_form': lambda: client.get(reverse('expense_create')),
+        'create_post': lambda: client.post(reverse('expense_create'), form),
+        'update_form': lambda: client.get(reverse('expense_update', args=[expense.pk])),
+        'dashboard': dashboard,
+        'api_categories': lambda: client.get('/api/categories/'),
+        'api_create': lambda: client.post('/api/expenses/', dict(form, category_id=category.pk), format='json'),
+        'api_search': lambda: client.get('/api/expenses/', {'q': 'coffee'}),
+    }
+    results = {}
+    for page, func in pages.items():
+        for variant, stale in (('per_request', True), ('registry', False)):
+            case = '%s_%s' % (page, variant)
+            with mock.patch.object(categories, 'is_stale', lambda registry, version: stale or registry is None):
+                results[case] = measure(func, options['repeat'])
+            stdout.write('%s: p50 %.2f ms, p99 %.2f ms, %d queries' % (
+                case, results[case]['p50_ms'], results[case]['p99_ms'], results[case]['queries']))
+    return results
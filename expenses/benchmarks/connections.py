@@ -0,0 +1,87 @@
+import copy
+import importlib.util
+
+from django.db import connection
+from django.db.utils import load_backend
+
+from expense_tracker.database import POOL_ENGINE
+
+from . import benchmark, summarize, timed
+
+QUERY = 'SELECT 1'
+
+
+def new_wrapper(alias=None, **overrides):
+    """A connection with the test database's settings, outside ``connections``."""
+    settings_dict = copy.deepcopy(connection.settings_dict)
+    settings_dict.update(overrides)
+    return load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias or connection.alias)
+
+
+def run_query(wrapper):
+    with wrapper.cursor() as cursor:
+        cursor.execute(QUERY)
+        cursor.fetchone()
+
+
+def connect_per_request():
+    # CONN_MAX_AGE = 0: a new connection (and TLS handshake) for every request.
+    wrapper = new_wrapper(CONN_MAX_AGE=0)
+    try:
+        run_query(wrapper)
+    finally:
+        wrapper.close()
+
+
+def persistent():
+    wrapper = new_wrapper(CONN_MAX_AGE=None, CONN_HEALTH_CHECKS=True)
+
+    def request():
+        # What request_started does: drop a broken connection and check a
+        # reused one again before its first query.
+        wrapper.close_if_unusable_or_obsolete()
+        run_query(wrapper)
+    return wrapper, request
+
+
+def pooled():
+    options = dict(connection.settings_dict['OPTIONS'], pool={'min_size': 1, 'max_size': 4})
+
+    def request():
+        # A new thread (as under ASGI) borrowing from the shared pool.
+        wrapper = new_wrapper('benchmark-pool', ENGINE=POOL_ENGINE, CONN_MAX_AGE=0, OPTIONS=options)
+        try:
+            run_query(wrapper)
+        finally:
+            wrapper.close()
+    return load_backend(POOL_ENGINE), request
+
+
+@benchmark('connections')
+def run(stdout, options):
+    """Per-request cost of a new connection versus a persistent or pooled one."""
+    repeat = max(options['repeat'], 50)
+    results = {'connect_per_request': summarize(timed(connect_per_request, repeat))}
+
+    wrapper, request = persistent()
+    try:
+        request()
+        results['persistent'] = summarize(timed(request, repeat))
+    finally:
+        wrapper.close()
+
+    if connection.vendor == 'postgresql' and importlib.util.find_spec('psycopg_pool'):
+        backend, request = pooled()
+        try:
+            request()
+            results['pooled'] = summarize(timed(request, repeat))
+        finally:
+            backend.close_pools()
+    else:
+        stdout.write('Skipping the pooled case: it needs PostgreSQL with psycopg 3 and psycopg_pool')
+
+    baseline = results['connect_per_request']['p50_ms']
+    for case, result in results.items():
+        stdout.write('%s: p50 %.2f ms, p99 %.2f ms (%.2f ms saved per request)' % (
+            case, result['p50_ms'], result['p99_ms'], baseline - result['p50_ms']))
+    return results
@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from expenses import charts, datagen, views
+from expenses.stats import get_dashboard_stats
+
+from . import benchmark, measure, uncached
+
+
+@benchmark('dashboard')
+def run(stdout, options):
+    """
+    Time to first byte of the dashboard page and time until its charts have
+    loaded, uncached. The browser fetches the charts in parallel once the
+    page is in, so full render is the page plus the slowest chart.
+    ``inline_stats`` is the chart computation the page used to do before
+    sending anything, and ``inline_page`` the page doing it again, i.e. its
+    time to first byte before the charts moved out (less rendering the
+    chart data into the page, which the template no longer has).
+    """
+    profile = datagen.PROFILES[options['profile']]
+    rows = datagen.generate(profile)
+    stdout.write('Seeded %d expenses for %d users (%s profile)' % (rows, profile.users, options['profile']))
+    user = User.objects.get(username=datagen.TEST_USERNAME)
+    client = APIClient()
+    client.force_login(user)
+
+    def inline_page():
+        with mock.patch.object(views, 'get_headline_stats', get_dashboard_stats):
+            return client.get(reverse('dashboard'))
+
+    cases = {
+        'page': lambda: client.get(reverse('dashboard')),
+        'inline_stats': lambda: get_dashboard_stats(user),
+        'inline_page': inline_page,
+    }
+    for name in charts.CHARTS:
+        url = reverse('dashboard_chart', args=[name])
+        cases['chart_%s' % name] = lambda url=url: client.get(url)
+
+    results = {}
+    with uncached():
+        for case, func in cases.items():
+            results[case] = measure(func, options['repeat'])
+            stdout.write('%s: p50 %.2f ms, p99 %.2f ms, %d queries' % (
+                case, results[case]['p50_ms'], results[case]['p99_ms'], results[case]['queries']))
+
+    slowest_chart = max(results['chart_%s' % name]['p50_ms'] for name in charts.CHARTS)
+    results['full_render'] = {'p50_ms': round(results['page']['p50_ms'] + slowest_chart, 3)}
+
+    # Revalidating a chart with the real cache, which keeps the versions ETags
+    # come from; one process, so it is as good as shared.
+    url = reverse('dashboard_chart', args=['trend'])
+    with override_settings(EXPENSE_CACHE_SHARED=True):
+        etag = client.get(url)['ETag']
+        results['chart_revalidate'] = measure(
+            lambda: client.get(url, HTTP_IF_NONE_MATCH=etag), options['repeat'])
+    stdout.write('ttfb %.2f ms (%.2f ms with the charts inline), full render %.2f ms, 304 revalidation %.2f ms' % (
+        results['page']['p50_ms'], results['inline_page']['p50_ms'],
+        results['full_render']['p50_ms'], results['chart_revalidate']['p50_ms']))
+    return results
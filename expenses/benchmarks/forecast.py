@@ -0,0 +1,93 @@
+import calendar
+import math
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from expenses import datagen, forecast
+
+from . import benchmark, measure, summarize, timed
+
+SYNTHETIC_USERS = 100000
+SYNTHETIC_CATEGORIES = 6
+BATCH_SIZE = 1000
+# Users the pure-Python loop runs over; its rate is per user like the rest.
+LOOP_SAMPLE = 2000
+
+
+def synthetic_batch(rng, first_user_id):
+    """The ``fold`` arrays of BATCH_SIZE users with a few categories of sparse daily spending."""
+    users = np.repeat(np.arange(first_user_id, first_user_id + BATCH_SIZE), SYNTHETIC_CATEGORIES)
+    categories = np.tile(np.arange(1, SYNTHETIC_CATEGORIES + 1), BATCH_SIZE)
+    pairs = np.column_stack([users, categories]).astype(np.int64)
+    daily = rng.gamma(2.0, 1500.0, (len(pairs), forecast.HISTORY_DAYS)).round()
+    daily[rng.random(daily.shape) < 0.7] = 0
+    return pairs, daily
+
+
+def loop_stats(series, today):
+    """The figures of ``forecast.series_stats`` for one series, one day at a time."""
+    days = len(series)
+    remaining = calendar.monthrange(today.year, today.month)[1] - today.day
+    spent = sum(series[days - today.day:])
+    average_30 = sum(series[-30:]) / 30
+    flagged = []
+    for day in range(days - forecast.RECENT_DAYS, days):
+        window = series[day - forecast.BASELINE_DAYS:day]
+        mean = sum(window) / len(window)
+        std = math.sqrt(max(sum(x * x for x in window) / len(window) - mean * mean, 0))
+        if std >= forecast.MIN_STD_CENTS and series[day] > 0 and (series[day] - mean) / std >= forecast.Z_THRESHOLD:
+            flagged.append(day)
+    return spent, sum(series[-7:]) / 7, average_30, spent + average_30 * remaining, flagged
+
+
+@benchmark('forecast')
+def run(stdout, options):
+    """
+    Forecasts per user from the database, then the NumPy summary alone for
+    100k synthetic users in batches of 1000 against the same figures from a
+    per-series Python loop, in users per second.
+    """
+    profile = datagen.PROFILES[options['profile']]
+    rows = datagen.generate(profile)
+    stdout.write('Seeded %d expenses for %d users (%s profile)' % (rows, profile.users, options['profile']))
+    today = timezone.localdate()
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    user = User.objects.get(pk=user_ids[0])
+
+    results = {}
+    cases = {
+        'single_user': (lambda: forecast.forecast(user, today), 1),
+        'batch_db': (lambda: forecast.forecasts(user_ids, today), len(user_ids)),
+    }
+    for case, (func, users) in cases.items():
+        results[case] = measure(func, options['repeat'])
+        results[case]['users_per_second'] = round(users / results[case]['p50_ms'] * 1000, 1)
+        stdout.write('%s: p50 %.2f ms, %d queries, %.0f users/s' % (
+            case, results[case]['p50_ms'], results[case]['queries'], results[case]['users_per_second']))
+
+    rng = np.random.default_rng(profile.seed)
+    batches = [synthetic_batch(rng, start) for start in range(0, SYNTHETIC_USERS, BATCH_SIZE)]
+    names = {category: 'Category %d' % category for category in range(1, SYNTHETIC_CATEGORIES + 1)}
+
+    def vectorized():
+        for start, (pairs, daily) in zip(range(0, SYNTHETIC_USERS, BATCH_SIZE), batches):
+            forecast.summarize(range(start, start + BATCH_SIZE), pairs, daily, names, today)
+
+    sample = [row.tolist() for pairs, daily in batches[:LOOP_SAMPLE // BATCH_SIZE] for row in daily]
+
+    def loop():
+        for series in sample:
+            loop_stats(series, today)
+
+    repeat = max(1, min(options['repeat'], 3))
+    for case, func, users in (('numpy_100k', vectorized, SYNTHETIC_USERS), ('python_loop', loop, LOOP_SAMPLE)):
+        results[case] = summarize(timed(func, repeat))
+        results[case]['users_per_second'] = round(users / results[case]['p50_ms'] * 1000, 1)
+        stdout.write('%s: %d users, p50 %.0f ms, %.0f users/s' % (
+            case, users, results[case]['p50_ms'], results[case]['users_per_second']))
+    results['numpy_100k']['speedup'] = round(
+        results['numpy_100k']['users_per_second'] / results['python_loop']['users_per_second'], 1)
+    stdout.write('NumPy speedup over the loop: %.1fx' % results['numpy_100k']['speedup'])
+    return results
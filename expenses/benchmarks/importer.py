@@ -0,0 +1,61 @@
+import csv
+import os
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+
+from expenses.models import Category, Expense
+
+from . import benchmark
+
+ROWS = 50000
+BASELINE_ROWS = 2000
+CATEGORIES = ('Food & Dining', 'Transportation', 'Housing', 'Shopping')
+
+
+def write_csv(path, rows):
+    start = date(2024, 1, 1)
+    with open(path, 'w', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(['date', 'category', 'amount', 'description'])
+        for i in range(rows):
+            writer.writerow([(start + timedelta(days=i % 365)).isoformat(),
+                             CATEGORIES[i % len(CATEGORIES)], '%d.%02d' % (i % 500, i % 100),
+                             'row %d' % i])
+
+
+@benchmark('import')
+def run(stdout, options):
+    """Rows/s of import_expenses versus creating expenses one at a time."""
+    user = User.objects.create_user('bench-import')
+    categories = [Category.objects.create(name=name) for name in CATEGORIES]
+
+    start = time.perf_counter()
+    for i in range(BASELINE_ROWS):
+        Expense.objects.create(user=user, category=categories[i % len(categories)],
+                               amount=Decimal('1.00'), description='row %d' % i,
+                               date=date(2024, 1, 1))
+    baseline = BASELINE_ROWS / (time.perf_counter() - start)
+
+    results = {'one_at_a_time': {'rows_per_second': round(baseline, 1)}}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'expenses.csv')
+        write_csv(path, ROWS)
+        for workers in (1, 4):
+            username = 'bench-import-%d' % workers
+            User.objects.create_user(username)
+            start = time.perf_counter()
+            call_command('import_expenses', path, user=username, workers=workers,
+                         checkpoint=path + '.%d' % workers, stdout=StringIO())
+            rate = ROWS / (time.perf_counter() - start)
+            results['import_workers_%d' % workers] = {
+                'rows_per_second': round(rate, 1), 'speedup': round(rate / baseline, 1)}
+
+    for case, result in results.items():
+        stdout.write('%s: %.0f rows/s' % (case, result['rows_per_second']))
+    return results
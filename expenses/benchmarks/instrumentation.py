@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from expenses import datagen
+
+from . import benchmark, percentile, timed
+
+MIDDLEWARE = 'expenses.instrumentation.RequestMetricsMiddleware'
+
+
+@benchmark('instrumentation')
+def run(stdout, options):
+    """Latency with and without RequestMetricsMiddleware (profiling off)."""
+    datagen.generate(datagen.PROFILES[options['profile']])
+    user = User.objects.get(username=datagen.TEST_USERNAME)
+    without = [name for name in settings.MIDDLEWARE if name != MIDDLEWARE]
+    with_middleware = without + [MIDDLEWARE]
+    repeat = max(options['repeat'], 50)
+
+    results = {}
+    for case, url in (('home', reverse('home')), ('api_list', '/api/expenses/'),
+                      ('expense_list', reverse('expense_list'))):
+        timings = {}
+        for label, middleware in (('off', without), ('on', with_middleware)):
+            with override_settings(MIDDLEWARE=middleware):
+                client = APIClient()
+                client.force_login(user)
+                client.get(url)
+                timings[label] = percentile(timed(lambda: client.get(url), repeat), 50)
+        results[case] = {
+            'p50_off_ms': round(timings['off'], 3),
+            'p50_on_ms': round(timings['on'], 3),
+            'overhead_pct': round((timings['on'] / timings['off'] - 1) * 100, 2),
+        }
+        stdout.write('%s: %.2f ms -> %.2f ms (%+.1f%%)' % (
+            case, timings['off'], timings['on'], results[case]['overhead_pct']))
+    return results
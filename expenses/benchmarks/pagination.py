@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+
+from expenses.models import Category, Expense
+from expenses.pagination import Cursor, paginate
+
+from . import benchmark, summarize, timed
+
+PAGE_SIZE = 10
+DEPTHS = (1, 1000, 10000)
+
+
+def seed(rows):
+    user = User.objects.create_user('bench-pagination')
+    category = Category.objects.create(name='Benchmark')
+    start = date.today()
+    Expense.objects.bulk_create(
+        (Expense(user=user, category=category, amount=Decimal('1.00'),
+                 description='row %d' % i, date=start - timedelta(days=i // 20))
+         for i in range(rows)),
+        batch_size=5000,
+    )
+    return user
+
+
+@benchmark('pagination')
+def run(stdout, options):
+    """Page latency at increasing depth: keyset cursor versus OFFSET."""
+    user = seed(PAGE_SIZE * (max(DEPTHS) + 1))
+    expenses = Expense.objects.filter(user=user)
+    results = {}
+    for depth in DEPTHS:
+        offset = (depth - 1) * PAGE_SIZE
+        cursor = None
+        if offset:
+            # Setup only: find the row just before the page being measured.
+            cursor = Cursor.for_row(expenses[offset - 1])
+        results['keyset_page_%d' % depth] = summarize(
+            timed(lambda: paginate(expenses, cursor, PAGE_SIZE), options['repeat']))
+        results['offset_page_%d' % depth] = summarize(
+            timed(lambda: list(expenses[offset:offset + PAGE_SIZE]), options['repeat']))
+        stdout.write('page %d: keyset %.2f ms, offset %.2f ms' % (
+            depth, results['keyset_page_%d' % depth]['p50_ms'],
+            results['offset_page_%d' % depth]['p50_ms']))
+    return results
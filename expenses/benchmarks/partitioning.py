@@ -0,0 +1,66 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from expenses import archive, datagen, partitions
+from expenses.models import Expense
+from expenses.pagination import paginate
+from expenses.stats import add_months, get_dashboard_stats, window_aggregates
+
+from . import benchmark, measure
+
+# Expenses this many months old or newer stay live.
+KEEP_MONTHS = 3
+
+
+@benchmark('partitioning')
+def run(stdout, options):
+    """
+    The hot-window queries (dashboard windows, newest expense page, last
+    month across all users) on the plain table, partitioned by month
+    (PostgreSQL only) and with everything older than KEEP_MONTHS archived.
+    """
+    profile = datagen.PROFILES[options['profile']]
+    rows = datagen.generate(profile)
+    stdout.write('Seeded %d expenses for %d users (%s profile)' % (rows, profile.users, options['profile']))
+    user = User.objects.get(username=datagen.TEST_USERNAME)
+    today = timezone.localdate()
+    cases = {
+        'windows': lambda: window_aggregates(user, today)[0].aggregate(**window_aggregates(user, today)[1]),
+        'first_page': lambda: paginate(Expense.objects.filter(user=user)),
+        'everyone_last_month': lambda: Expense.objects.filter(
+            date__gte=today - timedelta(days=30)).aggregate(total=Sum('amount')),
+        'dashboard_stats': lambda: get_dashboard_stats(user, today),
+    }
+
+    def measure_stage(stage):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        for case, func in cases.items():
+            key = '%s_%s' % (stage, case)
+            results[key] = measure(func, options['repeat'])
+            stdout.write('%s: p50 %.2f ms, p99 %.2f ms, %d queries' % (
+                key, results[key]['p50_ms'], results[key]['p99_ms'], results[key]['queries']))
+
+    results = {}
+    total = get_dashboard_stats(user, today).total
+    measure_stage('plain')
+    if connection.vendor == 'postgresql':
+        start = time.perf_counter()
+        with transaction.atomic():
+            partitions.convert(connection, 'month', today, ahead=3)
+        results['convert'] = {'total_ms': round((time.perf_counter() - start) * 1000, 3)}
+        measure_stage('partitioned')
+
+    start = time.perf_counter()
+    moved = archive.archive(connection, add_months(today, -KEEP_MONTHS))
+    results['archive'] = {'total_ms': round((time.perf_counter() - start) * 1000, 3)}
+    stdout.write('Archived %d of %d expenses in %.0f ms' % (moved, rows, results['archive']['total_ms']))
+    measure_stage('archived')
+    if get_dashboard_stats(user, today).total != total:
+        raise RuntimeError('archiving changed the all-time total')
+    return results
@@ -0,0 +1,41 @@
+from django.contrib.auth.models import User
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from expenses import datagen
+
+from . import benchmark, measure
+
+
+@benchmark('polling')
+# One process, so its cache is as good as shared.
+@override_settings(EXPENSE_CACHE_SHARED=True)
+def run(stdout, options):
+    """Cost of a client polling unchanged endpoints, with and without If-None-Match."""
+    profile = datagen.PROFILES[options['profile']]
+    rows = datagen.generate(profile)
+    stdout.write('Seeded %d expenses for %d users (%s profile)' % (rows, profile.users, options['profile']))
+    client = APIClient()
+    client.force_login(User.objects.get(username=datagen.TEST_USERNAME))
+
+    urls = {
+        'api_list': '/api/expenses/',
+        'api_total_expenses': '/api/expenses/total_expenses/',
+        'api_expenses_by_category': '/api/expenses/expenses_by_category/',
+        'expense_list': reverse('expense_list'),
+        'dashboard': reverse('dashboard'),
+    }
+    results = {}
+    for name, url in urls.items():
+        etag = client.get(url)['ETag']
+        cases = {
+            '%s_full' % name: lambda: client.get(url),
+            '%s_not_modified' % name: lambda: client.get(url, HTTP_IF_NONE_MATCH=etag),
+        }
+        for case, func in cases.items():
+            results[case] = measure(func, options['repeat'])
+            stdout.write('%s: p50 %.2f ms, p99 %.2f ms, %d queries, %.0f KiB peak' % (
+                case, results[case]['p50_ms'], results[case]['p99_ms'],
+                results[case]['queries'], results[case]['alloc_peak_kb']))
+    return results
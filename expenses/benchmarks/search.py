@@ -0,0 +1,60 @@
+from datetime import date
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models import Q
+from rest_framework.test import APIClient
+
+from expenses import datagen, search
+from expenses.models import Category, Expense
+from expenses.pagination import DESCENDING
+
+from . import benchmark, measure
+
+PAGE_SIZE = 50
+# A common word, a word prefix and a rare word (seeded below).
+TERMS = ('dinner', 'shop', 'vintage')
+
+
+def ilike(queryset, text):
+    """What the admin did before: ILIKE '%text%' on each search field."""
+    return queryset.filter(Q(description__icontains=text) | Q(category__name__icontains=text))
+
+
+@benchmark('search')
+def run(stdout, options):
+    """Searching all expenses (admin) and one user's (API): ranked search versus ILIKE."""
+    profile = datagen.PROFILES[options['profile']]
+    rows = datagen.generate(profile)
+    user = User.objects.get(username=datagen.TEST_USERNAME)
+    Expense.objects.bulk_create([
+        Expense(user=user, category=Category.objects.first(), amount=Decimal('99.00'),
+                description='Vintage camera %d' % i, date=date.today())
+        for i in range(10)
+    ])
+    stdout.write('Seeded %d expenses for %d users (%s profile)' % (rows + 10, profile.users, options['profile']))
+    client = APIClient()
+    client.force_login(user)
+
+    results = {}
+    for term in TERMS:
+        everyone = Expense.objects.all()
+        cases = {
+            # The admin changelist counts the matches and shows the newest page.
+            'admin_ilike_%s' % term: lambda: (
+                ilike(everyone, term).count(), list(ilike(everyone, term).order_by(*DESCENDING)[:PAGE_SIZE])),
+            'admin_search_%s' % term: lambda: (
+                search.search(everyone, term).count(),
+                list(search.search(everyone, term).order_by(*DESCENDING)[:PAGE_SIZE])),
+            'user_ilike_%s' % term: lambda: list(
+                ilike(Expense.objects.filter(user=user), term).order_by(*DESCENDING)[:PAGE_SIZE]),
+            'user_search_%s' % term: lambda: list(
+                search.ranked(search.search(Expense.objects.filter(user=user), term))[:PAGE_SIZE]),
+            'api_search_%s' % term: lambda: client.get(
+                '/api/expenses/', {'q': term, 'page_size': PAGE_SIZE}),
+        }
+        for case, func in cases.items():
+            results[case] = measure(func, options['repeat'])
+            stdout.write('%s: p50 %.2f ms, p99 %.2f ms, %d queries' % (
+                case, results[case]['p50_ms'], results[case]['p99_ms'], results[case]['queries']))
+    return results
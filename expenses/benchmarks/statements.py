@@ -0,0 +1,56 @@
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from expenses import datagen, statements
+from expenses.models import Expense
+from expenses.stats import add_months, get_dashboard_stats
+
+from . import benchmark, measure
+
+
+def per_user(user_ids, month, directory):
+    """Statements the way a view would build them: the dashboard figures and a query per user."""
+    end = add_months(month, 1)
+    for user in User.objects.filter(pk__in=user_ids).order_by('pk'):
+        stats = get_dashboard_stats(user, today=end - timedelta(days=1))
+        statement = statements.Statement(
+            user.pk, user.username, month, stats.current_month_total, previous_total=stats.previous_month_total)
+        statement.top_expenses = [
+            statements.TopExpense(e.date, e.category.name, e.description, e.amount)
+            for e in Expense.objects.filter(user=user, date__gte=month, date__lt=end).select_related(
+                'category').order_by('-amount', '-date', 'id')[:statements.TOP_EXPENSES]
+        ]
+        statements.write_statement(statement, directory)
+
+
+@benchmark('statements')
+def run(stdout, options):
+    """
+    Monthly statements for every user: per-user view logic against set-based
+    shards, in users per second. Runs in one process, since benchmark data
+    is not committed where worker processes could see it.
+    """
+    profile = datagen.PROFILES[options['profile']]
+    rows = datagen.generate(profile)
+    stdout.write('Seeded %d expenses for %d users (%s profile)' % (rows, profile.users, options['profile']))
+    user_ids = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    month = add_months(timezone.localdate(), -1)
+    directory = tempfile.mkdtemp()
+    try:
+        cases = {
+            'per_user': lambda: per_user(user_ids, month, directory),
+            'shards': lambda: statements.generate(user_ids, month, directory),
+        }
+        results = {}
+        for case, func in cases.items():
+            results[case] = measure(func, options['repeat'])
+            results[case]['users_per_second'] = round(len(user_ids) / results[case]['p50_ms'] * 1000, 1)
+            stdout.write('%s: p50 %.2f ms, %d queries, %.0f users/s' % (
+                case, results[case]['p50_ms'], results[case]['queries'], results[case]['users_per_second']))
+    finally:
+        shutil.rmtree(directory)
+    return results
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from expenses import datagen
+from expenses.models import Category
+
+from . import benchmark, measure, uncached
+
+
+@benchmark('views')
+def run(stdout, options):
+    """Hot pages and API endpoints for testuser on a seeded dataset, uncached."""
+    profile = datagen.PROFILES[options['profile']]
+    rows = datagen.generate(profile)
+    stdout.write('Seeded %d expenses for %d users (%s profile)' % (rows, profile.users, options['profile']))
+
+    client = APIClient()
+    client.force_login(User.objects.get(username=datagen.TEST_USERNAME))
+    category = Category.objects.first()
+    new_expense = {'category_id': category.pk, 'amount': '12.34',
+                   'description': 'Benchmark', 'date': '2024-01-01'}
+
+    cases = {
+        'dashboard': lambda: client.get(reverse('dashboard')),
+        'expense_list': lambda: client.get(reverse('expense_list')),
+        'api_list': lambda: client.get('/api/expenses/'),
+        'api_create': lambda: client.post('/api/expenses/', new_expense, format='json'),
+        'api_total_expenses': lambda: client.get('/api/expenses/total_expenses/'),
+        'api_expenses_by_category': lambda: client.get('/api/expenses/expenses_by_category/'),
+    }
+    results = {}
+    with uncached():
+        for case, func in cases.items():
+            results[case] = measure(func, options['repeat'])
+            stdout.write('%s: p50 %.2f ms, p99 %.2f ms, %d queries, %.0f KiB peak' % (
+                case, results[case]['p50_ms'], results[case]['p99_ms'],
+                results[case]['queries'], results[case]['alloc_peak_kb']))
+    return results
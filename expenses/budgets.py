@@ -0,0 +1,165 @@
+"""
+Monthly category budgets, evaluated as expenses change.
+
+A month's spending per category is already kept as a running total:
+``ExpenseRollup`` is updated by deltas on every create, update and delete
+(``rollups``), including an expense moving to another category or month.
+``rollups`` passes every increase to ``check``, which reads the budget and
+the new total together in one indexed query, whatever the month holds, and
+compares the totals before and after the change with the thresholds in
+``EXPENSE_BUDGET_THRESHOLDS`` (percent of the budget).
+
+A crossed threshold is queued as a ``BudgetAlert`` row in the transaction
+of the expense write and sent later by ``manage.py send_budget_alerts``,
+never inside the request. Each threshold alerts at most once per budget
+and month. Only the current month is checked, so editing or importing old
+expenses raises no alerts.
+
+``reconcile`` (``manage.py reconcile_budgets``) recomputes a month's totals
+from the raw expenses, repairs rollup rows that drifted and queues any
+alerts the drift hid. ``usage`` gives the dashboard each budget with its
+month-to-date total, again from the rollups.
+"""
+from dataclasses import dataclass
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import DecimalField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import rollups
+from .models import Budget, BudgetAlert, ExpenseRollup
+from .stats import ZERO, month_start
+
+
+@dataclass
+class BudgetUsage:
+    category_id: int
+    name: str
+    amount: Decimal
+    spent: Decimal = ZERO
+
+    @property
+    def percent(self):
+        return self.spent / self.amount * 100 if self.amount > 0 else Decimal('100')
+
+    @property
+    def remaining(self):
+        return self.amount - self.spent
+
+
+def thresholds():
+    return sorted(getattr(settings, 'EXPENSE_BUDGET_THRESHOLDS', (80, 100)))
+
+
+def reached(amount, spent):
+    """The thresholds, in percent of the budget ``amount``, that ``spent`` has reached."""
+    return [threshold for threshold in thresholds() if spent >= amount * threshold / 100]
+
+
+def crossed(amount, before, after):
+    """The thresholds a total going from ``before`` to ``after`` reached on the way."""
+    return [threshold for threshold in reached(amount, after) if before < amount * threshold / 100]
+
+
+def with_spent(budgets, month):
+    """Annotate ``budgets`` with ``spent``, their rollup total for ``month``."""
+    total = ExpenseRollup.objects.filter(
+        user_id=OuterRef('user_id'), category_id=OuterRef('category_id'), month=month,
+    ).order_by().values('total')[:1]
+    return budgets.annotate(spent=Coalesce(
+        Subquery(total), Value(ZERO), output_field=DecimalField(max_digits=14, decimal_places=2)))
+
+
+def check(user_id, category_id, month, amount, today=None):
+    """
+    Queue the alerts a rollup increase of ``amount`` for the user's category
+    in ``month`` triggered; called right after the rollup row was updated.
+    """
+    if amount <= 0 or month != month_start(today or timezone.localdate()):
+        return
+    row = with_spent(Budget.objects.filter(user_id=user_id, category_id=category_id), month).values_list(
+        'pk', 'amount', 'spent').first()
+    if row is None:
+        return
+    budget_id, budget_amount, spent = row
+    alerts = [
+        BudgetAlert(budget_id=budget_id, month=month, threshold=threshold, spent=spent)
+        for threshold in crossed(budget_amount, spent - amount, spent)
+    ]
+    if alerts:
+        BudgetAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+
+
+def queue_alerts(budgets, month):
+    """Queue every threshold ``budgets`` have reached in ``month`` and not alerted yet; return how many."""
+    alerts = [
+        BudgetAlert(budget_id=budget_id, month=month, threshold=threshold, spent=spent)
+        for budget_id, amount, spent in with_spent(budgets, month).values_list('pk', 'amount', 'spent')
+        for threshold in reached(amount, spent)
+    ]
+    existing = set(BudgetAlert.objects.filter(
+        budget__in=budgets, month=month).values_list('budget_id', 'threshold'))
+    alerts = [alert for alert in alerts if (alert.budget_id, alert.threshold) not in existing]
+    BudgetAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+    return len(alerts)
+
+
+def usage_rows(user, today):
+    month = month_start(today or timezone.localdate())
+    return with_spent(Budget.objects.filter(user=user), month).order_by('category__name').values_list(
+        'category_id', 'category__name', 'amount', 'spent')
+
+
+def usage(user, today=None):
+    """The user's budgets with what was spent against them this month, in one query."""
+    return [BudgetUsage(*row) for row in usage_rows(user, today)]
+
+
+async def ausage(user, today=None):
+    return [BudgetUsage(*row) async for row in usage_rows(user, today)]
+
+
+def reconcile(user_ids, month, fix=True):
+    """
+    Compare the ``month`` rollups of ``user_ids`` with their raw expenses and
+    return the drifted rows as ``rollups.diff`` does. With ``fix``, rebuild
+    the month for the users concerned and queue the alerts now reached.
+    """
+    drifted = rollups.diff(user_ids, month)
+    if fix:
+        with transaction.atomic():
+            if drifted:
+                rollups.rebuild(sorted({key[0] for key in drifted}), month)
+            queue_alerts(Budget.objects.filter(user_id__in=user_ids), month)
+    return drifted
+
+
+def message(alert):
+    budget = alert.budget
+    subject = '%s: %d%% of your %s budget spent' % (
+        alert.month.strftime('%B %Y'), alert.threshold, budget.category.name)
+    body = 'You have spent %s of your %s budget of %s for %s.' % (
+        alert.spent, budget.category.name, budget.amount, alert.month.strftime('%B %Y'))
+    return EmailMessage(subject, body, to=[budget.user.email])
+
+
+def send_pending(batch_size=100):
+    """
+    Email the oldest ``batch_size`` unsent alerts over one connection, mark
+    them sent and return how many there were. Users without an email
+    address are skipped.
+    """
+    with transaction.atomic():
+        # Concurrent senders each take different alerts.
+        pending = list(BudgetAlert.objects.filter(sent_at__isnull=True).select_for_update(
+            skip_locked=True, of=('self',)).select_related(
+            'budget__user', 'budget__category').order_by('created_at', 'id')[:batch_size])
+        if not pending:
+            return 0
+        get_connection().send_messages([message(alert) for alert in pending if alert.budget.user.email])
+        BudgetAlert.objects.filter(pk__in=[alert.pk for alert in pending]).update(sent_at=timezone.now())
+    return len(pending)
@@ -0,0 +1,193 @@
+"""
+Bulk expense ingestion used by ``ExpenseViewSet.bulk``.
+
+Rows are validated in batches, every referenced category is looked up in
+the category registry (``categories``), and valid rows are written with ``bulk_create`` in chunks
+inside one transaction. Rows carrying an idempotency key that the user has
+already uploaded are reported as duplicates instead of being inserted again.
+
+``insert_columns`` writes expenses given as NumPy columns (the synthetic
+data generator's) straight to COPY or an ``executemany`` INSERT, without a
+model instance per row.
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+from itertools import repeat
+from typing import Dict, List
+
+import numpy as np
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import categories, rollups
+from .models import Expense
+from .serializers import BulkExpenseSerializer
+
+BATCH_SIZE = 1000
+COLUMNS = ('user_id', 'category_id', 'amount', 'description', 'date', 'idempotency_key',
+           'created_at', 'updated_at')
+# Leaves room for ':<index>' within Expense.idempotency_key's 100 characters.
+MAX_KEY_PREFIX = 80
+
+
+@dataclass
+class BulkResult:
+    created: List[int] = field(default_factory=list)
+    duplicates: List[int] = field(default_factory=list)
+    errors: Dict[int, dict] = field(default_factory=dict)
+
+    def as_dict(self):
+        return {
+            'created': len(self.created),
+            'ids': self.created,
+            'duplicates': self.duplicates,
+            'errors': [{'index': index, 'errors': errors}
+                       for index, errors in sorted(self.errors.items())],
+        }
+
+
+def can_copy():
+    return connection.vendor == 'postgresql'
+
+
+def copy_rows(rows):
+    """Insert tuples in ``COLUMNS`` order with PostgreSQL COPY, skipping per-row INSERT overhead."""
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    sql = 'COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (Expense._meta.db_table, ', '.join(COLUMNS))
+    with connection.cursor() as cursor:
+        if hasattr(cursor.cursor, 'copy_expert'):  # psycopg2
+            cursor.cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with cursor.cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+
+def copy_expenses(expenses):
+    """Insert unsaved expenses with PostgreSQL COPY."""
+    now = timezone.now().isoformat()
+    copy_rows(
+        (expense.user_id, expense.category_id, expense.amount, expense.description,
+         expense.date.isoformat(), expense.idempotency_key, now, now)
+        for expense in expenses
+    )
+
+
+def insert_rows(rows):
+    """Insert tuples in ``COLUMNS`` order, executing one prepared INSERT for them all."""
+    qn = connection.ops.quote_name
+    sql = 'INSERT INTO %s (%s) VALUES (%s)' % (
+        qn(Expense._meta.db_table), ', '.join(qn(column) for column in COLUMNS), ', '.join(['%s'] * len(COLUMNS)))
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, list(rows))
+
+
+def amount_strings(cents):
+    """Non-negative amounts in cents as exact decimal strings, e.g. 1205 -> '12.05'."""
+    whole = (cents // 100).astype(str)
+    return np.char.add(np.char.add(whole, '.'), np.char.zfill((cents % 100).astype(str), 2))
+
+
+def insert_columns(user_ids, category_ids, cents, descriptions, dates, use_copy=False, batch_size=None):
+    """
+    Insert expenses given as parallel NumPy arrays, amounts in cents and
+    dates as ``datetime64[D]``, in batches of ``batch_size``; rollups are
+    left to the caller. Returns the row count.
+    """
+    batch_size = batch_size or getattr(settings, 'EXPENSE_BULK_BATCH_SIZE', BATCH_SIZE)
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    for start in range(0, len(cents), batch_size):
+        part = slice(start, start + batch_size)
+        rows = zip(
+            user_ids[part].tolist(), category_ids[part].tolist(), amount_strings(cents[part]).tolist(),
+            descriptions[part].tolist(), np.datetime_as_string(dates[part]).tolist(),
+            repeat(None), repeat(now), repeat(now),
+        )
+        if use_copy:
+            copy_rows(rows)
+        else:
+            insert_rows(rows)
+    return len(cents)
+
+
+def write_expenses(expenses, use_copy=False):
+    """Insert unsaved expenses with COPY or ``bulk_create``; rollups are left to the caller."""
+    if use_copy:
+        copy_expenses(expenses)
+    else:
+        Expense.objects.bulk_create(expenses, batch_size=getattr(
+            settings, 'EXPENSE_BULK_BATCH_SIZE', BATCH_SIZE))
+
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield start, items[start:start + size]
+
+
+def ingest(user, rows, atomic=True, key_prefix=None):
+    """
+    Validate and insert ``rows`` (a list of dicts) for ``user``.
+
+    With ``atomic`` nothing is written unless every row is valid; otherwise
+    valid rows are written and invalid ones reported. ``key_prefix`` (the
+    request's Idempotency-Key header) gives rows without their own key the
+    key ``<prefix>:<index>`` so an identical retried upload is a no-op; it
+    must be at most MAX_KEY_PREFIX characters long.
+    """
+    batch_size = getattr(settings, 'EXPENSE_BULK_BATCH_SIZE', BATCH_SIZE)
+    result = BulkResult()
+    valid = []
+
+    for start, batch in batches(rows, batch_size):
+        for index, row in enumerate(batch, start=start):
+            if not isinstance(row, dict):
+                result.errors[index] = {'non_field_errors': ['Expected an object.']}
+                continue
+            serializer = BulkExpenseSerializer(data=row)
+            if not serializer.is_valid():
+                result.errors[index] = serializer.errors
+                continue
+            data = serializer.validated_data
+            if 'idempotency_key' not in data and key_prefix:
+                data['idempotency_key'] = '%s:%d' % (key_prefix, index)
+            valid.append((index, data))
+
+    known = categories.containing({data['category_id'] for index, data in valid})
+    seen_keys = set()
+    pending = []
+    for index, data in valid:
+        if data['category_id'] not in known:
+            result.errors[index] = {'category_id': ['Category does not exist.']}
+            continue
+        key = data.get('idempotency_key')
+        if key is not None:
+            if key in seen_keys:
+                result.duplicates.append(index)
+                continue
+            seen_keys.add(key)
+        pending.append((index, data))
+
+    if atomic and result.errors:
+        return result
+
+    with transaction.atomic():
+        for _, batch in batches(pending, batch_size):
+            keys = [data['idempotency_key'] for _, data in batch if data.get('idempotency_key')]
+            existing = set(Expense.objects.filter(
+                user=user, idempotency_key__in=keys,
+            ).values_list('idempotency_key', flat=True)) if keys else set()
+            expenses = []
+            for index, data in batch:
+                if data.get('idempotency_key') in existing:
+                    result.duplicates.append(index)
+                    continue
+                expenses.append(Expense(user=user, **data))
+            created = Expense.objects.bulk_create(expenses)
+            rollups.apply_expenses(created)
+            result.created.extend(expense.pk for expense in created)
+    result.duplicates.sort()
+    return result
@@ -0,0 +1,223 @@
+"""
+Per-user cache for dashboard and aggregate API results.
+
+Entries are keyed by user, a per-user version counter, a global category
+version and the local date, so they are invalidated by bumping a counter
+rather than by finding and deleting keys. Every path that changes expenses
+(model signals, bulk upload, import, data generation) goes through
+``rollups``, which calls ``invalidate_users`` once the transaction commits.
+Date-relative figures cannot outlive the day they were computed for, since
+the date is part of the key and entries expire at local midnight. Entries
+are computed on the primary database, even in a ``replica_reads`` view: a
+lagging replica's result would be stored under the version that a write has
+already bumped, and kept until it expires.
+
+The backend is the Django cache named by ``EXPENSE_CACHE_ALIAS``; TTL comes
+from its ``TIMEOUT`` and eviction from the backend (``MAX_ENTRIES`` LRU
+culling for locmem, ``maxmemory-policy`` for Redis). Entries are only
+used if the backend is shared by every worker (``is_shared``): with a
+per-process backend a write bumps the version in its own worker only, and
+the user's next request may land on another worker that still holds the
+old entry. Without one, ``get_or_compute`` computes every time and
+``entry_tag`` hands out no tags.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from . import routing
+
+MISSING = object()
+LOCK_TIMEOUT = 10
+LOCK_POLL_INTERVAL = 0.05
+
+_counters = {'hits': 0, 'misses': 0, 'stampede_waits': 0, 'invalidations': 0}
+_counters_lock = threading.Lock()
+
+
+def get_cache():
+    return caches[getattr(settings, 'EXPENSE_CACHE_ALIAS', 'default')]
+
+
+def is_shared(cache=None):
+    """Whether every process sees the same entries: ``EXPENSE_CACHE_SHARED``, else inferred from the backend."""
+    shared = getattr(settings, 'EXPENSE_CACHE_SHARED', None)
+    if shared is not None:
+        return shared
+    return not isinstance(cache or get_cache(), (LocMemCache, DummyCache))
+
+
+def count(name, amount=1):
+    with _counters_lock:
+        _counters[name] += amount
+
+
+def get_counters():
+    """Hit/miss counters of this process since it started."""
+    with _counters_lock:
+        return dict(_counters)
+
+
+def version_key(user_id):
+    return 'expenses:version:%s' % user_id
+
+
+def get_version(cache, key):
+    version = cache.get(key)
+    if version is None:
+        # Start from the clock so a counter that was evicted can never
+        # come back at a value that older entries were stored under.
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def bump(cache, key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate_users(user_ids):
+    cache = get_cache()
+    for user_id in set(user_ids):
+        bump(cache, version_key(user_id))
+    count('invalidations', len(set(user_ids)))
+
+
+def invalidate_all():
+    """Invalidate every user's entries, e.g. after a category is renamed."""
+    bump(get_cache(), version_key('global'))
+    count('invalidations')
+
+
+def seconds_until_midnight(now=None):
+    now = timezone.localtime(now)
+    midnight = timezone.make_aware(
+        datetime.combine(now.date() + timedelta(days=1), dt_time.min), now.tzinfo)
+    return max(1, int((midnight - now).total_seconds()))
+
+
+def entry_key(cache, user, name, today=None):
+    today = today or timezone.localdate()
+    return 'expenses:%s:%s:%s:%s:%s' % (
+        name, user.pk,
+        get_version(cache, version_key('global')),
+        get_version(cache, version_key(user.pk)),
+        today.isoformat(),
+    )
+
+
+def entry_keys(cache, user_ids, name, today=None):
+    """``entry_key`` for many users at once, reading their versions in one round trip."""
+    today = today or timezone.localdate()
+    global_version = get_version(cache, version_key('global'))
+    versions = cache.get_many([version_key(user_id) for user_id in user_ids])
+    keys = {}
+    for user_id in user_ids:
+        version = versions.get(version_key(user_id))
+        if version is None:
+            version = get_version(cache, version_key(user_id))
+        keys[user_id] = 'expenses:%s:%s:%s:%s:%s' % (name, user_id, global_version, version, today.isoformat())
+    return keys
+
+
+def entry_tag(user, name, today=None):
+    """
+    A token that changes whenever ``name``'s entry for ``user`` would be
+    invalidated, for ETags and cache-busting URLs; None if the cache backend
+    is not shared by every process (``is_shared``), as another worker would
+    go on handing out a tag that a write here made stale, or keeps nothing.
+    """
+    cache = get_cache()
+    if not is_shared(cache) or get_version(cache, version_key(user.pk)) is None:
+        return None
+    return hashlib.md5(entry_key(cache, user, name, today).encode()).hexdigest()
+
+
+def entry_timeout(cache):
+    timeout = cache.default_timeout
+    return seconds_until_midnight() if timeout is None else min(timeout, seconds_until_midnight())
+
+
+def get_or_compute(user, name, compute, today=None):
+    """
+    Return the cached ``name`` result for ``user``, computing and storing it
+    with ``compute()`` on a miss. Only one caller computes a missing entry at
+    a time; concurrent callers wait for its result for up to LOCK_TIMEOUT.
+    Without a shared cache (``is_shared``) it just returns ``compute()``.
+    """
+    cache = get_cache()
+    if not is_shared(cache):
+        return compute()
+    key = entry_key(cache, user, name, today)
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        count('hits')
+        return value
+    count('misses')
+
+    lock_key = key + ':lock'
+    if not cache.add(lock_key, 1, timeout=LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = cache.get(key, MISSING)
+            if value is not MISSING:
+                count('stampede_waits')
+                return value
+        return compute()
+
+    try:
+        with routing.use_primary():
+            value = compute()
+        cache.set(key, value, timeout=entry_timeout(cache))
+    finally:
+        cache.delete(lock_key)
+    return value
+
+
+async def aget_or_compute(user, name, compute, today=None):
+    """
+    ``get_or_compute`` for the async views: ``compute`` is a coroutine
+    function, and waiting for another caller's result sleeps on the event
+    loop instead of blocking a thread.
+    """
+    cache = get_cache()
+    if not is_shared(cache):
+        return await compute()
+    key = await sync_to_async(entry_key)(cache, user, name, today)
+    value = await cache.aget(key, MISSING)
+    if value is not MISSING:
+        count('hits')
+        return value
+    count('misses')
+
+    lock_key = key + ':lock'
+    if not await cache.aadd(lock_key, 1, timeout=LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(LOCK_POLL_INTERVAL)
+            value = await cache.aget(key, MISSING)
+            if value is not MISSING:
+                count('stampede_waits')
+                return value
+        return await compute()
+
+    try:
+        with routing.use_primary():
+            value = await compute()
+        await cache.aset(key, value, timeout=entry_timeout(cache))
+    finally:
+        await cache.adelete(lock_key)
+    return value
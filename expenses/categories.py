@@ -0,0 +1,166 @@
+"""
+A process-local registry of categories.
+
+Categories are few and rarely change, yet the expense forms, serializers,
+bulk upload, search, dashboard and category API each used to query them on
+every request. ``get()`` loads them all once per process into a
+``Registry``: the rows as plain tuples in id order and an id -> name dict.
+
+Every ``get()`` compares the registry's version with the current one and
+reloads if they differ. With a cache backend shared by every process
+(``caching.is_shared``) that is ``expenses:version:categories``, which
+``changed()`` bumps once a category save or delete commits (signals.py).
+A per-process cache would not carry another worker's bump, so without a
+shared one the version is read from the database instead: the number of
+categories and their latest ``updated_at``, one small aggregate query that
+each process runs at most once every ``CHECK_INTERVAL`` seconds. Changes
+made in this process clear the registry at once; another worker's show up
+within ``CHECK_INTERVAL``. Registries older than ``MAX_AGE`` seconds are
+reloaded regardless, for changes made without the model signals.
+
+Lookups of given ids go through ``containing()``, which reloads if one is
+missing, so a category created a moment ago in another process is found
+rather than reported as unknown. It reloads once per registry: ids still
+missing afterwards do not exist, and asking for them again costs nothing.
+"""
+import threading
+import time
+from dataclasses import dataclass, field, replace
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+
+from . import caching
+from .models import Category
+
+FIELDS = ('id', 'name', 'description', 'created_at', 'updated_at')
+VERSION_KEY = caching.version_key('categories')
+MAX_AGE = 60
+CHECK_INTERVAL = 5
+
+_registry = None
+# The database version and when it was read, without a shared cache.
+_checked = (None, 0.0)
+_lock = threading.Lock()
+
+
+@dataclass(frozen=True)
+class Registry:
+    version: Optional[int]
+    loaded_at: float
+    # FIELDS of every category, in id order.
+    rows: Tuple[tuple, ...]
+    names: Dict[int, str] = field(default_factory=dict)
+    # name -> id, for rows that name their category (import_expenses).
+    ids: Dict[str, int] = field(default_factory=dict)
+    # Reloaded by ``containing()`` for a missing id.
+    complete: bool = False
+
+    def __contains__(self, pk):
+        return pk in self.names
+
+    def __len__(self):
+        return len(self.rows)
+
+    def instances(self):
+        """Unsaved ``Category`` objects for templates and serializers."""
+        return [Category(**dict(zip(FIELDS, row))) for row in self.rows]
+
+    def instance(self, pk):
+        for row in self.rows:
+            if row[0] == pk:
+                return Category(**dict(zip(FIELDS, row)))
+        return None
+
+    def matching(self, text):
+        """Ids of the categories whose name contains ``text``, ignoring case."""
+        text = text.casefold()
+        return [pk for pk, name in self.names.items() if text in name.casefold()]
+
+
+def load(version=None):
+    """Load every category; without a shared cache ``version`` is None and taken from the rows."""
+    global _checked
+    rows = tuple(Category.objects.order_by('id').values_list(*FIELDS))
+    if version is None:
+        updated = FIELDS.index('updated_at')
+        version = len(rows), max((row[updated] for row in rows), default=None)
+        _checked = (version, time.monotonic())
+    return Registry(version, time.monotonic(), rows, {row[0]: row[1] for row in rows},
+                    {row[1]: row[0] for row in rows})
+
+
+def is_stale(registry, version):
+    return (registry is None or (version is not None and registry.version != version)
+            or time.monotonic() - registry.loaded_at > MAX_AGE)
+
+
+def current_version():
+    """
+    The shared cache version; without a shared cache, the number of categories
+    and their latest ``updated_at`` as of at most ``CHECK_INTERVAL`` seconds
+    ago, or None if nothing has been loaded yet.
+    """
+    global _checked
+    cache = caching.get_cache()
+    if caching.is_shared(cache):
+        return caching.get_version(cache, VERSION_KEY)
+    version, checked_at = _checked
+    if version is not None and time.monotonic() - checked_at >= CHECK_INTERVAL:
+        summary = Category.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+        version = summary['count'], summary['updated']
+        _checked = (version, time.monotonic())
+    return version
+
+
+def reload():
+    # A shared version is read first: a change committed while loading
+    # changes it again, and the next call reloads.
+    return load(current_version() if caching.is_shared() else None)
+
+
+def get():
+    """The current registry, reloaded if a category changed since it was loaded."""
+    global _registry
+    version = current_version()
+    registry = _registry
+    if is_stale(registry, version):
+        with _lock:
+            registry = _registry
+            if is_stale(registry, version):
+                registry = _registry = reload()
+    return registry
+
+
+async def aget():
+    return await sync_to_async(get)()
+
+
+def containing(pks):
+    """
+    ``get()``, reloaded if any of ``pks`` is missing, e.g. created by another
+    process. A registry is only reloaded this way once, so unknown ids do not
+    cost a reload on every request.
+    """
+    global _registry
+    registry = get()
+    if registry.complete or registry.names.keys() >= set(pks):
+        return registry
+    with _lock:
+        if _registry is None or _registry is registry:
+            _registry = replace(reload(), complete=True)
+        return _registry
+
+
+def clear():
+    """Drop this process's registry; the next ``get()`` reloads it."""
+    global _registry, _checked
+    _registry = None
+    _checked = (None, 0.0)
+
+
+def changed():
+    """Make every process reload its registry; call once the change has committed."""
+    caching.bump(caching.get_cache(), VERSION_KEY)
+    clear()
@@ -0,0 +1,44 @@
+"""
+Data for the dashboard charts, served as JSON from ``dashboard/charts/<name>/``.
+
+The dashboard page renders only the headline figures and the browser then
+fetches each chart in parallel. Every chart is built from the cached
+``DashboardStats`` (the same entry the aggregate API uses), so loading all
+three costs one computation.
+
+The chart URLs on the page carry ``caching.entry_tag`` as ``?v=``, which
+changes whenever the user's data does, so responses can be cached by the
+browser for ``EXPENSE_CHART_MAX_AGE`` seconds; the same tag is the ETag for
+revalidating them after that. Without a cache shared by every worker there
+is no tag, and the charts are revalidated on every load instead.
+"""
+
+
+def trend(stats):
+    return {
+        'labels': [m.label for m in stats.months],
+        'data': [float(m.total) for m in stats.months],
+    }
+
+
+def categories(stats):
+    return {
+        'labels': [c.name for c in stats.categories],
+        'data': [float(c.total) for c in stats.categories],
+    }
+
+
+def top_categories(stats):
+    return {
+        'categories': [
+            {'name': c.name, 'total': float(c.total), 'count': c.count}
+            for c in stats.top_categories
+        ],
+    }
+
+
+CHARTS = {
+    'trend': trend,
+    'categories': categories,
+    'top-categories': top_categories,
+}
@@ -0,0 +1,87 @@
+"""
+Conditional GET for the per-user pages and API responses.
+
+The ETag is ``caching.entry_tag`` for the request's URL and ``Accept``
+header. It changes whenever the user's cache version does: on every create,
+update or delete of their expenses (``rollups.changed`` bumps it once the
+transaction commits, whichever path made the change), when categories
+change, and at local midnight. Working it out is a cache lookup, so a client
+polling an unchanged resource gets a 304 before any query other than
+authentication runs. Responses are marked ``private, no-cache`` so that
+browsers always revalidate them.
+
+The version counters must be seen by every worker, or another worker would
+keep answering 304 after a write here; without a shared cache backend
+(``caching.is_shared``) no tags are issued. A response read from a replica
+is not tagged either: the replica may not have the write that the tag
+already reflects, and its body would then be kept as current.
+"""
+import functools
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
+
+from . import caching, routing
+
+
+def request_tag(request):
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    # The same URL can be rendered as JSON or as the browsable API.
+    name = 'etag:%s:%s' % (request.get_full_path(), request.META.get('HTTP_ACCEPT', ''))
+    return caching.entry_tag(request.user, name)
+
+
+def page_tag(request):
+    # The page would show these messages; a 304 would leave them for later.
+    if len(get_messages(request)):
+        return None
+    return request_tag(request)
+
+
+def not_modified(request, tag):
+    """A 304 response if the client's copy tagged ``tag`` is current, else None."""
+    if tag is None:
+        return None
+    return get_conditional_response(request, etag=quote_etag(tag))
+
+
+def add_etag(response, tag):
+    if tag is not None and 200 <= response.status_code < 300 and not routing.used_replica():
+        response.headers.setdefault('ETag', quote_etag(tag))
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional(view, get_tag=request_tag):
+    """
+    Decorator for read views (sync or async, or viewset methods through
+    ``method_decorator``) that answers ``If-None-Match`` without calling them.
+    """
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            tag = await sync_to_async(get_tag)(request)
+            response = not_modified(request, tag)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            return add_etag(response, tag)
+        return wrapper
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        # The tag is taken before the view runs: if data changes meanwhile,
+        # the response is newer than its tag and the next poll refetches.
+        tag = get_tag(request)
+        response = not_modified(request, tag)
+        if response is None:
+            response = view(request, *args, **kwargs)
+        return add_etag(response, tag)
+    return wrapper
+
+
+def conditional_page(view):
+    """``conditional`` for template views, which also render pending messages."""
+    return conditional(view, get_tag=page_tag)
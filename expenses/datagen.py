@@ -0,0 +1,181 @@
+"""
+Seeded synthetic expense data used by ``load_test_data`` and the benchmarks.
+
+Each user's rows are generated as NumPy arrays from a generator seeded with
+(seed, user index), so a profile always produces the same data no matter
+how many worker processes split the users. Expenses per user follow a
+power law (a few heavy users, many light ones) controlled by ``skew``.
+"""
+import multiprocessing
+from dataclasses import dataclass, replace
+from datetime import date, timedelta
+from typing import Optional
+
+import numpy as np
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, connections
+
+from . import bulk, rollups
+from .models import Category
+
+CATEGORIES = [
+    ('Food & Dining', 'Groceries, restaurants, and takeout'),
+    ('Transportation', 'Gas, public transport, and car maintenance'),
+    ('Housing', 'Rent, utilities, and home maintenance'),
+    ('Entertainment', 'Movies, games, and leisure activities'),
+    ('Healthcare', 'Medical expenses and prescriptions'),
+    ('Shopping', 'Clothing, electronics, and other purchases'),
+    ('Education', 'Courses, books, and tuition'),
+    ('Travel', 'Flights, hotels, and holidays'),
+    ('Insurance', 'Health, car, and home insurance'),
+    ('Personal Care', 'Haircuts, cosmetics, and gym'),
+    ('Gifts & Donations', 'Presents and charity'),
+    ('Subscriptions', 'Streaming, software, and memberships'),
+]
+
+DESCRIPTIONS = [
+    'Grocery shopping', 'Movie tickets', 'Gas refill', 'Restaurant dinner',
+    'Utility bill', 'Online shopping', 'Doctor visit', 'Public transport',
+    'Home maintenance', 'Entertainment subscription',
+]
+
+TEST_USERNAME = 'testuser'
+TEST_PASSWORD = 'testpass123'
+
+
+@dataclass(frozen=True)
+class Profile:
+    users: int = 1
+    days: int = 30
+    per_day: float = 2.0
+    categories: int = 6
+    skew: float = 0.0
+    seed: int = 42
+    end_date: Optional[date] = None
+
+
+PROFILES = {
+    # The original load_test_data: one user, 30 days, about 2 expenses a day.
+    'default': Profile(),
+    'small': Profile(users=10, days=365, per_day=3.0, categories=8, skew=1.0),
+    'medium': Profile(users=100, days=3 * 365, per_day=3.0, categories=10, skew=1.0),
+    # Roughly 10M expenses.
+    'large': Profile(users=1000, days=5 * 365, per_day=5.5, categories=12, skew=1.2),
+}
+
+
+def user_weights(users, skew):
+    """Relative activity per user: Zipf-like with exponent ``skew``, mean 1."""
+    weights = np.arange(1, users + 1, dtype=float) ** -skew
+    return weights / weights.mean()
+
+
+def generate_user(profile, index, weight):
+    """
+    Return ``(day_offsets, category_indexes, cents, description_indexes)``
+    arrays for user number ``index``.
+    """
+    rng = np.random.default_rng([profile.seed, index])
+    counts = rng.poisson(profile.per_day * weight, size=profile.days)
+    day_offsets = np.repeat(np.arange(profile.days), counts)
+    size = len(day_offsets)
+
+    popularity = 1.0 / np.arange(1, profile.categories + 1)
+    category_indexes = rng.choice(profile.categories, size=size, p=popularity / popularity.sum())
+    cents = np.clip(np.rint(rng.lognormal(3.5, 1.0, size=size) * 100), 100, 500000).astype(np.int64)
+    description_indexes = rng.integers(len(DESCRIPTIONS), size=size)
+    return day_offsets, category_indexes, cents, description_indexes
+
+
+def ensure_categories(count):
+    """Create the first ``count`` standard categories; return their ids in order."""
+    ids = []
+    for index in range(count):
+        name, description = CATEGORIES[index] if index < len(CATEGORIES) else (
+            'Category %d' % (index + 1), '')
+        category, _ = Category.objects.get_or_create(name=name, defaults={'description': description})
+        ids.append(category.pk)
+    return ids
+
+
+def ensure_users(count):
+    """Create ``testuser`` plus ``loaduser<N>`` accounts, none of them staff; return their ids in order."""
+    password = make_password(TEST_PASSWORD)
+    usernames = [TEST_USERNAME] + ['loaduser%06d' % i for i in range(1, count)]
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    User.objects.bulk_create([
+        User(username=username, email='%s@example.com' % username, password=password)
+        for username in usernames if username not in existing
+    ], batch_size=1000)
+    ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    return [ids[username] for username in usernames]
+
+
+def write_users(profile, user_ids, category_ids, indexes, batch_size, use_copy):
+    """
+    Generate and insert the expenses of the users at ``indexes``; return the
+    row count. The rows stay NumPy columns until ``bulk.insert_columns``
+    writes them.
+    """
+    end_date = profile.end_date or date.today()
+    first = np.datetime64(end_date - timedelta(days=profile.days - 1), 'D')
+    category_ids = np.asarray(category_ids, dtype=np.int64)
+    descriptions = np.array(DESCRIPTIONS)
+    weights = user_weights(profile.users, profile.skew)
+    written = 0
+    pending = []
+
+    def flush():
+        columns = [np.concatenate(column) for column in zip(*pending)]
+        pending.clear()
+        return bulk.insert_columns(*columns, use_copy=use_copy, batch_size=batch_size)
+
+    for index in indexes:
+        day_offsets, category_indexes, cents, description_indexes = generate_user(
+            profile, index, weights[index])
+        pending.append((
+            np.full(len(cents), user_ids[index], dtype=np.int64), category_ids[category_indexes], cents,
+            descriptions[description_indexes], first + day_offsets,
+        ))
+        if sum(len(columns[2]) for columns in pending) >= batch_size:
+            written += flush()
+    if pending:
+        written += flush()
+    return written
+
+
+def _write_shard(args):
+    # Runs in a forked worker, which opens its own database connection.
+    return write_users(*args)
+
+
+def generate(profile, batch_size=10000, workers=1, use_copy=None, log=None):
+    """Create users, categories and expenses for ``profile``; return the expense count."""
+    if use_copy is None:
+        use_copy = bulk.can_copy()
+    log = log or (lambda message: None)
+    category_ids = ensure_categories(profile.categories)
+    user_ids = ensure_users(profile.users)
+    if profile.end_date is None:
+        # Fix the date so that all workers agree on it.
+        profile = replace(profile, end_date=date.today())
+
+    shards = [range(start, profile.users, workers) for start in range(max(workers, 1))]
+    jobs = [(profile, user_ids, category_ids, shard, batch_size, use_copy) for shard in shards]
+    if workers > 1 and not connection.in_atomic_block:
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            written = 0
+            for count in pool.imap_unordered(_write_shard, jobs):
+                written += count
+                log('Wrote %d expenses' % written)
+    else:
+        written = 0
+        for job in jobs:
+            written += write_users(*job)
+            log('Wrote %d expenses' % written)
+
+    for start in range(0, len(user_ids), 500):
+        rollups.rebuild(user_ids[start:start + 500])
+    return written
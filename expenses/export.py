@@ -0,0 +1,92 @@
+"""
+Streaming CSV / NDJSON export of expenses.
+
+Rows are read from a server-side cursor with ``QuerySet.iterator`` and
+encoded one at a time, so memory use does not depend on how many rows are
+exported. The same generators back the ``ExpenseViewSet.export`` action
+and the ``export_expenses`` management command.
+"""
+import csv
+import json
+import zlib
+
+from .models import Expense
+
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+COLUMNS = ('id', 'date', 'category', 'amount', 'description', 'created_at')
+CHUNK_SIZE = 2000
+
+
+def export_queryset(user=None, start=None, end=None, category=None, category_name=None):
+    """Expenses to export, as tuples in ``COLUMNS`` order."""
+    expenses = Expense.objects.all()
+    if user is not None:
+        expenses = expenses.filter(user=user)
+    if start is not None:
+        expenses = expenses.filter(date__gte=start)
+    if end is not None:
+        expenses = expenses.filter(date__lte=end)
+    if category is not None:
+        expenses = expenses.filter(category=category)
+    if category_name is not None:
+        expenses = expenses.filter(category__name=category_name)
+    return expenses.values_list(
+        'id', 'date', 'category__name', 'amount', 'description', 'created_at')
+
+
+class Echo:
+    """File-like object whose ``write`` returns the value, for ``csv.writer``."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(COLUMNS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        record = dict(zip(COLUMNS, row))
+        record['date'] = record['date'].isoformat()
+        record['amount'] = str(record['amount'])
+        record['created_at'] = record['created_at'].isoformat()
+        yield json.dumps(record) + '\n'
+
+
+def encode(lines, compress=False, buffer_size=64 * 1024):
+    """
+    Turn text lines into bytes chunks of roughly ``buffer_size``, gzipping
+    them on the fly when ``compress`` is set.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = []
+    size = 0
+    for line in lines:
+        data = line.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= buffer_size:
+            chunk = b''.join(buffer)
+            buffer, size = [], 0
+            chunk = compressor.compress(chunk) if compressor else chunk
+            if chunk:
+                yield chunk
+    chunk = b''.join(buffer)
+    if compressor:
+        chunk = compressor.compress(chunk) + compressor.flush()
+    if chunk:
+        yield chunk
+
+
+def stream(queryset, output_format='csv', compress=False, chunk_size=CHUNK_SIZE):
+    """Yield the encoded export of ``queryset`` (from ``export_queryset``)."""
+    rows = queryset.iterator(chunk_size=chunk_size)
+    lines = csv_lines(rows) if output_format == 'csv' else ndjson_lines(rows)
+    return encode(lines, compress)
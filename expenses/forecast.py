@@ -0,0 +1,185 @@
+"""
+Month-end spending forecasts and unusual-day detection.
+
+``forecasts`` reads the daily totals per category of a batch of users for
+the last HISTORY_DAYS days in one grouped query and folds them into a
+matrix with a row per (user, category) pair and per user total. Every
+figure is then computed for all rows at once with NumPy:
+
+- the average spent per day over the last 7 and 30 days;
+- the month-end projection: spent so far this month plus the 30-day daily
+  average for each remaining day;
+- a z-score per day against the BASELINE_DAYS days before it (running sums
+  of the amounts and their squares give every window's mean and standard
+  deviation). Days in the last RECENT_DAYS scoring ``Z_THRESHOLD`` or more
+  are reported as anomalies.
+
+Results are cached per user like the other aggregates (``caching``), so they
+last until the user's expenses change or the day ends. ``precompute`` fills
+the cache for many users in batches, for ``manage.py precompute_forecasts``.
+"""
+import calendar
+from datetime import timedelta
+
+import numpy as np
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import caching, categories
+from .models import Expense
+
+CACHE_NAME = 'forecast'
+HISTORY_DAYS = 120
+BASELINE_DAYS = 30
+RECENT_DAYS = 30
+Z_THRESHOLD = 3.0
+# Baselines varying by less than a cent are treated as flat, not as a zero
+# standard deviation that any change would be infinitely far from.
+MIN_STD_CENTS = 1.0
+
+
+def daily_rows(user_ids, first, today):
+    """``(user_id, category_id, date, total)`` per user, category and day with expenses."""
+    return Expense.objects.filter(
+        user_id__in=user_ids, date__gte=first, date__lte=today,
+    ).values('user_id', 'category_id', 'date').annotate(total=Sum('amount')).order_by().values_list(
+        'user_id', 'category_id', 'date', 'total')
+
+
+def fold(rows, first, days):
+    """
+    Fold ``daily_rows`` into ``(pairs, daily)``: the sorted (user_id,
+    category_id) pairs as an (n, 2) array and their amounts in cents per day
+    from ``first`` as an (n, days) matrix.
+    """
+    if not rows:
+        return np.zeros((0, 2), dtype=np.int64), np.zeros((0, days))
+    keys = np.array([(row[0], row[1]) for row in rows], dtype=np.int64)
+    offsets = (np.array([row[2] for row in rows], dtype='datetime64[D]') - np.datetime64(first, 'D')).astype(np.int64)
+    cents = np.array([int(row[3] * 100) for row in rows], dtype=np.float64)
+    pairs, inverse = np.unique(keys, axis=0, return_inverse=True)
+    daily = np.zeros((len(pairs), days))
+    np.add.at(daily, (inverse.ravel(), offsets), cents)
+    return pairs, daily
+
+
+def series_stats(daily, today):
+    """
+    The forecast figures of every row of ``daily`` (cents per day, the last
+    column being ``today``), as arrays with one value per row, plus the
+    ``zscores`` of the last RECENT_DAYS days as a (rows, RECENT_DAYS) matrix.
+    """
+    rows = len(daily)
+    remaining = calendar.monthrange(today.year, today.month)[1] - today.day
+    spent = daily[:, -today.day:].sum(axis=1)
+    average_7 = daily[:, -7:].mean(axis=1)
+    average_30 = daily[:, -30:].mean(axis=1)
+
+    window = daily[:, -(BASELINE_DAYS + RECENT_DAYS):]
+    sums = np.zeros((rows, window.shape[1] + 1))
+    np.cumsum(window, axis=1, out=sums[:, 1:])
+    squares = np.zeros_like(sums)
+    np.cumsum(window ** 2, axis=1, out=squares[:, 1:])
+    # Each recent day is compared with the BASELINE_DAYS days before it.
+    mean = (sums[:, BASELINE_DAYS:-1] - sums[:, :RECENT_DAYS]) / BASELINE_DAYS
+    variance = (squares[:, BASELINE_DAYS:-1] - squares[:, :RECENT_DAYS]) / BASELINE_DAYS - mean ** 2
+    std = np.sqrt(np.maximum(variance, 0))
+    zscores = np.zeros_like(mean)
+    np.divide(window[:, BASELINE_DAYS:] - mean, std, out=zscores, where=std >= MIN_STD_CENTS)
+    return {
+        'spent': spent,
+        'projected': spent + average_30 * remaining,
+        'average_7': average_7,
+        'average_30': average_30,
+        'zscores': zscores,
+    }
+
+
+def money(cents):
+    """Amounts in cents as a list of rounded currency amounts."""
+    return np.round(cents / 100, 2).tolist()
+
+
+def empty_forecast(today):
+    return {
+        'date': today.isoformat(),
+        'days_remaining': calendar.monthrange(today.year, today.month)[1] - today.day,
+        'total': {'spent': 0.0, 'projected': 0.0, 'average_7': 0.0, 'average_30': 0.0},
+        'categories': [],
+        'anomalies': [],
+    }
+
+
+def summarize(user_ids, pairs, daily, names, today):
+    """``{user_id: forecast}`` for ``user_ids`` from ``fold``'s arrays and category ``names``."""
+    days = daily.shape[1]
+    first = today - timedelta(days=days - 1)
+    order = np.array(sorted(user_ids), dtype=np.int64)
+    totals = np.zeros((len(order), days))
+    if len(pairs):
+        # fold() sorts the pairs by user, so each user's rows are contiguous.
+        users, starts = np.unique(pairs[:, 0], return_index=True)
+        totals[np.searchsorted(order, users)] = np.add.reduceat(daily, starts, axis=0)
+    # One row per (user, category) pair, then one per user for the totals.
+    series = np.vstack([daily, totals])
+    stats = series_stats(series, today)
+    figures = ('spent', 'projected', 'average_7', 'average_30')
+    rows = list(zip(*(money(stats[name]) for name in figures)))
+    row_users = pairs[:, 0].tolist() + order.tolist()
+    row_categories = pairs[:, 1].tolist() + [None] * len(order)
+
+    results = {user_id: empty_forecast(today) for user_id in user_ids}
+    for row, category_id in enumerate(row_categories):
+        described = dict(zip(figures, rows[row]))
+        if category_id is None:
+            results[row_users[row]]['total'] = described
+        else:
+            described = {'category_id': category_id, 'name': names[category_id], **described}
+            results[row_users[row]]['categories'].append(described)
+
+    recent = days - RECENT_DAYS
+    flagged_rows, flagged_days = np.nonzero((stats['zscores'] >= Z_THRESHOLD) & (series[:, recent:] > 0))
+    zscores = np.round(stats['zscores'][flagged_rows, flagged_days], 2).tolist()
+    flagged_days += recent
+    dates = (np.datetime64(first, 'D') + flagged_days).astype(str).tolist()
+    amounts = money(series[flagged_rows, flagged_days])
+    for row, day, amount, zscore in zip(flagged_rows.tolist(), dates, amounts, zscores):
+        category_id = row_categories[row]
+        results[row_users[row]]['anomalies'].append({
+            'date': day,
+            'category_id': category_id,
+            'name': 'Total' if category_id is None else names[category_id],
+            'amount': amount,
+            'zscore': zscore,
+        })
+    for result in results.values():
+        result['categories'].sort(key=lambda category: category['name'])
+        result['anomalies'].sort(key=lambda anomaly: (anomaly['date'], anomaly['name']))
+    return results
+
+
+def forecasts(user_ids, today=None):
+    """``{user_id: forecast}`` for every user in ``user_ids``, from one query for their expenses."""
+    today = today or timezone.localdate()
+    first = today - timedelta(days=HISTORY_DAYS - 1)
+    rows = list(daily_rows(user_ids, first, today))
+    names = categories.containing({row[1] for row in rows}).names
+    pairs, daily = fold(rows, first, HISTORY_DAYS)
+    return summarize(user_ids, pairs, daily, names, today)
+
+
+def forecast(user, today=None):
+    return forecasts([user.pk], today)[user.pk]
+
+
+def precompute(user_ids, batch_size=1000, today=None):
+    """Cache the forecasts of ``user_ids``, yielding the size of each batch done."""
+    cache = caching.get_cache()
+    for start in range(0, len(user_ids), batch_size):
+        batch = user_ids[start:start + batch_size]
+        # Keys first, as in get_or_compute: a change made while the batch is
+        # computed bumps the version, and the stale result goes unused.
+        keys = caching.entry_keys(cache, batch, CACHE_NAME, today)
+        results = forecasts(batch, today)
+        cache.set_many({keys[user_id]: results[user_id] for user_id in batch}, timeout=caching.entry_timeout(cache))
+        yield len(batch)
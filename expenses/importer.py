@@ -0,0 +1,87 @@
+"""
+Row parsing for the ``import_expenses`` command.
+
+These functions run inside worker processes, so this module only depends on
+the standard library and never touches the database.
+"""
+import csv
+import hashlib
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+REQUIRED_COLUMNS = ('date', 'category', 'amount', 'description')
+MAX_AMOUNT = Decimal('99999999.99')
+
+
+def source_key(path):
+    """Stable identifier for a file's content, used to build idempotency keys."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        # The whole file: exports that only differ after some point (e.g.
+        # appended rows) are different files.
+        for block in iter(lambda: source.read(1024 * 1024), b''):
+            digest.update(block)
+    return 'import-' + digest.hexdigest()
+
+
+def read_chunks(path, chunk_size, skip=0):
+    """
+    Yield ``(first_line, rows)`` chunks of raw CSV rows without loading the
+    whole file; ``first_line`` is the 1-based data row number of ``rows[0]``.
+    The first ``skip`` data rows are passed over without being parsed.
+    """
+    with open(path, newline='', encoding='utf-8-sig') as source:
+        reader = csv.reader(source)
+        header = [column.strip().lower() for column in next(reader, [])]
+        missing = [column for column in REQUIRED_COLUMNS if column not in header]
+        if missing:
+            raise ValueError('Missing CSV column(s): %s' % ', '.join(missing))
+        indexes = [header.index(column) for column in REQUIRED_COLUMNS]
+
+        chunk = []
+        line = 0
+        for line, row in enumerate(reader, start=1):
+            if line <= skip:
+                continue
+            chunk.append([row[i] if i < len(row) else '' for i in indexes])
+            if len(chunk) == chunk_size:
+                yield line - chunk_size + 1, chunk
+                chunk = []
+        if chunk:
+            yield line - len(chunk) + 1, chunk
+
+
+def parse_amount(value):
+    value = value.strip().replace(',', '').lstrip('$')
+    amount = Decimal(value).quantize(Decimal('0.01'))
+    if amount < 0 or amount > MAX_AMOUNT:
+        raise InvalidOperation
+    return amount
+
+
+def parse_chunk(first_line, rows, date_format='%Y-%m-%d'):
+    """
+    Parse raw rows into ``(line, date, category_name, amount, description)``
+    tuples. Returns ``(last_line, parsed, errors)``, where ``last_line`` is
+    the number of the chunk's final row and errors are ``(line, message)``.
+    """
+    parsed = []
+    errors = []
+    for line, (day, category, amount, description) in enumerate(rows, start=first_line):
+        try:
+            day = datetime.strptime(day.strip(), date_format).date()
+        except ValueError:
+            errors.append((line, 'invalid date %r' % day))
+            continue
+        try:
+            amount = parse_amount(amount)
+        except (InvalidOperation, ValueError):
+            errors.append((line, 'invalid amount %r' % amount))
+            continue
+        category = category.strip()
+        description = description.strip()
+        if not category or not description:
+            errors.append((line, 'category and description are required'))
+            continue
+        parsed.append((line, day, category, amount, description))
+    return first_line + len(rows) - 1, parsed, errors
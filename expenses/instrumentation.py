@@ -0,0 +1,268 @@
+"""
+Per-request query-count and latency instrumentation.
+
+``RequestMetricsMiddleware`` wraps every database call of a request with
+``connection.execute_wrapper`` (no debug cursor, no SQL capture beyond a
+counter per statement), then:
+
+* adds a ``Server-Timing`` header with the app and db time,
+* logs one structured JSON record per request to ``expenses.requests``
+  (WARNING for slow requests or when a statement repeats often enough to
+  look like an N+1 pattern, DEBUG otherwise),
+* aggregates per-view counters that ``metrics_view`` exposes in the
+  Prometheus text format.
+
+Staff users can profile a single request with cProfile by sending the
+``X-Profile: 1`` header; the top functions are logged to
+``expenses.profile`` and, if ``EXPENSE_PROFILE_DIR`` is set, the raw
+profile is saved there for tools such as snakeviz. Under ASGI the profile
+covers the event loop thread only, so ORM calls show up as awaits.
+
+The middleware runs natively in both sync and async handlers. Database
+connections are per thread, so under ASGI the query wrapper is installed
+in the thread that runs the request's sync and ORM code.
+"""
+import cProfile
+import hmac
+import io
+import json
+import logging
+import os
+import pstats
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+
+from . import caching
+
+logger = logging.getLogger('expenses.requests')
+profile_logger = logging.getLogger('expenses.profile')
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+class QueryRecorder:
+    """``execute_wrapper`` that counts statements, their time and their shapes."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.count += 1
+            # Parameters are passed separately, so identical SQL is one shape.
+            self.shapes[sql] += 1
+
+    def repeated(self, threshold):
+        return {sql: n for sql, n in self.shapes.items() if n >= threshold}
+
+
+class Metrics:
+    """Process-local per-view aggregates rendered in Prometheus text format."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = Counter()
+        self.duration_sum = defaultdict(float)
+        self.duration_buckets = defaultdict(lambda: [0] * len(BUCKETS))
+        self.queries = Counter()
+        self.db_seconds = defaultdict(float)
+        self.slow = Counter()
+        self.n_plus_one = Counter()
+
+    def record(self, view, status, seconds, recorder, slow, repeated):
+        with self.lock:
+            self.requests[view, status] += 1
+            self.duration_sum[view] += seconds
+            buckets = self.duration_buckets[view]
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    buckets[index] += 1
+            self.queries[view] += recorder.count
+            self.db_seconds[view] += recorder.seconds
+            self.slow[view] += slow
+            self.n_plus_one[view] += bool(repeated)
+
+    def render(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, kind))
+
+        def sample(name, value, **labels):
+            label_text = ','.join('%s="%s"' % item for item in labels.items())
+            lines.append('%s{%s} %s' % (name, label_text, value))
+
+        with self.lock:
+            family('expense_http_requests_total', 'counter', 'Requests by view and status.')
+            for (view, status), n in sorted(self.requests.items()):
+                sample('expense_http_requests_total', n, view=view, status=status)
+
+            family('expense_http_request_duration_seconds', 'histogram', 'Request wall time.')
+            for view, buckets in sorted(self.duration_buckets.items()):
+                total = sum(n for (v, _), n in self.requests.items() if v == view)
+                for bound, n in zip(BUCKETS, buckets):
+                    sample('expense_http_request_duration_seconds_bucket', n, view=view, le=bound)
+                sample('expense_http_request_duration_seconds_bucket', total, view=view, le='+Inf')
+                sample('expense_http_request_duration_seconds_sum', '%.6f' % self.duration_sum[view],
+                       view=view)
+                sample('expense_http_request_duration_seconds_count', total, view=view)
+
+            for name, kind, help_text, values in (
+                ('expense_db_queries_total', 'counter', 'SQL statements executed.', self.queries),
+                ('expense_db_seconds_total', 'counter', 'Time spent in SQL statements.',
+                 self.db_seconds),
+                ('expense_slow_requests_total', 'counter', 'Requests over the slow threshold.',
+                 self.slow),
+                ('expense_n_plus_one_requests_total', 'counter',
+                 'Requests that repeated one SQL statement past the N+1 threshold.',
+                 self.n_plus_one),
+            ):
+                family(name, kind, help_text)
+                for view, value in sorted(values.items()):
+                    sample(name, value, view=view)
+
+        family('expense_cache_events_total', 'counter', 'Dashboard cache events.')
+        for event, n in sorted(caching.get_counters().items()):
+            sample('expense_cache_events_total', n, event=event)
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def profile_requested(request):
+    return request.headers.get(setting('EXPENSE_PROFILE_HEADER', 'X-Profile')) == '1'
+
+
+def is_staff(request):
+    user = getattr(request, 'user', None)
+    return user is not None and user.is_authenticated and user.is_staff
+
+
+def wants_profile(request):
+    return profile_requested(request) and is_staff(request)
+
+
+def save_profile(profiler, view):
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(30)
+    profile_logger.info('Profile of %s\n%s', view, stream.getvalue())
+    directory = setting('EXPENSE_PROFILE_DIR', None)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, '%s-%d.prof' % (view.replace(':', '_'), time.time_ns()))
+        profiler.dump_stats(path)
+        return path
+
+
+def wrap_connections(stack, recorder):
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        profiler = cProfile.Profile() if wants_profile(request) else None
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            wrap_connections(stack, recorder)
+            if profiler is not None:
+                profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        return self.finish(request, response, time.perf_counter() - start, recorder, profiler)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        profiler = None
+        if profile_requested(request) and await sync_to_async(is_staff)(request):
+            profiler = cProfile.Profile()
+        start = time.perf_counter()
+        stack = ExitStack()
+        await sync_to_async(wrap_connections)(stack, recorder)
+        if profiler is not None:
+            profiler.enable()
+        try:
+            response = await self.get_response(request)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, time.perf_counter() - start, recorder, profiler)
+
+    def finish(self, request, response, seconds, recorder, profiler):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        slow = seconds * 1000 >= setting('EXPENSE_SLOW_REQUEST_MS', 500)
+        repeated = recorder.repeated(setting('EXPENSE_N_PLUS_ONE_THRESHOLD', 10))
+        metrics.record(view, response.status_code, seconds, recorder, slow, repeated)
+
+        response['Server-Timing'] = 'app;dur=%.1f, db;dur=%.1f' % (
+            seconds * 1000, recorder.seconds * 1000)
+        if profiler is not None:
+            save_profile(profiler, view)
+
+        level = logging.WARNING if slow or repeated else logging.DEBUG
+        if logger.isEnabledFor(level):
+            logger.log(level, json.dumps({
+                'view': view,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'duration_ms': round(seconds * 1000, 2),
+                'queries': recorder.count,
+                'db_ms': round(recorder.seconds * 1000, 2),
+                'slow': slow,
+                'repeated_queries': [
+                    {'sql': sql[:200], 'count': n} for sql, n in repeated.items()],
+            }))
+        return response
+
+
+def metrics_view(request):
+    """Prometheus text endpoint: bearer token if configured, otherwise staff only."""
+    token = setting('EXPENSE_METRICS_TOKEN', None)
+    if token:
+        # Constant time, so the response time does not give the token away.
+        allowed = hmac.compare_digest(
+            request.headers.get('Authorization', '').encode(), ('Bearer %s' % token).encode())
+    else:
+        allowed = request.user.is_authenticated and request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4')
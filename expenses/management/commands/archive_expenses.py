@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils import timezone
+from expenses import archive
+from expenses.models import Expense
+from expenses.stats import add_months
+
+
+class Command(BaseCommand):
+    help = ('Moves expenses older than a number of whole months to the archive table; '
+            'totals keep counting them')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=settings.EXPENSE_ARCHIVE_AFTER_MONTHS,
+                            help='Archive expenses dated before the first of the month this many months ago '
+                                 '(default: %(default)s)')
+        parser.add_argument('--before', type=date.fromisoformat,
+                            help='Archive expenses dated before this date (YYYY-MM-DD) instead')
+        parser.add_argument('--batch-size', type=int, default=settings.EXPENSE_ARCHIVE_BATCH_SIZE,
+                            help='Expenses to move per transaction (default: %(default)s)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the expenses that would move')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias (default: %s)' % DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['months'] < 1:
+            raise CommandError('--months must be positive')
+        before = options['before'] or add_months(timezone.localdate(), -options['months'])
+        connection = connections[options['database']]
+        if options['dry_run']:
+            count = Expense.objects.using(connection.alias).filter(date__lt=before).count()
+            self.stdout.write('%d expenses dated before %s would be archived' % (count, before))
+            return
+        moved = archive.archive(connection, before, options['batch_size'],
+                                progress=lambda moved: self.stdout.write('Archived %d' % moved))
+        self.stdout.write(self.style.SUCCESS('Archived %d expenses dated before %s' % (moved, before)))
@@ -0,0 +1,84 @@
+import json
+import platform
+import sys
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+from expenses import benchmarks, caching, categories, datagen
+
+
+class Command(BaseCommand):
+    help = 'Runs performance benchmarks against a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help='Benchmarks to run (default: all)')
+        parser.add_argument('--profile', choices=sorted(datagen.PROFILES), default='small',
+                            help='Dataset seeded by benchmarks that need one')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed calls per case')
+        parser.add_argument('--output', '-o', help='Write the results to this JSON file')
+        parser.add_argument('--baseline', help='JSON results of an earlier run to compare with')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative regression against --baseline (0.2 = 20%%)')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the benchmark database between runs')
+
+    def handle(self, *args, **options):
+        registry = benchmarks.load()
+        names = options['names'] or sorted(registry)
+        unknown = set(names) - set(registry)
+        if unknown:
+            raise CommandError('Unknown benchmark(s): %s. Available: %s' % (
+                ', '.join(sorted(unknown)), ', '.join(sorted(registry))))
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as saved:
+                baseline = json.load(saved)['results']
+
+        results = {}
+        old_name = connection.settings_dict['NAME']
+        setup_test_environment()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            for name in names:
+                self.stdout.write(self.style.MIGRATE_HEADING(name))
+                # Roll back each benchmark's data so they do not affect each
+                # other. The rolled back ids are used again, so cached entries
+                # and the category registry of the last benchmark go too.
+                caching.get_cache().clear()
+                categories.clear()
+                with transaction.atomic():
+                    results[name] = registry[name](self.stdout, options)
+                    transaction.set_rollback(True)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['output']:
+            report = {
+                'meta': {
+                    'timestamp': timezone.now().isoformat(),
+                    'vendor': connection.vendor,
+                    'profile': options['profile'],
+                    'python': sys.version.split()[0],
+                    'django': django.get_version(),
+                    'platform': platform.platform(),
+                },
+                'results': results,
+            }
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2, sort_keys=True)
+            self.stdout.write('Results written to %s' % options['output'])
+
+        if baseline is not None:
+            regressions = benchmarks.compare(baseline, results, options['threshold'])
+            for regression in regressions:
+                self.stderr.write(regression)
+            if regressions:
+                raise CommandError('%d metric(s) regressed by more than %d%%' % (
+                    len(regressions), options['threshold'] * 100))
+            self.stdout.write(self.style.SUCCESS('No regressions against %s' % options['baseline']))
+        self.stdout.write(self.style.SUCCESS('Benchmarks finished'))
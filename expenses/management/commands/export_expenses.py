@@ -0,0 +1,58 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+from expenses import export
+from expenses.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Streams expenses to a CSV or NDJSON file (or stdout) with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--format', dest='output_format', choices=sorted(export.FORMATS),
+                            default='csv')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--user', help='Only export this username')
+        parser.add_argument('--category', help='Only export this category name')
+        parser.add_argument('--start', help='First date to export (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to export (YYYY-MM-DD)')
+        parser.add_argument('--chunk-size', type=int, default=export.CHUNK_SIZE,
+                            help='Rows fetched from the database cursor at a time')
+
+    def handle(self, *args, **options):
+        filters = {}
+        if options['user']:
+            try:
+                filters['user'] = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError('User "%s" does not exist' % options['user'])
+        if options['category']:
+            # Filtered by name, so every category of that name is exported.
+            if not Category.objects.filter(name=options['category']).exists():
+                raise CommandError('Category "%s" does not exist' % options['category'])
+            filters['category_name'] = options['category']
+        for name in ('start', 'end'):
+            if options[name]:
+                try:
+                    filters[name] = parse_date(options[name])
+                except ValueError:
+                    filters[name] = None
+                if filters[name] is None:
+                    raise CommandError('--%s must be a date (YYYY-MM-DD)' % name)
+
+        chunks = export.stream(
+            export.export_queryset(**filters), options['output_format'],
+            options['gzip'], options['chunk_size'],
+        )
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                written = sum(output.write(chunk) for chunk in chunks)
+            self.stderr.write(self.style.SUCCESS(
+                'Wrote %d bytes to %s' % (written, options['output'])))
+        else:
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
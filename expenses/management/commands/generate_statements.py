@@ -0,0 +1,74 @@
+import os
+import time
+from datetime import datetime
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from expenses import statements
+from expenses.stats import add_months
+
+
+def parse_month(value):
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = ('Writes every user a CSV and/or HTML spending statement for one month, '
+            'in shards on a process pool; re-running resumes from the checkpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=parse_month,
+                            help='Statement month, YYYY-MM (default: last month)')
+        parser.add_argument('--output-dir', default='statements',
+                            help='Statements go to <output-dir>/<YYYY-MM>/<user id>.<format>')
+        parser.add_argument('--format', action='append', dest='formats', choices=statements.FORMATS,
+                            help='File format (can be repeated; default: csv and html)')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (1 runs in this process)')
+        parser.add_argument('--shard-size', type=int, default=500,
+                            help='Users computed together in one set of queries')
+        parser.add_argument('--top', type=int, default=statements.TOP_EXPENSES,
+                            help='Largest expenses listed per statement')
+        parser.add_argument('--user', action='append', dest='usernames', default=[],
+                            help='Only this username (can be repeated)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore the checkpoint and write every statement again')
+
+    def handle(self, *args, **options):
+        if options['shard_size'] < 1 or options['top'] < 0:
+            raise CommandError('--shard-size must be positive and --top not negative')
+        month = options['month'] or add_months(timezone.localdate(), -1)
+        directory = os.path.join(options['output_dir'], month.strftime('%Y-%m'))
+        formats = tuple(dict.fromkeys(options['formats'] or statements.FORMATS))
+
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = list(users.values_list('pk', flat=True))
+        total = len(user_ids)
+        if not options['restart']:
+            finished = statements.read_checkpoint(directory)
+            if finished:
+                user_ids = [user_id for user_id in user_ids if user_id not in finished]
+                self.stdout.write('Resuming: %d of %d statements already written' % (total - len(user_ids), total))
+
+        os.makedirs(directory, exist_ok=True)
+        start = time.perf_counter()
+        written = 0
+        with open(os.path.join(directory, statements.CHECKPOINT), 'w' if options['restart'] else 'a') as checkpoint:
+            def done(shard):
+                nonlocal written
+                checkpoint.write(''.join('%d\n' % user_id for user_id in shard))
+                checkpoint.flush()
+                written += len(shard)
+                elapsed = time.perf_counter() - start
+                self.stdout.write('Wrote %d/%d statements (%.0f users/s)' % (
+                    written, len(user_ids), written / elapsed if elapsed else 0))
+
+            statements.generate(user_ids, month, directory, formats, options['shard_size'],
+                                options['workers'], options['top'], done)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS('Generated %d statements for %s in %s in %.1fs, %.0f users/s' % (
+            written, month.strftime('%Y-%m'), directory, elapsed, written / elapsed if elapsed else 0)))
@@ -0,0 +1,138 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from expenses import bulk, categories, importer, rollups
+from expenses.models import Category, Expense
+
+MAX_REPORTED_ERRORS = 20
+
+
+class Command(BaseCommand):
+    help = 'Imports a large CSV of expenses (date, category, amount, description) for one user'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row')
+        parser.add_argument('--user', required=True, help='Username that owns the expenses')
+        parser.add_argument('--chunk-size', type=int, default=5000,
+                            help='Rows parsed and committed per chunk')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Parser processes (1 parses in this process)')
+        parser.add_argument('--date-format', default='%Y-%m-%d',
+                            help='strptime format of the date column')
+        parser.add_argument('--create-categories', action='store_true',
+                            help='Create categories that do not exist yet')
+        parser.add_argument('--checkpoint',
+                            help='Progress file used to resume (default: <path>.checkpoint)')
+        parser.add_argument('--restart', action='store_true',
+                            help='Ignore an existing checkpoint and start from the first row')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Use bulk_create even on PostgreSQL')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError('File "%s" does not exist' % path)
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive')
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('User "%s" does not exist' % options['user'])
+
+        checkpoint = options['checkpoint'] or path + '.checkpoint'
+        skip = 0
+        if not options['restart'] and os.path.exists(checkpoint):
+            with open(checkpoint) as saved:
+                skip = int(saved.read().strip() or 0)
+            self.stdout.write('Resuming after row %d' % skip)
+
+        self.user = user
+        self.key_prefix = importer.source_key(path)
+        self.create_categories = options['create_categories']
+        self.use_copy = bulk.can_copy() and not options['no_copy']
+
+        try:
+            chunks = importer.read_chunks(path, options['chunk_size'], skip)
+            parsed_chunks = self.parse(chunks, options['workers'], options['date_format'])
+            self.run(parsed_chunks, checkpoint, skip)
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+    def parse(self, chunks, workers, date_format):
+        """Parse chunks in a process pool, yielding results in file order."""
+        if workers <= 1:
+            for first_line, rows in chunks:
+                yield importer.parse_chunk(first_line, rows, date_format)
+            return
+        # Forked workers must not inherit open database connections (unless
+        # we are inside a transaction, e.g. a test, and have to keep it).
+        if not connection.in_atomic_block:
+            connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for first_line, rows in chunks:
+                pending.append(pool.submit(importer.parse_chunk, first_line, rows, date_format))
+                if len(pending) >= workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    def run(self, parsed_chunks, checkpoint, skip):
+        start = time.perf_counter()
+        created = skipped = processed = 0
+        errors = []
+        for last_line, parsed, chunk_errors in parsed_chunks:
+            written, duplicates, missing = self.write_chunk(parsed)
+            with open(checkpoint, 'w') as saved:
+                saved.write(str(last_line))
+
+            created += written
+            skipped += duplicates
+            errors.extend(chunk_errors + missing)
+            processed = last_line - skip
+            elapsed = time.perf_counter() - start
+            self.stdout.write('Committed through row %d: %d created, %d errors (%.0f rows/s)' % (
+                last_line, created, len(errors), processed / elapsed if elapsed else 0))
+
+        for line, message in sorted(errors)[:MAX_REPORTED_ERRORS]:
+            self.stderr.write('Row %d: %s' % (line, message))
+        if len(errors) > MAX_REPORTED_ERRORS:
+            self.stderr.write('... and %d more errors' % (len(errors) - MAX_REPORTED_ERRORS))
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Imported %d expenses (%d already imported, %d errors) in %.1fs, %.0f rows/s' % (
+                created, skipped, len(errors), elapsed, processed / elapsed if elapsed else 0)))
+
+    def write_chunk(self, parsed):
+        """Insert one parsed chunk in a transaction; returns (created, duplicates, errors)."""
+        errors = []
+        expenses = []
+        keys = ['%s:%d' % (self.key_prefix, row[0]) for row in parsed]
+        category_ids = dict(categories.get().ids)
+        with transaction.atomic():
+            # Rows committed by a run that crashed before saving its checkpoint.
+            existing = set(Expense.objects.filter(
+                user=self.user, idempotency_key__in=keys,
+            ).values_list('idempotency_key', flat=True))
+            for (line, day, name, amount, description), key in zip(parsed, keys):
+                if key in existing:
+                    continue
+                category_id = category_ids.get(name)
+                if category_id is None:
+                    if not self.create_categories:
+                        errors.append((line, 'unknown category %r' % name))
+                        continue
+                    category_id = category_ids[name] = Category.objects.get_or_create(name=name)[0].pk
+                expenses.append(Expense(
+                    user=self.user, category_id=category_id, amount=amount,
+                    description=description, date=day, idempotency_key=key,
+                ))
+            bulk.write_expenses(expenses, self.use_copy)
+            rollups.apply_expenses(expenses)
+        return len(expenses), len(existing), errors
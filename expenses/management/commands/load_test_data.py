@@ -1,63 +1,64 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from dataclasses import replace
+from datetime import date
+import time
+
 from django.contrib.auth.models import User
-from expenses.models import Category, Expense
-from decimal import Decimal
-from datetime import datetime, timedelta
-import random
+from expenses import datagen
+
 
 class Command(BaseCommand):
     help = 'Loads test data for the expense tracker'
 
-    def handle(self, *args, **kwargs):
-        # Create test categories
-        categories = [
-            {'name': 'Food & Dining', 'description': 'Groceries, restaurants, and takeout'},
-            {'name': 'Transportation', 'description': 'Gas, public transport, and car maintenance'},
-            {'name': 'Housing', 'description': 'Rent, utilities, and home maintenance'},
-            {'name': 'Entertainment', 'description': 'Movies, games, and leisure activities'},
-            {'name': 'Healthcare', 'description': 'Medical expenses and prescriptions'},
-            {'name': 'Shopping', 'description': 'Clothing, electronics, and other purchases'},
-        ]
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', choices=sorted(datagen.PROFILES), default='default',
+                            help='Preset dataset size; the options below override it')
+        parser.add_argument('--users', type=int, help='Number of users (the first is testuser)')
+        parser.add_argument('--years', type=float, help='Years of history per user')
+        parser.add_argument('--days', type=int, help='Days of history per user')
+        parser.add_argument('--per-day', type=float, help='Average expenses per user per day')
+        parser.add_argument('--categories', type=int, help='Number of categories')
+        parser.add_argument('--skew', type=float,
+                            help='Power-law exponent of user activity (0 = all users alike)')
+        parser.add_argument('--seed', type=int, help='Random seed (same seed, same data)')
+        parser.add_argument('--end-date', help='Last day of history, YYYY-MM-DD (default: today)')
+        parser.add_argument('--batch-size', type=int, default=10000, help='Rows per INSERT/COPY')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Worker processes, each writing a share of the users')
+        parser.add_argument('--no-copy', action='store_true',
+                            help='Use bulk_create even on PostgreSQL')
+        parser.add_argument('--staff', action='store_true',
+                            help='Make testuser a staff user, e.g. to see /metrics/ and the admin')
 
-        for category_data in categories:
-            Category.objects.get_or_create(
-                name=category_data['name'],
-                defaults={'description': category_data['description']}
-            )
+    def handle(self, *args, **options):
+        overrides = {
+            name: options[name]
+            for name in ('users', 'days', 'per_day', 'categories', 'skew', 'seed')
+            if options[name] is not None
+        }
+        if options['years'] is not None:
+            overrides['days'] = int(options['years'] * 365)
+        if options['end_date']:
+            try:
+                overrides['end_date'] = date.fromisoformat(options['end_date'])
+            except ValueError:
+                raise CommandError('--end-date must be a date (YYYY-MM-DD)')
+        profile = replace(datagen.PROFILES[options['profile']], **overrides)
+        if profile.users < 1 or profile.days < 1 or profile.categories < 1:
+            raise CommandError('--users, --days and --categories must be positive')
 
-        # Get or create test user
-        user, created = User.objects.get_or_create(
-            username='testuser',
-            defaults={
-                'email': 'test@example.com',
-                'is_staff': True
-            }
+        start = time.perf_counter()
+        written = datagen.generate(
+            profile,
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            use_copy=False if options['no_copy'] else None,
+            log=self.stdout.write,
         )
-        if created:
-            user.set_password('testpass123')
-            user.save()
-            self.stdout.write(self.style.SUCCESS('Created test user'))
-
-        # Create test expenses
-        categories = Category.objects.all()
-        descriptions = [
-            'Grocery shopping', 'Movie tickets', 'Gas refill', 'Restaurant dinner',
-            'Utility bill', 'Online shopping', 'Doctor visit', 'Public transport',
-            'Home maintenance', 'Entertainment subscription'
-        ]
-
-        # Create expenses for the last 30 days
-        for i in range(30):
-            date = datetime.now().date() - timedelta(days=i)
-            num_expenses = random.randint(1, 3)  # 1-3 expenses per day
-
-            for _ in range(num_expenses):
-                Expense.objects.create(
-                    user=user,
-                    category=random.choice(categories),
-                    amount=Decimal(random.uniform(10, 500)).quantize(Decimal('0.01')),
-                    description=random.choice(descriptions),
-                    date=date
-                )
-
-        self.stdout.write(self.style.SUCCESS('Successfully loaded test data')) 
\ No newline at end of file
+        if options['staff']:
+            User.objects.filter(username=datagen.TEST_USERNAME).update(is_staff=True)
+            self.stdout.write('Made %s a staff user' % datagen.TEST_USERNAME)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            'Successfully loaded test data: %d expenses for %d users in %.1fs (%.0f rows/s)' % (
+                written, profile.users, elapsed, written / elapsed if elapsed else 0)))
@@ -0,0 +1,189 @@
+import asyncio
+import io
+import json
+import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from expenses import datagen
+from expenses.benchmarks import summarize
+
+MODES = {
+    'wsgi': 'expenses.urls',
+    'asgi': 'expenses.async_urls',
+}
+DEFAULT_PATHS = ['/dashboard/', '/api/expenses/', '/api/expenses/total_expenses/']
+HOST = 'localhost'
+
+
+def wsgi_environ(path, cookie):
+    path, _, query = path.partition('?')
+    return {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': HOST,
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'HTTP_HOST': HOST,
+        'HTTP_COOKIE': cookie,
+        'REMOTE_ADDR': '127.0.0.1',
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+
+
+def call_wsgi(handler, path, cookie):
+    statuses = []
+    body = handler(wsgi_environ(path, cookie), lambda status, headers, exc_info=None: statuses.append(status))
+    try:
+        for _ in body:
+            pass
+    finally:
+        body.close()
+    return int(statuses[0].split()[0])
+
+
+async def call_asgi(handler, path, cookie):
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', HOST.encode()), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 0),
+        'server': (HOST, 80),
+    }
+    messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # The client never disconnects; Django cancels this when it is done.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await handler(scope, receive, send)
+    return status[0]
+
+
+async def drive(call, total, concurrency):
+    """Run ``total`` calls from ``concurrency`` clients; return the results."""
+    durations = []
+    statuses = Counter()
+    remaining = iter(range(total))
+
+    async def client():
+        for _ in remaining:
+            start = time.perf_counter()
+            statuses[await call()] += 1
+            durations.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    result = summarize(durations)
+    result['requests_per_second'] = round(total / elapsed, 1)
+    result['errors'] = sum(n for status, n in statuses.items() if status >= 400)
+    return result
+
+
+class Command(BaseCommand):
+    help = ('Compares requests/second and latency of the WSGI (thread pool) and '
+            'ASGI (async views) handlers under many concurrent clients')
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='*', default=DEFAULT_PATHS,
+                            help='Paths to request (default: %s)' % ' '.join(DEFAULT_PATHS))
+        parser.add_argument('--mode', choices=sorted(MODES), action='append',
+                            help='Handler(s) to test (default: both)')
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help='Concurrent clients')
+        parser.add_argument('--requests', type=int, default=2000,
+                            help='Requests per path and mode')
+        parser.add_argument('--threads', type=int, default=32,
+                            help='WSGI worker threads, like gunicorn --threads')
+        parser.add_argument('--user', default=datagen.TEST_USERNAME,
+                            help='User to log in as (see load_test_data)')
+        parser.add_argument('--cache', action='store_true',
+                            help='Keep the dashboard cache on (default: every request hits the database)')
+        parser.add_argument('--output', '-o', help='Write the results to this JSON file')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError('User %r does not exist; run load_test_data first' % options['user'])
+        client = Client()
+        client.force_login(user)
+        cookie = '%s=%s' % (settings.SESSION_COOKIE_NAME,
+                            client.cookies[settings.SESSION_COOKIE_NAME].value)
+
+        # All requests are served by this process, so its cache is as good as shared.
+        overrides = {'EXPENSE_CACHE_SHARED': True}
+        if not options['cache']:
+            overrides = {
+                'CACHES': dict(settings.CACHES, loadtest={
+                    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}),
+                'EXPENSE_CACHE_ALIAS': 'loadtest',
+            }
+
+        # Requests over the slow threshold are expected here; do not log each one.
+        request_logger = logging.getLogger('expenses.requests')
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        results = {}
+        try:
+            for mode in options['mode'] or sorted(MODES, reverse=True):
+                with override_settings(ROOT_URLCONF=MODES[mode], **overrides):
+                    for path in options['paths']:
+                        results['%s %s' % (mode, path)] = result = self.run_mode(
+                            mode, path, cookie, options)
+                        self.stdout.write('%s %s: %.1f req/s, p50 %.1f ms, p99 %.1f ms, %d errors' % (
+                            mode, path, result['requests_per_second'], result['p50_ms'],
+                            result['p99_ms'], result['errors']))
+        finally:
+            request_logger.setLevel(level)
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump({'options': {key: options[key] for key in (
+                    'concurrency', 'requests', 'threads', 'cache')}, 'results': results},
+                    output, indent=2, sort_keys=True)
+            self.stdout.write('Results written to %s' % options['output'])
+
+    def run_mode(self, mode, path, cookie, options):
+        if mode == 'asgi':
+            handler = ASGIHandler()
+            call = lambda: call_asgi(handler, path, cookie)
+            return asyncio.run(drive(call, options['requests'], options['concurrency']))
+
+        handler = WSGIHandler()
+        with ThreadPoolExecutor(options['threads']) as pool:
+            async def call():
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(pool, call_wsgi, handler, path, cookie)
+            return asyncio.run(drive(call, options['requests'], options['concurrency']))
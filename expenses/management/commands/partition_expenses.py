@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from expenses import partitions
+
+
+class Command(BaseCommand):
+    help = ('Creates the upcoming monthly or yearly partitions of the expense table (PostgreSQL); '
+            'with --convert, first turns the plain table into a partitioned one')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--convert', action='store_true',
+                            help='Partition the expense table if it is not yet (rewrites every row)')
+        parser.add_argument('--period', choices=partitions.PERIODS, default=settings.EXPENSE_PARTITION_PERIOD,
+                            help='Partition size (default: %(default)s)')
+        parser.add_argument('--ahead', type=int, default=settings.EXPENSE_PARTITIONS_AHEAD,
+                            help='Periods after the current one to create partitions for (default: %(default)s)')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias (default: %s)' % DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        if options['ahead'] < 0:
+            raise CommandError('--ahead must not be negative')
+        connection = connections[options['database']]
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning needs PostgreSQL; the %s expense table stays as it is' % connection.vendor)
+        today = timezone.localdate()
+        with transaction.atomic(using=connection.alias):
+            if partitions.is_partitioned(connection):
+                created = partitions.ensure(connection, options['period'], options['ahead'], today)
+            elif options['convert']:
+                created = partitions.convert(connection, options['period'], today, options['ahead'])
+                self.stdout.write('Partitioned the expense table by %s' % options['period'])
+            else:
+                raise CommandError('The expense table is not partitioned; run with --convert to partition it')
+        for name in created:
+            self.stdout.write('Created %s' % name)
+        self.stdout.write(self.style.SUCCESS('%d partitions created' % len(created)))
@@ -0,0 +1,43 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from expenses import caching, forecast
+
+
+class Command(BaseCommand):
+    help = "Computes every user's spending forecast in batches and stores it in the cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Users whose forecasts are computed together from one query')
+        parser.add_argument('--user', action='append', dest='usernames', default=[],
+                            help='Only this username (can be repeated)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if not caching.is_shared():
+            # A per-process cache goes away with this command, and the web
+            # workers would not use the entries anyway.
+            raise CommandError(
+                'The %r cache is not shared with the web workers; configure a shared backend '
+                '(or EXPENSE_CACHE_SHARED) to precompute forecasts' % getattr(settings, 'EXPENSE_CACHE_ALIAS', 'default'))
+
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = list(users.values_list('pk', flat=True))
+
+        start = time.perf_counter()
+        done = 0
+        for count in forecast.precompute(user_ids, options['batch_size']):
+            done += count
+            elapsed = time.perf_counter() - start
+            self.stdout.write('Computed %d/%d forecasts (%.0f users/s)' % (
+                done, len(user_ids), done / elapsed if elapsed else 0))
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS('Cached %d forecasts in %.1fs, %.0f users/s' % (
+            done, elapsed, done / elapsed if elapsed else 0)))
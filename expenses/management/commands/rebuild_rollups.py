@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from expenses import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the per-user monthly category rollups from raw expenses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of users to rebuild per transaction')
+        parser.add_argument('--user', action='append', dest='usernames', default=[],
+                            help='Only process this username (can be repeated)')
+        parser.add_argument('--check', action='store_true',
+                            help='Compare rollups against raw expenses without writing')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = list(users.values_list('pk', flat=True))
+
+        drifted = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            if options['check']:
+                for (user_id, category_id, month), (actual, expected) in sorted(
+                        rollups.diff(batch).items(), key=str):
+                    drifted += 1
+                    self.stdout.write(
+                        f'user={user_id} category={category_id} month={month:%Y-%m}: '
+                        f'stored={actual} expected={expected}'
+                    )
+            else:
+                rollups.rebuild(batch)
+            self.stdout.write(f'Processed {min(start + batch_size, len(user_ids))}/{len(user_ids)} users')
+
+        if options['check']:
+            if drifted:
+                raise CommandError(f'{drifted} rollup rows differ from raw expenses')
+            self.stdout.write(self.style.SUCCESS('Rollups match raw expenses'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Successfully rebuilt rollups'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from expenses import search
+
+
+class Command(BaseCommand):
+    help = ('Recreates the expense search triggers and indexes (PostgreSQL) or FTS5 table (SQLite) '
+            'and indexes the expenses that are missing from them')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS,
+                            help='Database alias to rebuild (default: %s)' % DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if not search.statements(connection):
+            self.stdout.write('Search on %s uses plain icontains matching; nothing to build' % connection.vendor)
+            return
+        with transaction.atomic(using=connection.alias):
+            search.uninstall(connection)
+            search.install(connection)
+        self.stdout.write('Rebuilt the %s search index' % connection.vendor)
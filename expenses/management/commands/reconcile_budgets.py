@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from expenses import budgets
+from expenses.models import Budget
+from expenses.stats import month_start
+
+
+def parse_month(value):
+    return datetime.strptime(value, '%Y-%m').date()
+
+
+class Command(BaseCommand):
+    help = ("Recomputes one month's totals of the users with budgets from their expenses, "
+            'corrects drifted rollups and queues the alerts they hid')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', type=parse_month,
+                            help='Month to reconcile, YYYY-MM (default: this month)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of users to reconcile per transaction')
+        parser.add_argument('--user', action='append', dest='usernames', default=[],
+                            help='Only process this username (can be repeated)')
+        parser.add_argument('--check', action='store_true',
+                            help='Report drift without correcting it')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        month = options['month'] or month_start(timezone.localdate())
+
+        users = Budget.objects.order_by('user_id')
+        if options['usernames']:
+            users = users.filter(user__username__in=options['usernames'])
+        user_ids = list(users.values_list('user_id', flat=True).distinct())
+
+        drifted = 0
+        for start in range(0, len(user_ids), batch_size):
+            batch = user_ids[start:start + batch_size]
+            for (user_id, category_id, _), (actual, expected) in sorted(
+                    budgets.reconcile(batch, month, fix=not options['check']).items(), key=str):
+                drifted += 1
+                self.stdout.write(f'user={user_id} category={category_id}: stored={actual} expected={expected}')
+            self.stdout.write(f'Processed {min(start + batch_size, len(user_ids))}/{len(user_ids)} users')
+
+        if options['check'] and drifted:
+            raise CommandError(f'{drifted} totals for {month:%Y-%m} differ from raw expenses')
+        if drifted:
+            self.stdout.write(self.style.SUCCESS(f'Corrected {drifted} totals for {month:%Y-%m}'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Budget totals for {month:%Y-%m} match raw expenses'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from expenses import budgets
+
+
+class Command(BaseCommand):
+    help = 'Emails the queued budget alerts; run it regularly, e.g. every minute from cron'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100,
+                            help='Alerts sent per transaction and mail connection')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        sent = 0
+        while True:
+            count = budgets.send_pending(options['batch_size'])
+            sent += count
+            if count < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Sent {sent} budget alerts'))
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0004_keyset_ordering'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='expense',
+            constraint=models.UniqueConstraint(condition=models.Q(('idempotency_key__isnull', False)), fields=('user', 'idempotency_key'), name='unique_expense_idempotency_key'),
+        ),
+    ]
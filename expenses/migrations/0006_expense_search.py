@@ -0,0 +1,75 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The statements of expenses/search.py as of this migration, kept here so
+# that replaying it always runs the same SQL.
+INSTALL = {
+    'postgresql': [
+        'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+        'DROP TRIGGER IF EXISTS expense_search_vector_update ON expenses_expense',
+        "CREATE TRIGGER expense_search_vector_update BEFORE INSERT OR UPDATE OF description "
+        "ON expenses_expense FOR EACH ROW EXECUTE FUNCTION "
+        "tsvector_update_trigger(search_vector, 'pg_catalog.english', description)",
+        "UPDATE expenses_expense SET search_vector = to_tsvector('pg_catalog.english', description) "
+        "WHERE search_vector IS NULL",
+        'CREATE INDEX IF NOT EXISTS expense_search_vector_idx ON expenses_expense USING gin (search_vector)',
+        'CREATE INDEX IF NOT EXISTS expense_description_trgm_idx ON expenses_expense '
+        'USING gin (description gin_trgm_ops)',
+        'CREATE INDEX IF NOT EXISTS category_name_trgm_idx ON expenses_category USING gin (name gin_trgm_ops)',
+    ],
+    'sqlite': [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS expenses_expense_fts USING fts5(description, "
+        "content='expenses_expense', content_rowid='id', tokenize='porter unicode61')",
+        "CREATE TRIGGER IF NOT EXISTS expenses_expense_fts_insert AFTER INSERT ON expenses_expense BEGIN "
+        "INSERT INTO expenses_expense_fts(rowid, description) VALUES (new.id, new.description); END",
+        "CREATE TRIGGER IF NOT EXISTS expenses_expense_fts_delete AFTER DELETE ON expenses_expense BEGIN "
+        "INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, description) "
+        "VALUES ('delete', old.id, old.description); END",
+        "CREATE TRIGGER IF NOT EXISTS expenses_expense_fts_update AFTER UPDATE OF description "
+        "ON expenses_expense BEGIN "
+        "INSERT INTO expenses_expense_fts(expenses_expense_fts, rowid, description) "
+        "VALUES ('delete', old.id, old.description); "
+        "INSERT INTO expenses_expense_fts(rowid, description) VALUES (new.id, new.description); END",
+        "INSERT INTO expenses_expense_fts(expenses_expense_fts) VALUES ('rebuild')",
+    ],
+}
+UNINSTALL = {
+    'postgresql': [
+        'DROP INDEX IF EXISTS category_name_trgm_idx',
+        'DROP INDEX IF EXISTS expense_description_trgm_idx',
+        'DROP INDEX IF EXISTS expense_search_vector_idx',
+        'DROP TRIGGER IF EXISTS expense_search_vector_update ON expenses_expense',
+    ],
+    'sqlite': [
+        'DROP TRIGGER IF EXISTS expenses_expense_fts_insert',
+        'DROP TRIGGER IF EXISTS expenses_expense_fts_delete',
+        'DROP TRIGGER IF EXISTS expenses_expense_fts_update',
+        'DROP TABLE IF EXISTS expenses_expense_fts',
+    ],
+}
+
+
+def execute(statements):
+    def run(apps, schema_editor):
+        connection = schema_editor.connection
+        with connection.cursor() as cursor:
+            for sql in statements.get(connection.vendor, []):
+                cursor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0005_expense_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # Vendor-specific triggers and indexes (GIN, pg_trgm, FTS5).
+        migrations.RunPython(execute(INSTALL), execute(UNINSTALL)),
+    ]
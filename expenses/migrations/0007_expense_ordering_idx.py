@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0006_expense_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['-date', '-created_at', '-id'], name='expense_ordering_idx'),
+        ),
+    ]
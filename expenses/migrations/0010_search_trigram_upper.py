@@ -0,0 +1,38 @@
+from django.db import migrations
+
+# icontains compiles to UPPER("description"::text) LIKE UPPER(%s) on
+# PostgreSQL, which only an index on that expression can serve. Category
+# names are matched in the category registry, without a query.
+INSTALL = [
+    'DROP INDEX IF EXISTS category_name_trgm_idx',
+    'DROP INDEX IF EXISTS expense_description_trgm_idx',
+    'CREATE INDEX IF NOT EXISTS expense_description_upper_trgm_idx ON expenses_expense '
+    'USING gin ((UPPER(description::text)) gin_trgm_ops)',
+]
+UNINSTALL = [
+    'DROP INDEX IF EXISTS expense_description_upper_trgm_idx',
+    'CREATE INDEX IF NOT EXISTS expense_description_trgm_idx ON expenses_expense '
+    'USING gin (description gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS category_name_trgm_idx ON expenses_category USING gin (name gin_trgm_ops)',
+]
+
+
+def execute(statements):
+    def run(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0009_budgets'),
+    ]
+
+    operations = [
+        migrations.RunPython(execute(INSTALL), execute(UNINSTALL)),
+    ]
@@ -1,4 +1,5 @@
-from django.db import models
+from django.contrib.postgres.search import SearchVectorField
+from django.db import models, transaction
 from django.contrib.auth.models import User
 
 # Create your models here.
@@ -15,17 +16,140 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+class ExpenseManager(models.Manager):
+    def get_queryset(self):
+        # search_vector is only read by the database; do not ship it with every row.
+        return super().get_queryset().defer('search_vector')
+
 class Expense(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expenses')
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='expenses')
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField()
     date = models.DateField()
+    # Client-supplied key that makes retried bulk uploads idempotent.
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # PostgreSQL only: the description as a tsvector, kept up to date by a
+    # trigger (see search.py). Always NULL on other databases.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ExpenseManager()
+
+    class Meta:
+        ordering = ['-date', '-created_at', '-id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_expense_idempotency_key',
+            ),
+        ]
+        indexes = [
+            # Per-user listings and keyset pages in Meta.ordering order, date windows.
+            models.Index(fields=['user', '-date', '-created_at', '-id'], name='expense_user_ordering_idx'),
+            # Per-user, per-category date ranges (rollup rebuilds, category reports).
+            models.Index(fields=['user', 'category', 'date'], name='expense_user_category_date_idx'),
+            # Everyone's expenses in Meta.ordering order: the admin changelist and date drill-down.
+            models.Index(fields=['-date', '-created_at', '-id'], name='expense_ordering_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.description} - {self.amount}"
+
+    def save(self, *args, **kwargs):
+        # Keep the row and its rollup update (see signals.py) in one transaction.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            return super().delete(*args, **kwargs)
+
+
+class ExpenseArchive(models.Model):
+    """
+    Expenses moved out of ``Expense`` by ``manage.py archive_expenses``, with
+    their original ids. ``ExpenseRollup`` still counts them, so all-time
+    totals include archived expenses.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_expenses', db_index=False)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='archived_expenses')
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    description = models.TextField()
+    date = models.DateField()
+    idempotency_key = models.CharField(max_length=100, null=True, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        ordering = ['-date', '-created_at']
+        ordering = ['-date', '-created_at', '-id']
+        indexes = [
+            models.Index(fields=['user', 'date'], name='expense_archive_user_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.description} - {self.amount}"
+
+
+class ExpenseRollup(models.Model):
+    """Running sum and count of a user's expenses per category and month."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='expense_rollups')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='rollups')
+    month = models.DateField()
+    total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['month']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category', 'month'], name='unique_expense_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.category} - {self.month:%Y-%m}: {self.total}"
+
+
+class Budget(models.Model):
+    """A user's monthly spending limit for one category (see budgets.py)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='budgets')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='budgets')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['category_id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'category'], name='unique_budget'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.category}: {self.amount}"
+
+
+class BudgetAlert(models.Model):
+    """A budget threshold crossed in a month, queued until ``send_budget_alerts`` sends it."""
+    budget = models.ForeignKey(Budget, on_delete=models.CASCADE, related_name='alerts')
+    month = models.DateField()
+    # Percent of the budget.
+    threshold = models.PositiveSmallIntegerField()
+    spent = models.DecimalField(max_digits=14, decimal_places=2)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['budget', 'month', 'threshold'], name='unique_budget_alert'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], condition=models.Q(sent_at__isnull=True),
+                         name='budget_alert_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.budget} - {self.month:%Y-%m}: {self.threshold}%"
@@ -0,0 +1,284 @@
+"""
+Keyset (cursor) pagination over expenses in ``Expense.Meta.ordering`` order.
+
+A cursor encodes the (date, created_at, id) of the row at the edge of the
+current page, so fetching any page is an index range scan on
+``expense_user_ordering_idx`` with a LIMIT, no matter how deep it is.
+
+Search results are ordered by rank, which no index follows, so they are
+paginated by page number instead (``paginate_numbered``).
+
+The admin changelist uses Django's page numbers, but
+``EstimatedCountPaginator`` takes the total from the planner's statistics
+once it is large, so that opening it does not count every expense.
+"""
+import base64
+import json
+from dataclasses import dataclass
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+DESCENDING = ('-date', '-created_at', '-id')
+ASCENDING = ('date', 'created_at', 'id')
+
+
+def get_page_size(value=None):
+    """Return the requested page size, clamped to the configured maximum."""
+    default = getattr(settings, 'EXPENSE_PAGE_SIZE', 50)
+    maximum = getattr(settings, 'EXPENSE_MAX_PAGE_SIZE', 500)
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+@dataclass(frozen=True)
+class Cursor:
+    date: object
+    created_at: object
+    id: int
+    backwards: bool = False
+
+    @classmethod
+    def for_row(cls, row, backwards=False):
+        return cls(row.date, row.created_at, row.pk, backwards)
+
+    def encode(self):
+        raw = '|'.join([
+            'p' if self.backwards else 'n',
+            self.date.isoformat(), self.created_at.isoformat(), str(self.id),
+        ])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    @classmethod
+    def decode(cls, value):
+        """Parse an encoded cursor, raising ValueError if it is malformed."""
+        try:
+            padded = value + '=' * (-len(value) % 4)
+            direction, day, created_at, pk = base64.urlsafe_b64decode(padded).decode().split('|')
+            cursor = cls(parse_date(day), parse_datetime(created_at), int(pk), direction == 'p')
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise ValueError('Invalid cursor')
+        if direction not in ('n', 'p') or cursor.date is None or cursor.created_at is None:
+            raise ValueError('Invalid cursor')
+        return cursor
+
+    def rows_after(self):
+        """Rows that sort after this position in ``DESCENDING`` order."""
+        return Q(date__lte=self.date) & (
+            Q(date__lt=self.date)
+            | Q(created_at__lt=self.created_at)
+            | Q(created_at=self.created_at, id__lt=self.id)
+        )
+
+    def rows_before(self):
+        """Rows that sort before this position in ``DESCENDING`` order."""
+        return Q(date__gte=self.date) & (
+            Q(date__gt=self.date)
+            | Q(created_at__gt=self.created_at)
+            | Q(created_at=self.created_at, id__gt=self.id)
+        )
+
+
+@dataclass
+class KeysetPage:
+    items: List
+    next_cursor: Optional[Cursor] = None
+    previous_cursor: Optional[Cursor] = None
+
+
+def page_queryset(queryset, cursor, page_size):
+    """The query for one page: ``page_size`` rows plus one to detect a further page."""
+    if cursor is None:
+        return queryset.order_by(*DESCENDING)[:page_size + 1]
+    if not cursor.backwards:
+        return queryset.filter(cursor.rows_after()).order_by(*DESCENDING)[:page_size + 1]
+    return queryset.filter(cursor.rows_before()).order_by(*ASCENDING)[:page_size + 1]
+
+
+def make_page(rows, cursor, page_size):
+    """Build the ``KeysetPage`` from the rows fetched by ``page_queryset``."""
+    has_more = len(rows) > page_size
+    items = rows[:page_size]
+    if cursor is None:
+        has_next, has_previous = has_more, False
+    elif not cursor.backwards:
+        has_next, has_previous = has_more, True
+    else:
+        has_next, has_previous = True, has_more
+        items = items[::-1]
+
+    page = KeysetPage(items)
+    if items and has_next:
+        page.next_cursor = Cursor.for_row(items[-1])
+    if items and has_previous:
+        page.previous_cursor = Cursor.for_row(items[0], backwards=True)
+    return page
+
+
+def paginate(queryset, cursor=None, page_size=None):
+    """Return one ``KeysetPage`` of ``queryset`` starting at ``cursor``."""
+    page_size = page_size or get_page_size()
+    return make_page(list(page_queryset(queryset, cursor, page_size)), cursor, page_size)
+
+
+async def apaginate(queryset, cursor=None, page_size=None):
+    """``paginate`` with the async ORM."""
+    page_size = page_size or get_page_size()
+    rows = [row async for row in page_queryset(queryset, cursor, page_size)]
+    return make_page(rows, cursor, page_size)
+
+
+def get_page_number(value=None):
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+@dataclass
+class NumberedPage:
+    items: List
+    number: int = 1
+    has_next: bool = False
+
+    @property
+    def has_previous(self):
+        return self.number > 1
+
+
+def numbered_queryset(queryset, number, page_size):
+    offset = (number - 1) * page_size
+    return queryset[offset:offset + page_size + 1]
+
+
+def paginate_numbered(queryset, number=1, page_size=None):
+    """Return page ``number`` of the already ordered ``queryset``."""
+    page_size = page_size or get_page_size()
+    rows = list(numbered_queryset(queryset, number, page_size))
+    return NumberedPage(rows[:page_size], number, len(rows) > page_size)
+
+
+async def apaginate_numbered(queryset, number=1, page_size=None):
+    """``paginate_numbered`` with the async ORM."""
+    page_size = page_size or get_page_size()
+    rows = [row async for row in numbered_queryset(queryset, number, page_size)]
+    return NumberedPage(rows[:page_size], number, len(rows) > page_size)
+
+
+class ExpenseCursorPagination(BasePagination):
+    """DRF pagination class for ``ExpenseViewSet`` built on ``paginate``."""
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        try:
+            cursor = Cursor.decode(cursor) if cursor else None
+        except ValueError:
+            raise NotFound('Invalid cursor')
+        self.page = paginate(
+            queryset, cursor, get_page_size(request.query_params.get(self.page_size_query_param)))
+        return self.page.items
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, cursor.encode())
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_link(self.page.next_cursor),
+            'previous': self.get_link(self.page.previous_cursor),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class SearchPagination(ExpenseCursorPagination):
+    """Page-number pagination for ranked search results, with the same response shape."""
+    page_query_param = 'page'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page = paginate_numbered(
+            queryset,
+            get_page_number(request.query_params.get(self.page_query_param)),
+            get_page_size(request.query_params.get(self.page_size_query_param)),
+        )
+        return self.page.items
+
+    def get_page_link(self, number):
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, number)
+
+    def get_paginated_response(self, data):
+        page = self.page
+        return Response({
+            'next': self.get_page_link(page.number + 1) if page.has_next else None,
+            'previous': self.get_page_link(page.number - 1) if page.has_previous else None,
+            'results': data,
+        })
+
+
+def estimated_count(queryset):
+    """
+    The planner's estimate of ``queryset.count()``, or None where there are no
+    statistics to take it from.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.get_compiler(queryset.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+    if connection.vendor == 'sqlite' and not queryset.query.where:
+        # ANALYZE records each index's row count first in its sqlite_stat1 row.
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [queryset.model._meta.db_table])
+                row = cursor.fetchone()
+        except DatabaseError:
+            return None  # never analyzed
+        return int(row[0].split()[0]) if row else None
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A Django ``Paginator`` that counts exactly only when the planner expects
+    fewer than ``EXPENSE_ADMIN_EXACT_COUNT_LIMIT`` rows. Beyond that the page
+    count is approximate: the last pages may come up short or empty.
+    """
+
+    @cached_property
+    def count(self):
+        estimate = estimated_count(self.object_list)
+        if estimate is None or estimate < settings.EXPENSE_ADMIN_EXACT_COUNT_LIMIT:
+            return super().count
+        return estimate
@@ -0,0 +1,191 @@
+"""
+Opt-in PostgreSQL range partitioning of the expense table by month or year.
+
+``convert()`` replaces ``expenses_expense`` with a table of the same name
+partitioned on ``date``, carrying over its rows, column defaults, indexes,
+foreign keys and search trigger. PostgreSQL requires every unique index of
+a partitioned table to include the partition key, so the primary key
+becomes (id, date) and the idempotency-key index gains ``date``; the bulk
+upload still looks keys up before inserting. A default partition takes any
+date no other partition covers.
+
+``ensure()`` creates the partitions from the current period to some periods
+ahead, moving rows the default partition holds for them, so that inserts
+land in their own partition. Queries on recent dates (the dashboard
+windows, the newest pages of the expense list) are pruned to the last few
+partitions, and ``archive.py`` moves old partitions out whole.
+
+Both run from ``manage.py partition_expenses``. Later migrations that alter
+the expense table may need writing by hand for a partitioned table.
+"""
+import re
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from . import search
+from .models import Expense
+from .stats import next_period, period_start
+
+PERIODS = ('month', 'year')
+TABLE = Expense._meta.db_table
+BOUND_RE = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    # Both None for the default partition.
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+    @property
+    def is_default(self):
+        return self.start is None
+
+
+def partition_name(start, period):
+    return '%s_p%s' % (TABLE, start.strftime('%Y_%m' if period == 'month' else '%Y'))
+
+
+def default_name():
+    return '%s_default' % TABLE
+
+
+def parse_bound(bound):
+    """The (start, end) dates of a ``FOR VALUES FROM (...) TO (...)`` bound, or (None, None) for DEFAULT."""
+    match = BOUND_RE.search(bound)
+    if not match:
+        return None, None
+    return tuple(date.fromisoformat(value) for value in match.groups())
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid '
+            'WHERE c.relname = %s AND pg_table_is_visible(c.oid)', [TABLE])
+        return cursor.fetchone() is not None
+
+
+def partitions(connection):
+    """The partitions of the expense table, oldest first and the default partition last."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent '
+            'WHERE p.relname = %s AND pg_table_is_visible(p.oid)', [TABLE])
+        found = [Partition(name, *parse_bound(bound)) for name, bound in cursor.fetchall()]
+    return sorted(found, key=lambda p: (p.is_default, p.start))
+
+
+def create_partition(connection, start, period):
+    """Create the partition for the period starting on ``start``; return its name."""
+    qn = connection.ops.quote_name
+    name, end = partition_name(start, period), next_period(start, period)
+    bound = "FOR VALUES FROM ('%s') TO ('%s')" % (start.isoformat(), end.isoformat())
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM %s WHERE date >= %%s AND date < %%s)' % qn(default_name()),
+                       [start, end])
+        if not cursor.fetchone()[0]:
+            cursor.execute('CREATE TABLE %s PARTITION OF %s %s' % (qn(name), qn(TABLE), bound))
+            return name
+        # PostgreSQL will not add a partition for rows the default partition
+        # holds, so they move into the new table before it is attached.
+        cursor.execute('CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)' % (qn(name), qn(TABLE)))
+        cursor.execute(
+            'WITH moved AS (DELETE FROM %s WHERE date >= %%s AND date < %%s RETURNING *) '
+            'INSERT INTO %s SELECT * FROM moved' % (qn(default_name()), qn(name)), [start, end])
+        cursor.execute('ALTER TABLE %s ATTACH PARTITION %s %s' % (qn(TABLE), qn(name), bound))
+    return name
+
+
+def ensure(connection, period, ahead, today):
+    """
+    Create any missing partitions from the period containing ``today`` to
+    ``ahead`` periods after it and return their names.
+    """
+    existing = [p for p in partitions(connection) if not p.is_default]
+    created = []
+    start = period_start(today, period)
+    for _ in range(ahead + 1):
+        if not any(p.start <= start < p.end for p in existing):
+            created.append(create_partition(connection, start, period))
+        start = next_period(start, period)
+    return created
+
+
+def convert(connection, period, today, ahead=0):
+    """
+    Rebuild the plain expense table as a partitioned one, with a partition
+    for every ``period`` from its oldest expense to ``ahead`` periods after
+    ``today``. Rewrites every row; run it in a transaction and a maintenance
+    window. Returns the names of the partitions created.
+    """
+    qn = connection.ops.quote_name
+    old = '%s_unpartitioned' % TABLE
+    with connection.cursor() as cursor:
+        # The trigger and search indexes come back from search.install().
+        search.uninstall(connection)
+        cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s AND indexname <> %s",
+                       [TABLE, '%s_pkey' % TABLE])
+        indexes = cursor.fetchall()
+        cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                       "WHERE conrelid = %s::regclass AND contype = 'f'", [TABLE])
+        foreign_keys = cursor.fetchall()
+        cursor.execute('SELECT min(date), max(id) FROM %s' % qn(TABLE))
+        first, max_id = cursor.fetchone()
+        cursor.execute("SELECT attidentity <> '' FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+                       [TABLE])
+        identity = cursor.fetchone()[0]
+
+        # Free the names the new table takes over.
+        for name, _ in foreign_keys:
+            cursor.execute('ALTER TABLE %s DROP CONSTRAINT %s' % (qn(TABLE), qn(name)))
+        for name, _ in indexes:
+            cursor.execute('DROP INDEX %s' % qn(name))
+        if identity:
+            cursor.execute('ALTER TABLE %s ALTER COLUMN id DROP IDENTITY' % qn(TABLE))
+        else:
+            cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [TABLE])
+            sequence = cursor.fetchone()[0]
+            cursor.execute('ALTER TABLE %s ALTER COLUMN id DROP DEFAULT' % qn(TABLE))
+            if sequence:
+                cursor.execute('DROP SEQUENCE %s' % sequence)
+        cursor.execute('ALTER TABLE %s RENAME TO %s' % (qn(TABLE), qn(old)))
+        cursor.execute('ALTER TABLE %s RENAME CONSTRAINT %s TO %s' % (
+            qn(old), qn('%s_pkey' % TABLE), qn('%s_pkey' % old)))
+
+        cursor.execute('CREATE TABLE %s (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE) '
+                       'PARTITION BY RANGE (date)' % (qn(TABLE), qn(old)))
+        sequence = '%s_id_seq' % TABLE
+        cursor.execute('CREATE SEQUENCE %s OWNED BY %s.id' % (qn(sequence), qn(TABLE)))
+        cursor.execute("ALTER TABLE %s ALTER COLUMN id SET DEFAULT nextval('%s')" % (qn(TABLE), sequence))
+        cursor.execute('SELECT setval(%s, %s, false)', [sequence, (max_id or 0) + 1])
+        cursor.execute('CREATE TABLE %s PARTITION OF %s DEFAULT' % (qn(default_name()), qn(TABLE)))
+
+    created = []
+    if first is not None:
+        start = period_start(first, period)
+        while start < period_start(today, period):
+            created.append(create_partition(connection, start, period))
+            start = next_period(start, period)
+    created += ensure(connection, period, ahead, today)
+
+    with connection.cursor() as cursor:
+        # LIKE copied the columns in order, so the rows copy as they are.
+        cursor.execute('INSERT INTO %s SELECT * FROM %s' % (qn(TABLE), qn(old)))
+        cursor.execute('DROP TABLE %s' % qn(old))
+        cursor.execute('ALTER TABLE %s ADD PRIMARY KEY (id, date)' % qn(TABLE))
+        for name, definition in indexes:
+            if definition.startswith('CREATE UNIQUE INDEX') and 'date' not in definition:
+                definition = re.sub(r'\)', ', date)', definition, count=1)
+            cursor.execute(definition)
+        for name, definition in foreign_keys:
+            cursor.execute('ALTER TABLE %s ADD CONSTRAINT %s %s' % (qn(TABLE), qn(name), definition))
+    search.install(connection)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE %s' % qn(TABLE))
+    return created
@@ -0,0 +1,154 @@
+"""
+Incremental maintenance of ``ExpenseRollup`` rows.
+
+Every change to an ``Expense`` is turned into signed deltas against the
+(user, category, month) rows it affects, so that totals can be read without
+scanning the raw expenses. ``QuerySet.update()`` and ``bulk_create()`` bypass
+model signals; callers using them must call ``apply_expenses`` or
+``rebuild`` themselves.
+
+Archiving (``archive.py``) moves expenses without touching their rollups,
+which go on counting them; ``compute`` reads the archive as well.
+
+Every increase of a row is passed on to ``budgets.check``, which tests the
+new total against the user's budget for that category.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncMonth
+
+from . import budgets, caching
+from .models import Expense, ExpenseArchive, ExpenseRollup
+from .stats import add_months
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def expense_key(expense):
+    """Return the (user_id, category_id, month, amount) an expense contributes."""
+    day = Expense._meta.get_field('date').to_python(expense.date)
+    amount = Expense._meta.get_field('amount').to_python(expense.amount)
+    return expense.user_id, expense.category_id, month_of(day), amount
+
+
+def changed(user_ids):
+    """Invalidate cached results of ``user_ids`` once the current transaction commits."""
+    user_ids = set(user_ids)
+    transaction.on_commit(lambda: caching.invalidate_users(user_ids))
+
+
+def apply_delta(user_id, category_id, month, amount, count):
+    """Add ``amount``/``count`` (either may be negative) to one rollup row."""
+    rows = ExpenseRollup.objects.filter(user_id=user_id, category_id=category_id, month=month)
+    with transaction.atomic():
+        if rows.update(total=F('total') + amount, count=F('count') + count):
+            if count < 0:
+                rows.filter(count__lte=0).delete()
+            return
+        if count <= 0:
+            # The row is already gone, e.g. removed by the same cascade
+            # that is deleting this expense.
+            return
+        try:
+            with transaction.atomic():
+                ExpenseRollup.objects.create(
+                    user_id=user_id, category_id=category_id, month=month,
+                    total=amount, count=count,
+                )
+        except IntegrityError:
+            # Lost a race with a concurrent insert of the same row.
+            rows.update(total=F('total') + amount, count=F('count') + count)
+
+
+def record_change(old, new):
+    """
+    Apply the difference between two expense states. ``old`` is None for a
+    create and ``new`` is None for a delete; both are ``expense_key`` tuples.
+    """
+    if old == new:
+        return
+    changed(key[0] for key in (old, new) if key is not None)
+    with transaction.atomic():
+        if old is not None and new is not None and old[:3] == new[:3]:
+            apply_delta(*new[:3], new[3] - old[3], 0)
+            budgets.check(*new[:3], new[3] - old[3])
+            return
+        if old is not None:
+            apply_delta(*old[:3], -old[3], -1)
+        if new is not None:
+            apply_delta(*new[:3], new[3], 1)
+            budgets.check(*new)
+
+
+def apply_expenses(expenses):
+    """Add newly inserted expenses (e.g. from ``bulk_create``) to the rollups."""
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for expense in expenses:
+        user_id, category_id, month, amount = expense_key(expense)
+        delta = deltas[user_id, category_id, month]
+        delta[0] += amount
+        delta[1] += 1
+    with transaction.atomic():
+        for key, (amount, count) in sorted(deltas.items()):
+            apply_delta(*key, amount, count)
+            budgets.check(*key, amount)
+    changed(key[0] for key in deltas)
+
+
+def in_month(month):
+    """Filter arguments for the rows of ``month``, or for every month if it is None."""
+    return {} if month is None else {'date__gte': month, 'date__lt': add_months(month, 1)}
+
+
+def compute(user_ids, month=None):
+    """
+    Aggregate raw expenses, live and archived, into
+    {(user_id, category_id, month): (total, count)}, for one ``month`` or all.
+    """
+    totals = {}
+    for model in (Expense, ExpenseArchive):
+        rows = model.objects.filter(user_id__in=user_ids, **in_month(month)).values(
+            'user_id', 'category_id', month=TruncMonth('date'),
+        ).annotate(total=Sum('amount'), count=Count('id')).order_by()
+        for row in rows:
+            key = (row['user_id'], row['category_id'], row['month'])
+            total, count = totals.get(key, (0, 0))
+            totals[key] = (total + row['total'], count + row['count'])
+    return totals
+
+
+def stored_rows(user_ids, month=None):
+    rows = ExpenseRollup.objects.filter(user_id__in=user_ids)
+    return rows if month is None else rows.filter(month=month)
+
+
+def stored(user_ids, month=None):
+    rows = stored_rows(user_ids, month).values_list('user_id', 'category_id', 'month', 'total', 'count')
+    return {(u, c, m): (total, count) for u, c, m, total, count in rows}
+
+
+def rebuild(user_ids, month=None):
+    """Replace the rollups of ``user_ids``, for one ``month`` or all, with freshly computed values."""
+    with transaction.atomic():
+        stored_rows(user_ids, month).delete()
+        ExpenseRollup.objects.bulk_create([
+            ExpenseRollup(user_id=u, category_id=c, month=m, total=total, count=count)
+            for (u, c, m), (total, count) in compute(user_ids, month).items()
+        ])
+    changed(user_ids)
+
+
+def diff(user_ids, month=None):
+    """Return {key: (stored, expected)} for every rollup row that has drifted."""
+    expected = compute(user_ids, month)
+    actual = stored(user_ids, month)
+    return {
+        key: (actual.get(key), expected.get(key))
+        for key in expected.keys() | actual.keys()
+        if actual.get(key) != expected.get(key)
+    }
@@ -0,0 +1,204 @@
+"""
+Read-replica routing.
+
+Replicas are the database aliases in ``EXPENSE_READ_REPLICAS`` (built from
+``DATABASE_REPLICA_URLS``, see ``expense_tracker/database.py``). Reads only
+go to a replica inside ``use_replica()`` or a view decorated with
+``replica_reads``, and not inside ``use_primary()``; everything else, and
+every write, uses ``default``, so the write paths and their consistency
+checks never see replication lag.
+
+Read-your-writes: ``ReplicaPinMiddleware`` notices when a request writes
+(through ``ReplicaRouter.db_for_write``) and sets a cookie that keeps that
+client's reads on the primary for ``EXPENSE_REPLICA_PIN_SECONDS``. Reads
+later in the same request go to the primary as well. ``used_replica()``
+tells whether the current request read from a replica, whose data may lag
+behind the primary's.
+
+Replicas are picked round-robin. One that cannot be connected to is left
+out for ``EXPENSE_REPLICA_RETRY_SECONDS``; with none left, reads fall back
+to the primary.
+"""
+import contextvars
+import functools
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+logger = logging.getLogger('expenses.routing')
+
+PIN_COOKIE = 'expenses_primary'
+
+
+@dataclass
+class RequestState:
+    pinned: bool = False
+    wrote: bool = False
+    replica: bool = False
+
+
+_state = contextvars.ContextVar('expenses_routing_state', default=None)
+_replica_reads = contextvars.ContextVar('expenses_replica_reads', default=False)
+
+_next = itertools.count()
+_down = {}
+_down_lock = threading.Lock()
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def replica_aliases():
+    return list(setting('EXPENSE_READ_REPLICAS', []))
+
+
+def mark_down(alias):
+    retry = setting('EXPENSE_REPLICA_RETRY_SECONDS', 30)
+    with _down_lock:
+        _down[alias] = time.monotonic() + retry
+    logger.warning('Read replica %r is unavailable; retrying in %ss', alias, retry)
+
+
+def reset():
+    """Forget which replicas were unavailable."""
+    with _down_lock:
+        _down.clear()
+
+
+def choose_replica():
+    """Return the next healthy replica alias, or None to use the primary."""
+    aliases = replica_aliases()
+    if not aliases:
+        return None
+    start = next(_next)
+    now = time.monotonic()
+    for offset in range(len(aliases)):
+        alias = aliases[(start + offset) % len(aliases)]
+        if _down.get(alias, 0) > now:
+            continue
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            mark_down(alias)
+            continue
+        return alias
+    return None
+
+
+@contextmanager
+def use_replica():
+    """Let the reads in this block go to a replica."""
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def use_primary():
+    """Keep the reads in this block on the primary, even in a ``replica_reads`` view."""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def replica_reads(view):
+    """Decorator for read-only views (sync or async) whose reads may use a replica."""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            with use_replica():
+                return await view(*args, **kwargs)
+        return wrapper
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        with use_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+def used_replica():
+    """Whether the current request has read from a replica so far."""
+    state = _state.get()
+    return state is not None and state.replica
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get():
+            return None
+        state = _state.get()
+        if state is not None and (state.pinned or state.wrote):
+            return DEFAULT_DB_ALIAS
+        alias = choose_replica()
+        if alias is None:
+            return DEFAULT_DB_ALIAS
+        if state is not None:
+            state.replica = True
+        return alias
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        # Session saves happen on plain page views too; they are not data writes.
+        if state is not None and model._meta.app_label != 'sessions':
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaPinMiddleware:
+    """Tracks writes per request and pins the client to the primary after one."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        state = RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(response, state)
+
+    async def __acall__(self, request):
+        state = RequestState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(response, state)
+
+    def pin(self, response, state):
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=setting('EXPENSE_REPLICA_PIN_SECONDS', 10),
+                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,133 @@
+"""
+Ranked search over expense descriptions and category names.
+
+PostgreSQL
+    ``Expense.search_vector`` holds the description as an English tsvector,
+    maintained by a trigger and indexed with GIN. ``icontains`` compiles to
+    ``UPPER("description"::text) LIKE UPPER(%s)``, so the ``pg_trgm`` GIN
+    index is on that expression, which turns substring matches into index
+    scans as well; category names are matched in the category registry
+    (``categories``) without a query. A row matches if the full-text query
+    does or if the search text occurs in its description or category name;
+    ``SearchRank`` puts the full-text matches first.
+SQLite
+    The ``expenses_expense_fts`` FTS5 table indexes the descriptions (as
+    external content, kept in sync by triggers) and matches every word of
+    the search text as a prefix. Category names match as on PostgreSQL.
+    Description matches rank above category matches but are not ordered
+    among themselves: bm25() needs a join with the FTS table that the ORM
+    cannot express, and as a correlated subquery it repeats the MATCH for
+    every row.
+Other databases
+    Unranked ``icontains`` matching.
+
+``install()`` creates all of this and indexes the existing rows, as
+migrations 0006 and 0010 did; ``manage.py rebuild_search_index`` runs it
+again, e.g. if the SQLite triggers were lost when a migration rebuilt the
+expense table.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+from . import categories
+from .pagination import DESCENDING
+
+CONFIG = 'english'
+FTS_TABLE = 'expenses_expense_fts'
+
+POSTGRESQL_INSTALL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'DROP TRIGGER IF EXISTS expense_search_vector_update ON expenses_expense',
+    "CREATE TRIGGER expense_search_vector_update BEFORE INSERT OR UPDATE OF description "
+    "ON expenses_expense FOR EACH ROW EXECUTE FUNCTION "
+    "tsvector_update_trigger(search_vector, 'pg_catalog.%s', description)" % CONFIG,
+    "UPDATE expenses_expense SET search_vector = to_tsvector('pg_catalog.%s', description) "
+    "WHERE search_vector IS NULL" % CONFIG,
+    'CREATE INDEX IF NOT EXISTS expense_search_vector_idx ON expenses_expense USING gin (search_vector)',
+    'CREATE INDEX IF NOT EXISTS expense_description_upper_trgm_idx ON expenses_expense '
+    'USING gin ((UPPER(description::text)) gin_trgm_ops)',
+]
+POSTGRESQL_UNINSTALL = [
+    'DROP INDEX IF EXISTS expense_description_upper_trgm_idx',
+    'DROP INDEX IF EXISTS expense_search_vector_idx',
+    'DROP TRIGGER IF EXISTS expense_search_vector_update ON expenses_expense',
+]
+
+SQLITE_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5(description, "
+    "content='expenses_expense', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON expenses_expense BEGIN "
+    "INSERT INTO {fts}(rowid, description) VALUES (new.id, new.description); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON expenses_expense BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, description) VALUES ('delete', old.id, old.description); END",
+    "CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF description ON expenses_expense BEGIN "
+    "INSERT INTO {fts}({fts}, rowid, description) VALUES ('delete', old.id, old.description); "
+    "INSERT INTO {fts}(rowid, description) VALUES (new.id, new.description); END",
+    "INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+]
+SQLITE_UNINSTALL = [
+    'DROP TRIGGER IF EXISTS {fts}_insert',
+    'DROP TRIGGER IF EXISTS {fts}_delete',
+    'DROP TRIGGER IF EXISTS {fts}_update',
+    'DROP TABLE IF EXISTS {fts}',
+]
+
+
+def statements(connection, install=True):
+    if connection.vendor == 'postgresql':
+        return POSTGRESQL_INSTALL if install else POSTGRESQL_UNINSTALL
+    if connection.vendor == 'sqlite':
+        return [sql.format(fts=FTS_TABLE) for sql in (SQLITE_INSTALL if install else SQLITE_UNINSTALL)]
+    return []
+
+
+def install(connection):
+    """Create the search column trigger, indexes or FTS table and index every expense."""
+    with connection.cursor() as cursor:
+        for sql in statements(connection):
+            cursor.execute(sql)
+
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        for sql in statements(connection, install=False):
+            cursor.execute(sql)
+
+
+def fts_query(text):
+    """An FTS5 query matching every word of ``text`` as a prefix, or '' if it has none."""
+    return ' '.join('"%s"*' % word for word in re.findall(r'\w+', text))
+
+
+def search(queryset, text):
+    """
+    Filter an ``Expense`` queryset to the rows matching ``text`` and annotate
+    them with ``rank`` (higher is better). Order with ``ranked``.
+    """
+    text = text.strip()
+    # Looked up first, in the category registry, so that the usual case, no
+    # category matching, leaves no OR to stop the expense indexes being used.
+    category_ids = categories.get().matching(text)
+    in_categories = Q(category_id__in=category_ids) if category_ids else Q(pk__in=[])
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        query = SearchQuery(text, config=CONFIG, search_type='websearch')
+        return queryset.annotate(rank=SearchRank(F('search_vector'), query)).filter(
+            Q(search_vector=query) | Q(description__icontains=text) | in_categories)
+    if vendor == 'sqlite':
+        match = fts_query(text)
+        if not match:
+            return queryset.filter(in_categories).annotate(rank=Value(0.0))
+        matches = RawSQL('SELECT rowid FROM {fts} WHERE {fts} MATCH %s'.format(fts=FTS_TABLE), [match])
+        rank = Case(When(pk__in=matches, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+        return queryset.annotate(rank=rank).filter(Q(pk__in=matches) | in_categories)
+    return queryset.filter(Q(description__icontains=text) | in_categories).annotate(rank=Value(0.0))
+
+
+def ranked(queryset):
+    """Best matches first, newest first among equals."""
+    return queryset.order_by(F('rank').desc(), *DESCENDING)
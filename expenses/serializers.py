@@ -1,5 +1,7 @@
 from rest_framework import serializers
-from .models import Category, Expense
+from . import categories
+from .analytics import BUCKETS, GROUPS
+from .models import Budget, Category, Expense
 from django.contrib.auth.models import User
 
 class UserSerializer(serializers.ModelSerializer):
@@ -7,6 +9,16 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         fields = ('id', 'username', 'email')
 
+class CategoryIdField(serializers.IntegerField):
+    """A category id, checked against the category registry rather than the database."""
+    default_error_messages = {'does_not_exist': 'Category does not exist.'}
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        if value not in categories.containing([value]):
+            self.fail('does_not_exist')
+        return value
+
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
@@ -15,9 +27,57 @@ class CategorySerializer(serializers.ModelSerializer):
 class ExpenseSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     category = CategorySerializer(read_only=True)
-    category_id = serializers.IntegerField(write_only=True)
+    category_id = CategoryIdField(write_only=True)
 
     class Meta:
         model = Expense
         fields = ('id', 'user', 'category', 'category_id', 'amount', 'description', 'date', 'created_at', 'updated_at')
-        read_only_fields = ('user', 'created_at', 'updated_at') 
\ No newline at end of file
+        read_only_fields = ('user', 'created_at', 'updated_at')
+
+class FlatExpenseSerializer(serializers.ModelSerializer):
+    """Expense without nested user/category objects, selected with ?flat=1."""
+    category_id = CategoryIdField()
+    category_name = serializers.CharField(source='category.name', read_only=True)
+
+    class Meta:
+        model = Expense
+        fields = ('id', 'category_id', 'category_name', 'amount', 'description', 'date', 'created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at')
+
+class BudgetSerializer(serializers.ModelSerializer):
+    category_id = CategoryIdField()
+    category_name = serializers.CharField(source='category.name', read_only=True)
+
+    class Meta:
+        model = Budget
+        fields = ('id', 'category_id', 'category_name', 'amount', 'created_at', 'updated_at')
+        read_only_fields = ('created_at', 'updated_at')
+
+    def validate_amount(self, value):
+        if value <= 0:
+            raise serializers.ValidationError('A budget must be positive.')
+        return value
+
+class BulkExpenseSerializer(serializers.Serializer):
+    """One row of a bulk upload; categories are checked by the caller against one registry."""
+    category_id = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    description = serializers.CharField()
+    date = serializers.DateField()
+    idempotency_key = serializers.CharField(max_length=100, required=False)
+
+class ExportFilterSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    category = CategoryIdField(required=False)
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    bucket = serializers.ChoiceField(choices=BUCKETS, default='month')
+    group_by = serializers.ChoiceField(choices=GROUPS, default='category')
+
+    def validate(self, data):
+        if data.get('start') and data.get('end') and data['start'] > data['end']:
+            raise serializers.ValidationError('start must not be after end.')
+        return data
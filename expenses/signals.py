@@ -0,0 +1,53 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import budgets, caching, categories, rollups
+from .models import Budget, Category, Expense
+from .stats import month_start
+
+
+@receiver(pre_save, sender=Expense)
+def remember_previous_state(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    previous = Expense.objects.select_for_update().filter(pk=instance.pk).first()
+    if previous is not None:
+        instance._rollup_previous = rollups.expense_key(previous)
+
+
+@receiver(post_save, sender=Expense)
+def update_rollups_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = None if created else getattr(instance, '_rollup_previous', None)
+    rollups.record_change(previous, rollups.expense_key(instance))
+
+
+@receiver(post_delete, sender=Expense)
+def update_rollups_on_delete(sender, instance, **kwargs):
+    rollups.record_change(rollups.expense_key(instance), None)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_caches_on_category_change(sender, **kwargs):
+    categories.clear()
+    transaction.on_commit(categories.changed)
+    transaction.on_commit(caching.invalidate_all)
+
+
+@receiver(post_save, sender=Budget)
+def queue_alerts_on_budget_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # A new or lowered budget may already be exceeded this month.
+    budgets.queue_alerts(Budget.objects.filter(pk=instance.pk), month_start(timezone.localdate()))
+    rollups.changed([instance.user_id])
+
+
+@receiver(post_delete, sender=Budget)
+def invalidate_caches_on_budget_delete(sender, instance, **kwargs):
+    rollups.changed([instance.user_id])
@@ -0,0 +1,162 @@
+"""
+Monthly spending statements, generated for many users at once.
+
+``compute_shard`` builds the ``Statement`` of every user in a shard with
+three queries, however large the shard: the users, their rollups for the
+month and the month before (total, category breakdown and change, worked
+out as on the dashboard), and their largest expenses of the month, picked
+with a window function. ``write_statement`` renders one statement as CSV
+and/or HTML.
+
+``generate`` runs the shards in forked worker processes and reports each
+finished shard, which the ``generate_statements`` command records in a
+checkpoint so that an interrupted run resumes where it stopped. Every file
+depends only on its user's data, so the output is the same whatever the
+worker count or shard size.
+"""
+import csv
+import multiprocessing
+import os
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from typing import List
+
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.template.loader import render_to_string
+
+from .models import Expense, ExpenseRollup
+from .stats import ZERO, CategoryTotal, add_months, percentage_change
+
+FORMATS = ('csv', 'html')
+TOP_EXPENSES = 5
+CHECKPOINT = 'checkpoint'
+
+
+@dataclass
+class TopExpense:
+    date: date
+    category: str
+    description: str
+    amount: Decimal
+
+
+@dataclass
+class Statement:
+    user_id: int
+    username: str
+    month: date
+    total: Decimal = ZERO
+    count: int = 0
+    previous_total: Decimal = ZERO
+    categories: List[CategoryTotal] = field(default_factory=list)
+    top_expenses: List[TopExpense] = field(default_factory=list)
+
+    @property
+    def previous_month(self):
+        return add_months(self.month, -1)
+
+    @property
+    def percentage_change(self):
+        return percentage_change(self.total, self.previous_total)
+
+
+def compute_shard(user_ids, month, top=TOP_EXPENSES):
+    """The statements for ``month`` (a first of the month) of ``user_ids``, in id order."""
+    previous = add_months(month, -1)
+    statements = {
+        user_id: Statement(user_id, username, month)
+        for user_id, username in User.objects.filter(pk__in=user_ids).order_by('pk').values_list('pk', 'username')
+    }
+    rows = ExpenseRollup.objects.filter(user_id__in=user_ids, month__in=[previous, month]).values_list(
+        'user_id', 'category_id', 'category__name', 'month', 'total', 'count')
+    for user_id, category_id, name, row_month, total, count in rows:
+        statement = statements[user_id]
+        if row_month == previous:
+            statement.previous_total += total
+        else:
+            statement.total += total
+            statement.count += count
+            statement.categories.append(CategoryTotal(category_id, name, total, count))
+
+    largest = Expense.objects.filter(
+        user_id__in=user_ids, date__gte=month, date__lt=add_months(month, 1),
+    ).annotate(position=Window(
+        RowNumber(), partition_by=[F('user_id')], order_by=[F('amount').desc(), F('date').desc(), F('id')],
+    )).filter(position__lte=top).order_by('user_id', 'position').values_list(
+        'user_id', 'date', 'category__name', 'description', 'amount')
+    for user_id, day, category, description, amount in largest:
+        statements[user_id].top_expenses.append(TopExpense(day, category, description, amount))
+
+    for statement in statements.values():
+        statement.categories.sort(key=lambda c: (-c.total, c.name))
+    return list(statements.values())
+
+
+def write_csv(statement, output):
+    writer = csv.writer(output)
+    writer.writerow(['section', 'name', 'category', 'date', 'amount', 'count'])
+    writer.writerow(['total', statement.month.strftime('%Y-%m'), '', '', statement.total, statement.count])
+    writer.writerow(['previous_total', statement.previous_month.strftime('%Y-%m'), '', '',
+                     statement.previous_total, ''])
+    writer.writerow(['change_percent', '', '', '', '%.1f' % statement.percentage_change, ''])
+    for category in statement.categories:
+        writer.writerow(['category', category.name, category.name, '', category.total, category.count])
+    for expense in statement.top_expenses:
+        writer.writerow(['top_expense', expense.description, expense.category, expense.date.isoformat(),
+                         expense.amount, ''])
+
+
+def write_statement(statement, directory, formats=FORMATS):
+    """Write ``<user id>.csv`` and/or ``.html`` to ``directory``; a file only appears once complete."""
+    for extension in formats:
+        path = os.path.join(directory, '%d.%s' % (statement.user_id, extension))
+        with open(path + '.tmp', 'w', newline='', encoding='utf-8') as output:
+            if extension == 'csv':
+                write_csv(statement, output)
+            else:
+                output.write(render_to_string('expenses/statement.html', {'statement': statement}))
+        os.replace(path + '.tmp', path)
+
+
+def run_shard(user_ids, month, directory, formats, top):
+    for statement in compute_shard(user_ids, month, top):
+        write_statement(statement, directory, formats)
+    return user_ids
+
+
+def _run_shard(args):
+    # Runs in a forked worker, which opens its own database connection.
+    return run_shard(*args)
+
+
+def read_checkpoint(directory):
+    """The ids of the users whose statements in ``directory`` are complete."""
+    try:
+        with open(os.path.join(directory, CHECKPOINT)) as saved:
+            return {int(line) for line in saved if line.strip()}
+    except FileNotFoundError:
+        return set()
+
+
+def generate(user_ids, month, directory, formats=FORMATS, shard_size=500, workers=1, top=TOP_EXPENSES,
+             done=None):
+    """
+    Write the statements of ``user_ids`` for ``month`` to ``directory``.
+    ``done`` is called with the user ids of each shard as it completes.
+    """
+    done = done or (lambda user_ids: None)
+    os.makedirs(directory, exist_ok=True)
+    jobs = [(user_ids[start:start + shard_size], month, directory, formats, top)
+            for start in range(0, len(user_ids), shard_size)]
+    if workers > 1 and not connection.in_atomic_block:
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(workers) as pool:
+            for finished in pool.imap_unordered(_run_shard, jobs):
+                done(finished)
+    else:
+        for job in jobs:
+            done(run_shard(*job))
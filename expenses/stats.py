@@ -0,0 +1,204 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import List, Optional
+
+from django.db.models import Avg, Q, Sum
+from django.utils import timezone
+
+from .models import Expense, ExpenseRollup
+
+ZERO = Decimal('0')
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    """Return the first day of the month ``months`` away from ``day``."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def period_start(day, kind):
+    """The first day of the year, month or day (``kind``) containing ``day``."""
+    if kind == 'year':
+        return day.replace(month=1, day=1)
+    if kind == 'month':
+        return month_start(day)
+    return day
+
+
+def next_period(day, kind):
+    """The first day of the following year, month or day, for ``day`` from ``period_start``."""
+    if kind == 'year':
+        return day.replace(year=day.year + 1)
+    if kind == 'month':
+        return add_months(day, 1)
+    return day + timedelta(days=1)
+
+
+def percentage_change(current, previous):
+    """Change from ``previous`` to ``current`` in percent, 0 if there was nothing before."""
+    if previous > 0:
+        return ((current - previous) / previous) * 100
+    return 0
+
+
+@dataclass
+class CategoryTotal:
+    category_id: int
+    name: str
+    total: Decimal = ZERO
+    count: int = 0
+
+
+@dataclass
+class MonthTotal:
+    month: date
+    total: Decimal = ZERO
+    count: int = 0
+
+    @property
+    def label(self):
+        return self.month.strftime('%B %Y')
+
+
+@dataclass
+class DashboardStats:
+    """All figures shown on the dashboard for one user, as of ``today``."""
+    today: date
+    total: Decimal = ZERO
+    count: int = 0
+    current_month_total: Decimal = ZERO
+    previous_month_total: Decimal = ZERO
+    weekly_total: Decimal = ZERO
+    monthly_average: Decimal = ZERO
+    categories: List[CategoryTotal] = field(default_factory=list)
+    months: List[MonthTotal] = field(default_factory=list)
+
+    @property
+    def week_ago(self):
+        return self.today - timedelta(days=7)
+
+    @property
+    def month_ago(self):
+        return self.today - timedelta(days=30)
+
+    @property
+    def top_categories(self):
+        return sorted(self.categories, key=lambda c: c.total, reverse=True)[:5]
+
+    @property
+    def percentage_change(self):
+        return percentage_change(self.current_month_total, self.previous_month_total)
+
+    def by_category(self):
+        """Category totals in the shape of the ``expenses_by_category`` API."""
+        return [{'category__name': c.name, 'total': c.total} for c in self.categories]
+
+
+def rollup_rows(user):
+    return ExpenseRollup.objects.filter(user=user).values_list(
+        'category_id', 'category__name', 'month', 'total', 'count')
+
+
+def window_aggregates(user, today):
+    """
+    The recent expenses of ``user`` and the filtered aggregates over them
+    that give the this/last month, last 7 days and last 30 days figures.
+    """
+    this_month = month_start(today)
+    next_month = add_months(today, 1)
+    last_month = add_months(today, -1)
+    week_ago = today - timedelta(days=7)
+    month_ago = today - timedelta(days=30)
+
+    in_this_month = Q(date__gte=this_month, date__lt=next_month)
+    in_last_month = Q(date__gte=last_month, date__lt=this_month)
+    recent = Expense.objects.filter(user=user, date__gte=min(last_month, month_ago))
+    return recent, {
+        'current_month': Sum('amount', filter=in_this_month),
+        'previous_month': Sum('amount', filter=in_last_month),
+        'weekly': Sum('amount', filter=Q(date__gte=week_ago)),
+        'monthly_average': Avg('amount', filter=Q(date__gte=month_ago)),
+    }
+
+
+def all_time_aggregates():
+    return {'total': Sum('total'), 'count': Sum('count')}
+
+
+def build_stats(today, rows, totals, all_time=None):
+    """
+    Assemble ``DashboardStats`` from ``rollup_rows`` and the window
+    aggregates, or from ``all_time`` totals alone when there are no rows.
+    """
+    stats = DashboardStats(today=today)
+
+    categories = {}
+    months = {}
+    for category_id, name, month, total, count in rows:
+        category = categories.setdefault(category_id, CategoryTotal(category_id, name))
+        category.total += total
+        category.count += count
+        month_total = months.setdefault(month, MonthTotal(month))
+        month_total.total += total
+        month_total.count += count
+        stats.total += total
+        stats.count += count
+
+    stats.categories = sorted(categories.values(), key=lambda c: c.name)
+    stats.months = sorted(months.values(), key=lambda m: m.month)
+
+    stats.current_month_total = totals['current_month'] or ZERO
+    stats.previous_month_total = totals['previous_month'] or ZERO
+    stats.weekly_total = totals['weekly'] or ZERO
+    stats.monthly_average = totals['monthly_average'] or ZERO
+    if all_time is not None:
+        stats.total = all_time['total'] or ZERO
+        stats.count = all_time['count'] or 0
+    return stats
+
+
+def get_dashboard_stats(user, today: Optional[date] = None) -> DashboardStats:
+    """
+    Compute dashboard statistics for ``user`` in two queries: the all-time,
+    category and trend figures come from the (category, month) rollups, and
+    one row of filtered aggregates covers the recent date windows.
+    """
+    today = today or timezone.localdate()
+    recent, aggregates = window_aggregates(user, today)
+    return build_stats(today, list(rollup_rows(user)), recent.aggregate(**aggregates))
+
+
+async def aget_dashboard_stats(user, today: Optional[date] = None) -> DashboardStats:
+    """
+    ``get_dashboard_stats`` with the async ORM. The queries run one after
+    the other on the thread that holds the request's connection; the event
+    loop serves other requests meanwhile.
+    """
+    today = today or timezone.localdate()
+    recent, aggregates = window_aggregates(user, today)
+    rows = [row async for row in rollup_rows(user)]
+    return build_stats(today, rows, await recent.aaggregate(**aggregates))
+
+
+def get_headline_stats(user, today: Optional[date] = None) -> DashboardStats:
+    """
+    The dashboard's headline figures without the category and month
+    breakdowns, which the charts load separately: two single-row aggregates.
+    """
+    today = today or timezone.localdate()
+    recent, aggregates = window_aggregates(user, today)
+    all_time = ExpenseRollup.objects.filter(user=user).aggregate(**all_time_aggregates())
+    return build_stats(today, [], recent.aggregate(**aggregates), all_time)
+
+
+async def aget_headline_stats(user, today: Optional[date] = None) -> DashboardStats:
+    """``get_headline_stats`` with the async ORM, its queries run in turn as in ``aget_dashboard_stats``."""
+    today = today or timezone.localdate()
+    recent, aggregates = window_aggregates(user, today)
+    all_time = await ExpenseRollup.objects.filter(user=user).aaggregate(**all_time_aggregates())
+    return build_stats(today, [], await recent.aaggregate(**aggregates), all_time)
@@ -1,8 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import instrumentation, views
 
 router = DefaultRouter()
+router.register(r'budgets', views.BudgetViewSet, basename='budget')
 router.register(r'categories', views.CategoryViewSet)
 router.register(r'expenses', views.ExpenseViewSet, basename='expense')
 
@@ -10,6 +11,7 @@ urlpatterns = [
     # Template URLs
     path('', views.home, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/charts/<slug:name>/', views.dashboard_chart, name='dashboard_chart'),
     path('expenses/', views.expense_list, name='expense_list'),
     path('expenses/create/', views.expense_create, name='expense_create'),
     path('expenses/<int:pk>/update/', views.expense_update, name='expense_update'),
@@ -20,6 +22,9 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     
+    # Prometheus metrics
+    path('metrics/', instrumentation.metrics_view, name='metrics'),
+    
     # API URLs
     path('api/', include(router.urls)),
 ] 
\ No newline at end of file
@@ -3,141 +3,185 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login, logout, authenticate
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
-from django.db.models import Sum, Avg, Count
-from django.db.models.functions import TruncMonth
-from datetime import datetime, timedelta
-from .models import Category, Expense
-from .serializers import CategorySerializer, ExpenseSerializer
-from rest_framework import viewsets, permissions
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from . import analytics, budgets, bulk, caching, categories, charts, export, forecast, search
+from .conditional import conditional, conditional_page, not_modified
+from .routing import replica_reads
+from .models import Budget, Category, Expense
+from .parsers import NDJSONParser
+from .pagination import (
+    Cursor, ExpenseCursorPagination, SearchPagination, get_page_number, get_page_size, paginate,
+    paginate_numbered,
+)
+from .serializers import (
+    AnalyticsQuerySerializer, BudgetSerializer, CategorySerializer, ExpenseSerializer, ExportFilterSerializer,
+    FlatExpenseSerializer,
+)
+from .stats import get_dashboard_stats, get_headline_stats
+from rest_framework import viewsets, permissions, serializers, status
 from rest_framework.decorators import action
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 # Template Views
 def home(request):
     return render(request, 'home.html')
 
-@login_required
-def dashboard(request):
-    # Get user's expenses
-    expenses = Expense.objects.filter(user=request.user)
-    
-    # Calculate basic statistics
-    total_expenses = expenses.aggregate(total=Sum('amount'))['total'] or 0
-    monthly_expenses = expenses.filter(
-        date__year=datetime.now().year,
-        date__month=datetime.now().month
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Get recent expenses
-    recent_expenses = expenses.order_by('-date')[:5]
-    
-    # Get expenses by category for pie chart
-    category_data = expenses.values('category__name').annotate(total=Sum('amount'))
-    category_labels = [item['category__name'] for item in category_data]
-    category_amounts = [float(item['total']) for item in category_data]
-    
-    # Get monthly trend data for line chart
-    monthly_data = expenses.annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(total=Sum('amount')).order_by('month')
-    
-    monthly_labels = [item['month'].strftime('%B %Y') for item in monthly_data]
-    monthly_amounts = [float(item['total']) for item in monthly_data]
-    
-    # Calculate additional statistics
-    today = datetime.now().date()
-    week_ago = today - timedelta(days=7)
-    month_ago = today - timedelta(days=30)
-    
-    weekly_expenses = expenses.filter(
-        date__gte=week_ago
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    monthly_average = expenses.filter(
-        date__gte=month_ago
-    ).aggregate(avg=Avg('amount'))['avg'] or 0
-    
-    # Get top spending categories
-    top_categories = expenses.values(
-        'category__name'
-    ).annotate(
-        total=Sum('amount'),
-        count=Count('id')
-    ).order_by('-total')[:5]
-    
-    # Get spending trends
-    current_month = datetime.now().month
-    previous_month = current_month - 1 if current_month > 1 else 12
-    
-    current_month_expenses = expenses.filter(
-        date__year=datetime.now().year,
-        date__month=current_month
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    previous_month_expenses = expenses.filter(
-        date__year=datetime.now().year if current_month > 1 else datetime.now().year - 1,
-        date__month=previous_month
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Calculate percentage change
-    if previous_month_expenses > 0:
-        percentage_change = ((current_month_expenses - previous_month_expenses) / previous_month_expenses) * 100
-    else:
-        percentage_change = 0
-    
-    # Calculate absolute value for display
-    percentage_change_abs = abs(percentage_change)
+def recent_expenses_query(user):
+    return Expense.objects.filter(user=user).select_related('category')[:5]
+
+def dashboard_context(user):
+    return build_dashboard_context(
+        get_headline_stats(user),
+        list(recent_expenses_query(user)),
+        len(categories.get()),
+        budgets.usage(user),
+    )
+
+def build_dashboard_context(stats, recent_expenses, total_categories, budget_usage=()):
+    percentage_change = stats.percentage_change
     
-    context = {
+    return {
         # Basic statistics
-        'total_expenses': total_expenses,
-        'monthly_expenses': monthly_expenses,
-        'total_categories': Category.objects.count(),
-        'total_transactions': expenses.count(),
+        'total_expenses': stats.total,
+        'monthly_expenses': stats.current_month_total,
+        'total_categories': total_categories,
+        'total_transactions': stats.count,
         
         # Recent expenses
         'recent_expenses': recent_expenses,
-        
-        # Chart data
-        'category_labels': category_labels,
-        'category_data': category_amounts,
-        'monthly_labels': monthly_labels,
-        'monthly_data': monthly_amounts,
+
+        # Month-to-date spending against each budget
+        'budgets': budget_usage,
         
         # Additional statistics
-        'weekly_expenses': weekly_expenses,
-        'monthly_average': monthly_average,
-        'top_categories': top_categories,
+        'weekly_expenses': stats.weekly_total,
+        'monthly_average': stats.monthly_average,
         
         # Spending trends
-        'current_month_expenses': current_month_expenses,
-        'previous_month_expenses': previous_month_expenses,
+        'current_month_expenses': stats.current_month_total,
+        'previous_month_expenses': stats.previous_month_total,
         'percentage_change': percentage_change,
-        'percentage_change_abs': percentage_change_abs,
+        'percentage_change_abs': abs(percentage_change),
         
         # Date ranges for filters
-        'week_ago': week_ago,
-        'month_ago': month_ago,
+        'week_ago': stats.week_ago,
+        'month_ago': stats.month_ago,
     }
+
+def get_stats(user):
+    return caching.get_or_compute(user, 'stats', lambda: get_dashboard_stats(user))
+
+@login_required
+@replica_reads
+@conditional_page
+def dashboard(request):
+    context = caching.get_or_compute(
+        request.user, 'dashboard', lambda: dashboard_context(request.user))
+    # The charts are loaded from dashboard_chart by the page itself.
+    context = dict(context, chart_version=caching.entry_tag(request.user, 'charts') or '')
     return render(request, 'dashboard.html', context)
 
+def chart_response(response, tag):
+    if tag is None:
+        patch_cache_control(response, private=True, no_cache=True)
+    else:
+        response['ETag'] = quote_etag(tag)
+        patch_cache_control(response, private=True, max_age=getattr(settings, 'EXPENSE_CHART_MAX_AGE', 300))
+    return response
+
+@login_required
+@replica_reads
+def dashboard_chart(request, name):
+    if name not in charts.CHARTS:
+        raise Http404('Unknown chart')
+    tag = caching.entry_tag(request.user, 'chart:' + name)
+    response = not_modified(request, tag)
+    if response is None:
+        response = JsonResponse(charts.CHARTS[name](get_stats(request.user)))
+    return chart_response(response, tag)
+
+def search_expenses(user, text):
+    return search.ranked(search.search(
+        Expense.objects.filter(user=user).select_related('category'), text))
+
+def page_url(request, name, value):
+    """The current URL with ``name`` set to ``value``, keeping ``page_size`` and the rest; None without a value."""
+    if value is None:
+        return None
+    return replace_query_param(request.get_full_path(), name, value)
+
+def search_list_context(request, text, page):
+    return {
+        'expenses': page.items,
+        'q': text,
+        'page': page,
+        'previous_url': page_url(request, 'page', page.number - 1 if page.has_previous else None),
+        'next_url': page_url(request, 'page', page.number + 1 if page.has_next else None),
+    }
+
+def expense_list_context(request, page):
+    next_cursor = page.next_cursor and page.next_cursor.encode()
+    previous_cursor = page.previous_cursor and page.previous_cursor.encode()
+    return {
+        'expenses': page.items,
+        'next_cursor': next_cursor,
+        'previous_cursor': previous_cursor,
+        'next_url': page_url(request, 'cursor', next_cursor),
+        'previous_url': page_url(request, 'cursor', previous_cursor),
+    }
+
 @login_required
+@replica_reads
+@conditional_page
 def expense_list(request):
-    expenses = Expense.objects.filter(user=request.user).order_by('-date')
-    return render(request, 'expenses/expense_list.html', {'expenses': expenses})
+    text = request.GET.get('q', '').strip()
+    if text:
+        page = paginate_numbered(
+            search_expenses(request.user, text),
+            get_page_number(request.GET.get('page')),
+            get_page_size(request.GET.get('page_size')),
+        )
+        return render(request, 'expenses/expense_list.html', search_list_context(request, text, page))
+
+    cursor = request.GET.get('cursor')
+    try:
+        cursor = Cursor.decode(cursor) if cursor else None
+    except ValueError:
+        raise Http404('Invalid cursor')
+    page = paginate(
+        Expense.objects.filter(user=request.user).select_related('category'),
+        cursor,
+        get_page_size(request.GET.get('page_size')),
+    )
+    return render(request, 'expenses/expense_list.html', expense_list_context(request, page))
+
+def category_id_or_404(value):
+    try:
+        category_id = int(value)
+    except (TypeError, ValueError):
+        raise Http404('No such category')
+    if category_id not in categories.containing([category_id]):
+        raise Http404('No such category')
+    return category_id
 
 @login_required
 def expense_create(request):
     if request.method == 'POST':
-        category_id = request.POST.get('category')
+        category_id = category_id_or_404(request.POST.get('category'))
         amount = request.POST.get('amount')
         description = request.POST.get('description')
         date = request.POST.get('date')
         
-        category = get_object_or_404(Category, id=category_id)
         Expense.objects.create(
             user=request.user,
-            category=category,
+            category_id=category_id,
             amount=amount,
             description=description,
             date=date
@@ -145,20 +189,18 @@ def expense_create(request):
         messages.success(request, 'Expense added successfully!')
         return redirect('expense_list')
     
-    categories = Category.objects.all()
-    return render(request, 'expenses/expense_form.html', {'categories': categories})
+    return render(request, 'expenses/expense_form.html', {'categories': categories.get().instances()})
 
 @login_required
 def expense_update(request, pk):
     expense = get_object_or_404(Expense, pk=pk, user=request.user)
     if request.method == 'POST':
-        category_id = request.POST.get('category')
+        category_id = category_id_or_404(request.POST.get('category'))
         amount = request.POST.get('amount')
         description = request.POST.get('description')
         date = request.POST.get('date')
         
-        category = get_object_or_404(Category, id=category_id)
-        expense.category = category
+        expense.category_id = category_id
         expense.amount = amount
         expense.description = description
         expense.date = date
@@ -167,10 +209,9 @@ def expense_update(request, pk):
         messages.success(request, 'Expense updated successfully!')
         return redirect('expense_list')
     
-    categories = Category.objects.all()
     return render(request, 'expenses/expense_form.html', {
         'expense': expense,
-        'categories': categories
+        'categories': categories.get().instances()
     })
 
 @login_required
@@ -224,22 +265,188 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
     permission_classes = [permissions.IsAuthenticated]
 
+    # Reads come from the registry; writes go to the database and reload it.
+    def list(self, request, *args, **kwargs):
+        return Response(self.get_serializer(categories.get().instances(), many=True).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            pk = int(kwargs['pk'])
+        except ValueError:
+            raise Http404('No such category')
+        category = categories.containing([pk]).instance(pk)
+        if category is None:
+            raise Http404('No such category')
+        return Response(self.get_serializer(category).data)
+
+class BudgetViewSet(viewsets.ModelViewSet):
+    serializer_class = BudgetSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return Budget.objects.filter(user=self.request.user).select_related('category')
+
+    def save_budget(self, serializer, **kwargs):
+        try:
+            with transaction.atomic():
+                serializer.save(**kwargs)
+        except IntegrityError:
+            raise serializers.ValidationError({'category_id': ['This category already has a budget.']})
+
+    def perform_create(self, serializer):
+        self.save_budget(serializer, user=self.request.user)
+
+    def perform_update(self, serializer):
+        self.save_budget(serializer)
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(conditional)
+    @replica_reads
+    def usage(self, request):
+        return Response([
+            {'category_id': budget.category_id, 'name': budget.name, 'amount': budget.amount,
+             'spent': budget.spent, 'percent': round(budget.percent, 1)}
+            for budget in budgets.usage(request.user)
+        ])
+
 class ExpenseViewSet(viewsets.ModelViewSet):
     serializer_class = ExpenseSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ExpenseCursorPagination
 
     def get_queryset(self):
-        return Expense.objects.filter(user=self.request.user)
+        queryset = Expense.objects.filter(user=self.request.user).select_related('user', 'category')
+        if self.action == 'list' and self.search_text():
+            queryset = search.ranked(search.search(queryset, self.search_text()))
+        return queryset
+
+    def search_text(self):
+        return self.request.query_params.get('q', '').strip()
+
+    @property
+    def paginator(self):
+        # Ranked search results are paginated by page number (?q=...&page=2).
+        if not hasattr(self, '_paginator') and self.search_text():
+            self._paginator = SearchPagination()
+        return super().paginator
+
+    def get_serializer_class(self):
+        if self.request.query_params.get('flat') in ('1', 'true'):
+            return FlatExpenseSerializer
+        return ExpenseSerializer
+
+    @method_decorator(conditional)
+    @replica_reads
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    @method_decorator(conditional)
+    @replica_reads
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+        self.use_registry_category(serializer.save(user=self.request.user))
+
+    def perform_update(self, serializer):
+        self.use_registry_category(serializer.save())
+
+    def use_registry_category(self, expense):
+        # The response nests the category; take it from the registry rather than a query.
+        category = categories.get().instance(expense.category_id)
+        if category is not None:
+            expense.category = category
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        rows = request.data
+        if isinstance(rows, dict):
+            rows = rows.get('expenses')
+        if not isinstance(rows, list):
+            return Response({'detail': 'Expected a list of expenses.'}, status=status.HTTP_400_BAD_REQUEST)
+        max_rows = getattr(settings, 'EXPENSE_BULK_MAX_ROWS', 10000)
+        if len(rows) > max_rows:
+            return Response({'detail': f'At most {max_rows} expenses per request.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        mode = request.query_params.get('mode', 'atomic')
+        if mode not in ('atomic', 'best_effort'):
+            return Response({'detail': "mode must be 'atomic' or 'best_effort'."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        key_prefix = request.headers.get('Idempotency-Key')
+        if key_prefix and len(key_prefix) > bulk.MAX_KEY_PREFIX:
+            return Response({'detail': f'Idempotency-Key must be at most {bulk.MAX_KEY_PREFIX} characters.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            result = bulk.ingest(
+                request.user, rows,
+                atomic=mode == 'atomic',
+                key_prefix=key_prefix,
+            )
+        except IntegrityError:
+            return Response({'detail': 'A concurrent upload used the same idempotency keys; retry.'},
+                            status=status.HTTP_409_CONFLICT)
+
+        if result.errors and mode == 'atomic':
+            response_status = status.HTTP_400_BAD_REQUEST
+        elif result.created:
+            response_status = status.HTTP_201_CREATED
+        else:
+            response_status = status.HTTP_200_OK
+        return Response(result.as_dict(), status=response_status)
 
     @action(detail=False, methods=['get'])
+    def export(self, request):
+        output_format = request.query_params.get('output', 'csv')
+        if output_format not in export.FORMATS:
+            return Response({'detail': "output must be 'csv' or 'ndjson'."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        filters = ExportFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        compress = request.query_params.get('gzip') in ('1', 'true')
+
+        response = StreamingHttpResponse(
+            export.stream(
+                export.export_queryset(user=request.user, **filters.validated_data),
+                output_format, compress,
+            ),
+            content_type=export.FORMATS[output_format],
+        )
+        filename = f'expenses.{output_format}' + ('.gz' if compress else '')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    @replica_reads
+    def analytics(self, request):
+        params = AnalyticsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        user = request.user
+        try:
+            series = caching.get_or_compute(
+                user, analytics.cache_name(**params.validated_data),
+                lambda: analytics.time_series(user, **params.validated_data))
+        except analytics.TooManyBuckets as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(series)
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(conditional)
+    @replica_reads
     def total_expenses(self, request):
-        total = self.get_queryset().aggregate(total=Sum('amount'))['total'] or 0
-        return Response({'total': total})
+        stats = get_stats(request.user)
+        return Response({'total': stats.total})
 
     @action(detail=False, methods=['get'])
+    @method_decorator(conditional)
+    @replica_reads
     def expenses_by_category(self, request):
-        expenses = self.get_queryset().values('category__name').annotate(total=Sum('amount'))
-        return Response(expenses)
+        stats = get_stats(request.user)
+        return Response(stats.by_category())
+
+    @action(detail=False, methods=['get'])
+    @method_decorator(conditional)
+    @replica_reads
+    def forecast(self, request):
+        user = request.user
+        return Response(caching.get_or_compute(user, forecast.CACHE_NAME, lambda: forecast.forecast(user)))